@@ -0,0 +1,68 @@
+"""Add the GeoJSON fields used by area queries to existing documents.
+
+Run from the backend directory with the same .env as the server:
+
+    python backfill_geo_fields.py [--zoom 10]
+
+Waypoints get ``location`` built from their lat/lon. Finished tracks get
+``path`` from their cached simplified geometry at ``--zoom`` (keep it equal
+to TRACK_PATH_ZOOM in server.py); tracks with no cached geometry are
+counted and get their path the next time their geometry is built. Safe to
+re-run.
+"""
+import argparse
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import WriteError
+
+from geojson import line_geometry
+
+logger = logging.getLogger("backfill_geo_fields")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--zoom", type=int, default=10, help="geometry zoom level to index")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    load_dotenv(Path(__file__).parent / ".env")
+    client = MongoClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+
+    result = db.waypoints.update_many(
+        {"location": {"$exists": False}},
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$lon", "$lat"]}}}],
+    )
+    logger.info("Added location to %d waypoints", result.modified_count)
+
+    indexed = missing = rejected = 0
+    for track in db.tracks.find({"end_time": {"$ne": None}, "path": {"$exists": False}}, {"_id": 1}):
+        geometry = db.track_geometries.find_one(
+            {"track_id": track["_id"], "zoom": args.zoom}, {"coordinates": 1}
+        )
+        path = line_geometry(geometry["coordinates"]) if geometry else None
+        if path is None:
+            missing += 1
+            continue
+        try:
+            db.tracks.update_one({"_id": track["_id"]}, {"$set": {"path": path}})
+            indexed += 1
+        except WriteError as exc:
+            rejected += 1
+            logger.warning("Track %s path not indexable: %s", track["_id"], exc)
+    logger.info(
+        "Added path to %d tracks; %d have no cached geometry, %d were rejected",
+        indexed,
+        missing,
+        rejected,
+    )
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
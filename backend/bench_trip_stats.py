@@ -0,0 +1,75 @@
+"""Benchmark the vectorized trip statistics against the scalar per-pair loop.
+
+"compute" compares the stats math alone; "end2end" also charges the vectorized
+path for packing point dicts into arrays. The vectorized path additionally
+produces moving time and speed percentiles, which the scalar loop does not.
+
+Run from the backend directory:
+
+    python bench_trip_stats.py [n_points ...]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from geo import haversine_nm
+from trip_stats import compute_trip_stats, points_to_arrays
+
+
+def synthetic_points(n: int):
+    rng = random.Random(42)
+    t0 = datetime(2025, 6, 1, 6, 0, 0)
+    lat, lon = 29.2, -90.1
+    points = []
+    for i in range(n):
+        lat += rng.uniform(-0.0005, 0.0005)
+        lon += rng.uniform(-0.0005, 0.0005)
+        points.append(
+            {
+                "timestamp": t0 + timedelta(seconds=2 * i),
+                "lat": lat,
+                "lon": lon,
+                "speed_kn": rng.uniform(0.0, 25.0) if i % 10 else None,
+            }
+        )
+    return points
+
+
+def scalar_stats(points):
+    """The original compute_and_store_trip loop."""
+    distance_nm = 0.0
+    for i in range(len(points) - 1):
+        p1 = points[i]
+        p2 = points[i + 1]
+        distance_nm += haversine_nm(p1["lat"], p1["lon"], p2["lat"], p2["lon"])
+    speeds = [p["speed_kn"] for p in points if p.get("speed_kn") is not None]
+    max_speed_kn = max(speeds) if speeds else 0.0
+    return distance_nm, max_speed_kn
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    print(
+        f"{'points':>10} {'scalar s':>10} {'pack s':>10} {'numpy s':>10}"
+        f" {'compute':>9} {'end2end':>9}"
+    )
+    for n in sizes:
+        points = synthetic_points(n)
+        (dist_ref, _), t_scalar = timed(scalar_stats, points)
+        arrays, t_pack = timed(points_to_arrays, points)
+        stats, t_vec = timed(compute_trip_stats, arrays)
+        assert abs(stats.distance_nm - dist_ref) <= 1e-9 * max(1.0, dist_ref)
+        print(
+            f"{n:>10} {t_scalar:>10.4f} {t_pack:>10.4f} {t_vec:>10.4f}"
+            f" {t_scalar / t_vec:>8.1f}x {t_scalar / (t_pack + t_vec):>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
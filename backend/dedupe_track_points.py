@@ -0,0 +1,49 @@
+"""Remove duplicate fixes from ``track_points`` before the unique index exists.
+
+The server does this itself when it first builds the unique index; run it
+by hand if startup logged that duplicates still blocked the build.
+
+Run from the backend directory with the same .env as the server:
+
+    python dedupe_track_points.py [--dry-run]
+
+For every (track_id, timestamp) stored more than once, the earliest
+inserted document is kept and the rest are deleted. Affected tracks have
+their running stats marked stale so the next read recomputes them.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from indexes import remove_duplicate_fixes
+
+logger = logging.getLogger("dedupe_track_points")
+
+
+async def dedupe(dry_run: bool) -> None:
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        removed, tracks = await remove_duplicate_fixes(client[os.environ["DB_NAME"]], dry_run=dry_run)
+    finally:
+        client.close()
+    verb = "Would remove" if dry_run else "Removed"
+    logger.info("%s %d duplicate fixes across %d tracks", verb, removed, tracks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only report duplicates")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    load_dotenv(Path(__file__).parent / ".env")
+    asyncio.run(dedupe(args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
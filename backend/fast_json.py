@@ -0,0 +1,52 @@
+"""JSON encoding for the list endpoints without a model object per row.
+
+The list endpoints map documents to plain dicts in the response schema's
+field order and return them through ``FastJSONResponse``, skipping Pydantic
+construction, ``response_model`` re-validation and ``jsonable_encoder``.
+Bodies are byte-identical to what FastAPI's ``JSONResponse`` would produce
+for the same models.
+"""
+import json
+import re
+from datetime import datetime
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+# orjson writes some floats differently from the stdlib (0.00001 vs 1e-05,
+# 1e16 vs 1e+16). Bodies containing anything that looks like such a number
+# are re-encoded with json so the output stays identical; false positives
+# (e.g. a name like "Buoy 3e4") only cost the slower encoder.
+_FLOAT_FORMAT_MISMATCH = re.compile(rb"\d[eE]|(?<![\d.])0\.0000")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        body = orjson.dumps(content)
+        if not _FLOAT_FORMAT_MISMATCH.search(body):
+            return body
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
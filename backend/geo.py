@@ -0,0 +1,167 @@
+"""Great-circle helpers shared by the track, trip and route code."""
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_NM = 1.852
+
+
+def haversine_nm(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in nautical miles."""
+    r_km = EARTH_RADIUS_KM
+    km_per_nm = KM_PER_NM
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    d_km = r_km * c
+    return d_km / km_per_nm
+
+
+def haversine_nm_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Element-wise great-circle distance in nautical miles.
+
+    Same formula as ``haversine_nm`` evaluated over float64 arrays (or
+    anything that broadcasts against them).
+    """
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    lon1 = np.asarray(lon1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    lon2 = np.asarray(lon2, dtype=np.float64)
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c / KM_PER_NM
+
+
+def initial_bearing_deg_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Element-wise initial great-circle bearing, degrees clockwise from
+    true north in [0, 360)."""
+    phi1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    phi2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    dlambda = np.radians(np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64))
+    y = np.sin(dlambda) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlambda)
+    return np.mod(np.degrees(np.arctan2(y, x)), 360.0)
+
+
+def leg_distances_nm(lats, lons) -> np.ndarray:
+    """Distances between consecutive points of a polyline (length n - 1)."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if lats.size < 2:
+        return np.zeros(0, dtype=np.float64)
+    return haversine_nm_array(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+def distance_matrix_nm(lats, lons) -> np.ndarray:
+    """All-pairs great-circle distances (n x n) in nautical miles.
+
+    The haversine terms are expanded with the angle-difference identities
+    so the trigonometry runs once per point and only products and one
+    arcsin run over the n x n broadcast.
+    """
+    half_phi = np.radians(np.asarray(lats, dtype=np.float64)) / 2
+    half_lam = np.radians(np.asarray(lons, dtype=np.float64)) / 2
+    sp, cp = np.sin(half_phi), np.cos(half_phi)
+    sl, cl = np.sin(half_lam), np.cos(half_lam)
+    cos_phi = cp * cp - sp * sp
+    # sin((x_j - x_i) / 2) = sin(x_j/2) cos(x_i/2) - cos(x_j/2) sin(x_i/2)
+    sin_dphi = sp[None, :] * cp[:, None] - cp[None, :] * sp[:, None]
+    sin_dlam = sl[None, :] * cl[:, None] - cl[None, :] * sl[:, None]
+    a = sin_dphi * sin_dphi + np.outer(cos_phi, cos_phi) * (sin_dlam * sin_dlam)
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return EARTH_RADIUS_KM * c / KM_PER_NM
+
+
+def path_distance_nm(lats, lons) -> float:
+    """Total length of a polyline in nautical miles."""
+    return float(leg_distances_nm(lats, lons).sum())
+
+
+# Web-Mercator ground resolution at zoom 0 on the equator, metres per pixel.
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+
+def meters_per_pixel(zoom: int, lat: float) -> float:
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def project_local_m(lats, lons):
+    """Equirectangular projection in metres around the mean latitude.
+
+    Accurate enough for measuring how far a fix strays from a chord over the
+    span of one track.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    r_m = EARTH_RADIUS_KM * 1000.0
+    lat0 = np.radians(lats.mean()) if lats.size else 0.0
+    x = r_m * np.radians(lons) * np.cos(lat0)
+    y = r_m * np.radians(lats)
+    return x, y
+
+
+def douglas_peucker_significance(x, y, min_tolerance: float = 0.0) -> np.ndarray:
+    """Per-point Douglas-Peucker significance.
+
+    A point survives simplification at tolerance ``tol`` exactly when its
+    significance is greater than ``tol``, so one pass serves every
+    tolerance. Endpoints are infinitely significant. Splitting stops below
+    ``min_tolerance``, which bounds the work on dense tracks.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.size
+    sig = np.zeros(n, dtype=np.float64)
+    if n == 0:
+        return sig
+    sig[0] = sig[-1] = np.inf
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        i, j, cap = stack.pop()
+        if j - i < 2:
+            continue
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        px, py = x[i + 1 : j] - x[i], y[i + 1 : j] - y[i]
+        chord = math.hypot(dx, dy)
+        if chord > 0:
+            dist = np.abs(px * dy - py * dx) / chord
+        else:
+            dist = np.hypot(px, py)
+        k = int(dist.argmax())
+        # A child can never outlive its parent split.
+        d = min(float(dist[k]), cap)
+        if d <= min_tolerance:
+            continue
+        sig[i + 1 + k] = d
+        stack.append((i, i + 1 + k, d))
+        stack.append((i + 1 + k, j, d))
+    return sig
+
+
+def simplification_levels(lats, lons, zooms, tolerance_px: float = 1.0) -> dict:
+    """Douglas-Peucker simplification for each zoom level in one pass.
+
+    Returns ``{zoom: (tolerance_m, kept_indices)}`` where the tolerance is
+    ``tolerance_px`` screen pixels at that zoom and the track's mean latitude.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if lats.size == 0:
+        return {z: (0.0, np.zeros(0, dtype=np.int64)) for z in zooms}
+    lat0 = float(lats.mean())
+    tolerances = {z: tolerance_px * meters_per_pixel(z, lat0) for z in zooms}
+    x, y = project_local_m(lats, lons)
+    sig = douglas_peucker_significance(x, y, min(tolerances.values()))
+    return {z: (tol, np.flatnonzero(sig > tol)) for z, tol in tolerances.items()}
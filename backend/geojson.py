@@ -0,0 +1,100 @@
+"""GeoJSON geometries for MongoDB ``2dsphere`` fields and queries.
+
+MongoDB treats polygon edges as great-circle arcs, so a viewport box is
+built with its north and south edges densified to follow the parallels,
+and split into pieces at most ``BOX_PIECE_LON_DEG`` wide (a single ring
+wider than a hemisphere would be read as its complement). Boxes crossing
+the antimeridian are given with ``min_lon > max_lon``.
+"""
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+BOX_PIECE_LON_DEG = 90.0
+BOX_EDGE_STEP_DEG = 1.0
+# Polygon edges along a pole collapse to one repeated vertex.
+MAX_BOX_LAT = 89.9
+
+
+def point(lat: float, lon: float) -> dict:
+    return {"type": "Point", "coordinates": [float(lon), float(lat)]}
+
+
+def box_around(lat: float, lon: float, radius_nm: float) -> tuple:
+    """(min_lon, min_lat, max_lon, max_lat) enclosing a circle; one minute
+    of latitude is one nautical mile."""
+    dlat = radius_nm / 60.0
+    if abs(lat) + dlat >= 90.0:
+        return (-180.0, max(lat - dlat, -90.0), 180.0, min(lat + dlat, 90.0))
+    dlon = dlat / math.cos(math.radians(abs(lat) + dlat))
+    if dlon >= 180.0:
+        return (-180.0, lat - dlat, 180.0, lat + dlat)
+    return (wrap_lon(lon - dlon), lat - dlat, wrap_lon(lon + dlon), lat + dlat)
+
+
+def wrap_lon(lon: float) -> float:
+    return (lon + 180.0) % 360.0 - 180.0
+
+
+def boxes_overlap(a: Sequence[float], b: Sequence[float]) -> bool:
+    """Whether two (min_lon, min_lat, max_lon, max_lat) boxes intersect;
+    a box with min_lon > max_lon crosses the antimeridian."""
+    if a[1] > b[3] or b[1] > a[3]:
+        return False
+
+    def spans(box):
+        if box[0] <= box[2]:
+            return [(box[0], box[2])]
+        return [(box[0], 180.0), (-180.0, box[2])]
+
+    return any(lo1 <= hi2 and lo2 <= hi1 for lo1, hi1 in spans(a) for lo2, hi2 in spans(b))
+
+
+def _box_ring(min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> List[List[float]]:
+    steps = max(1, int(np.ceil((max_lon - min_lon) / BOX_EDGE_STEP_DEG)))
+    lons = np.linspace(min_lon, max_lon, steps + 1).tolist()
+    south = [[lon, min_lat] for lon in lons]
+    north = [[lon, max_lat] for lon in reversed(lons)]
+    return south + north + [list(south[0])]
+
+
+def box_geometry(min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> dict:
+    """A Polygon or MultiPolygon covering the lon/lat box."""
+    min_lat = max(min_lat, -MAX_BOX_LAT)
+    max_lat = min(max_lat, MAX_BOX_LAT)
+    if max_lon < min_lon:
+        max_lon += 360.0
+    max_lon = min(max_lon, min_lon + 360.0)
+    pieces = []
+    start = min_lon
+    while start < max_lon:
+        end = min(start + BOX_PIECE_LON_DEG, max_lon)
+        pieces.append([_box_ring(start, min_lat, end, max_lat)])
+        start = end
+    for rings in pieces:
+        for vertex in rings[0]:
+            # Back into [-180, 180] once past the antimeridian.
+            if vertex[0] > 180.0:
+                vertex[0] -= 360.0
+    if len(pieces) == 1:
+        return {"type": "Polygon", "coordinates": pieces[0]}
+    return {"type": "MultiPolygon", "coordinates": pieces}
+
+
+def line_geometry(coordinates: Sequence[Sequence[float]]) -> Optional[dict]:
+    """A LineString over [lon, lat] pairs that MongoDB will index.
+
+    Consecutive repeated vertices are dropped (2dsphere rejects them); a
+    line that collapses to one position becomes a Point, and no positions
+    give None.
+    """
+    coords = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    if not len(coords):
+        return None
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    coords = coords[keep]
+    if len(coords) == 1:
+        return {"type": "Point", "coordinates": coords[0].tolist()}
+    return {"type": "LineString", "coordinates": coords.tolist()}
@@ -0,0 +1,173 @@
+"""Incremental GPX reader for bulk imports.
+
+``GpxReader`` is fed the upload a chunk at a time and hands back the
+tracks, fixes and waypoints completed by each chunk. Finished elements are
+detached from the tree as soon as they have been read, so memory does not
+grow with the size of the file. GPX 1.0 ``<speed>``/``<course>`` and the
+usual 1.1 ``<extensions>`` equivalents (m/s and degrees) are picked up; a
+fix without a valid time or position is counted in ``skipped``.
+"""
+import math
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Union
+from xml.etree.ElementTree import Element, XMLPullParser
+
+from trip_stats import to_epoch_seconds
+
+MS_TO_KNOTS = 3600.0 / 1852.0
+
+
+class GpxTrackStart(NamedTuple):
+    name: Optional[str]
+
+
+class GpxFix(NamedTuple):
+    t: float
+    lat: float
+    lon: float
+    speed_kn: float  # NaN when absent
+    course_deg: float  # NaN when absent
+
+
+class GpxTrackEnd(NamedTuple):
+    pass
+
+
+class GpxWaypoint(NamedTuple):
+    name: str
+    description: Optional[str]
+    lat: float
+    lon: float
+
+
+GpxItem = Union[GpxTrackStart, GpxFix, GpxTrackEnd, GpxWaypoint]
+
+
+_LOCAL_NAMES: Dict[str, str] = {}
+
+
+def local_name(tag: str) -> str:
+    """``{namespace}name`` -> ``name``; memoized, GPX uses few tags."""
+    name = _LOCAL_NAMES.get(tag)
+    if name is None:
+        name = _LOCAL_NAMES[tag] = tag.rsplit("}", 1)[-1]
+    return name
+
+
+def parse_time(text: Optional[str]) -> Optional[float]:
+    if not text:
+        return None
+    try:
+        return to_epoch_seconds(datetime.fromisoformat(text.strip()))
+    except ValueError:
+        return None
+
+
+def parse_position(elem: Element) -> Optional[tuple]:
+    try:
+        lat, lon = float(elem.get("lat")), float(elem.get("lon"))
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+def child_text(elem: Element, name: str) -> Optional[str]:
+    for child in elem:
+        if local_name(child.tag) == name:
+            return (child.text or "").strip() or None
+    return None
+
+
+def parse_float(text: Optional[str]) -> float:
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class GpxReader:
+    def __init__(self):
+        self._parser = XMLPullParser(events=("start", "end"))
+        self._stack: List[Element] = []
+        self._track_name: Optional[str] = None
+        self._track_started = False
+        self.skipped = 0
+
+    def feed(self, data: bytes) -> List[GpxItem]:
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> List[GpxItem]:
+        """Finish parsing; raises ``xml.etree.ElementTree.ParseError`` on a
+        truncated or malformed document."""
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> List[GpxItem]:
+        items: List[GpxItem] = []
+        for event, elem in self._parser.read_events():
+            name = local_name(elem.tag)
+            if event == "start":
+                self._stack.append(elem)
+                if name == "trk":
+                    self._track_name = None
+                    self._track_started = False
+                elif name == "trkseg" and not self._track_started:
+                    self._track_started = True
+                    items.append(GpxTrackStart(self._track_name))
+                continue
+
+            self._stack.pop()
+            parent = self._stack[-1] if self._stack else None
+            parent_name = local_name(parent.tag) if parent is not None else None
+            if name == "trkpt":
+                fix = self._fix(elem)
+                if fix is None:
+                    self.skipped += 1
+                else:
+                    items.append(fix)
+            elif name == "name" and parent_name == "trk":
+                self._track_name = (elem.text or "").strip() or None
+            elif name == "trk" and self._track_started:
+                items.append(GpxTrackEnd())
+            elif name == "wpt" and parent_name == "gpx":
+                waypoint = self._waypoint(elem)
+                if waypoint is not None:
+                    items.append(waypoint)
+
+            # Detach what has been read. The element just closed is always
+            # its parent's last child, so this is O(1).
+            if parent is not None and name in ("trkpt", "trkseg", "trk", "wpt", "rte", "metadata"):
+                del parent[-1]
+        return items
+
+    @staticmethod
+    def _fix(elem: Element) -> Optional[GpxFix]:
+        position = parse_position(elem)
+        if position is None:
+            return None
+        t = None
+        speed = course = math.nan
+        # One pass over the fix and its extensions.
+        for node in elem.iter():
+            name = local_name(node.tag)
+            if name == "time":
+                t = parse_time(node.text)
+            elif name == "speed":
+                speed = parse_float(node.text) * MS_TO_KNOTS
+            elif name == "course":
+                course = parse_float(node.text)
+        if t is None:
+            return None
+        return GpxFix(t, position[0], position[1], speed, course)
+
+    @staticmethod
+    def _waypoint(elem: Element) -> Optional[GpxWaypoint]:
+        position = parse_position(elem)
+        if position is None:
+            return None
+        name = child_text(elem, "name") or f"{position[0]:.5f}, {position[1]:.5f}"
+        description = child_text(elem, "desc") or child_text(elem, "cmt")
+        return GpxWaypoint(name, description, position[0], position[1])
@@ -0,0 +1,342 @@
+"""Offline tide prediction from harmonic constituents.
+
+Water level is the classic harmonic sum
+
+    h(t) = Z0 + sum_j f_j H_j cos(speed_j * t + (V0 + u)_j - kappa_j)
+
+with each station's amplitudes ``H`` and Greenwich phase lags ``kappa``
+from NOAA, equilibrium arguments ``V0`` from the mean longitudes of the
+Moon and Sun (Meeus polynomials) and node factors ``f``/``u`` from
+Schureman's formulas, evaluated once per calendar year at mid-year as NOAA
+does.
+
+The sum is vectorized over constituents and time. A series is cut into
+blocks of ``BLOCK_STEPS`` samples so that every term factors into a
+per-block phasor times a per-offset phasor; the whole series is then one
+complex matrix product instead of one cosine per constituent per sample,
+which takes a year at 6-minute steps (87 600 samples, 37 constituents) to a
+few milliseconds.
+"""
+import json
+import logging
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from trip_stats import from_epoch_seconds, to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+FEET_PER_METER = 1 / 0.3048
+DEFAULT_STEP_S = 360
+BLOCK_STEPS = 240
+# Extrema near the ends of a window need samples on both sides.
+EXTREMA_MARGIN = timedelta(hours=3)
+
+# Doodson-style argument multipliers over (T + h - s, s, h, p, N, p1, 90 deg)
+# and node-factor recipe {base node: exponent} for NOAA's 37 standard
+# constituents. Compound tides combine their members' arguments and nodes.
+_BASE = {
+    "M2": ((2, 0, 0, 0, 0, 0, 0), {"M2": 1}),
+    "S2": ((2, 2, -2, 0, 0, 0, 0), {}),
+    "N2": ((2, -1, 0, 1, 0, 0, 0), {"M2": 1}),
+    "K1": ((1, 1, 0, 0, 0, 0, -1), {"K1": 1}),
+    "O1": ((1, -1, 0, 0, 0, 0, 1), {"O1": 1}),
+    "NU2": ((2, -1, 2, -1, 0, 0, 0), {"M2": 1}),
+    "2N2": ((2, -2, 0, 2, 0, 0, 0), {"M2": 1}),
+    "OO1": ((1, 3, 0, 0, 0, 0, -1), {"OO1": 1}),
+    "LAM2": ((2, 1, -2, 1, 0, 0, 2), {"M2": 1}),
+    "S1": ((1, 1, -1, 0, 0, 0, 0), {}),
+    "M1": ((1, 0, 0, 0, 0, 0, 1), {"M1": 1}),
+    "J1": ((1, 2, 0, -1, 0, 0, -1), {"J1": 1}),
+    "MM": ((0, 1, 0, -1, 0, 0, 0), {"Mm": 1}),
+    "SSA": ((0, 0, 2, 0, 0, 0, 0), {}),
+    "SA": ((0, 0, 1, 0, 0, 0, 0), {}),
+    "MF": ((0, 2, 0, 0, 0, 0, 0), {"Mf": 1}),
+    "Q1": ((1, -2, 0, 1, 0, 0, 1), {"O1": 1}),
+    "T2": ((2, 2, -3, 0, 0, 1, 0), {}),
+    "R2": ((2, 2, -1, 0, 0, -1, 2), {}),
+    "P1": ((1, 1, -2, 0, 0, 0, 1), {}),
+    "M3": ((3, 0, 0, 0, 0, 0, 0), {"M2": 1.5}),
+    "L2": ((2, 1, 0, -1, 0, 0, 2), {"L2": 1}),
+    "K2": ((2, 2, 0, 0, 0, 0, 0), {"K2": 1}),
+}
+_COMPOUND = {
+    "M4": {"M2": 2},
+    "M6": {"M2": 3},
+    "M8": {"M2": 4},
+    "MK3": {"M2": 1, "K1": 1},
+    "2MK3": {"M2": 1, "O1": 1},
+    "S4": {"S2": 2},
+    "S6": {"S2": 3},
+    "MN4": {"M2": 1, "N2": 1},
+    "MS4": {"M2": 1, "S2": 1},
+    "MU2": {"M2": 2, "S2": -1},
+    "2SM2": {"S2": 2, "M2": -1},
+    "MSF": {"S2": 1, "M2": -1},
+    "2Q1": {"N2": 1, "J1": -1},
+    "RHO": {"NU2": 1, "K1": -1},
+}
+
+
+def _combine(members: Dict[str, int]) -> Tuple[tuple, dict]:
+    arguments = np.zeros(7)
+    nodes: Dict[str, float] = {}
+    for name, n in members.items():
+        member_args, member_nodes = _BASE[name]
+        arguments += n * np.asarray(member_args)
+        for node, power in member_nodes.items():
+            nodes[node] = nodes.get(node, 0) + n * power
+    return tuple(arguments.tolist()), nodes
+
+
+CONSTITUENTS = {**_BASE, **{name: _combine(members) for name, members in _COMPOUND.items()}}
+NODE_NAMES = ("M2", "K1", "O1", "OO1", "J1", "M1", "Mm", "Mf", "L2", "K2")
+
+
+def _julian_centuries(epoch_s: float) -> Tuple[float, float]:
+    jd = epoch_s / 86400.0 + 2440587.5
+    return jd, (jd - 2451545.0) / 36525.0
+
+
+def astronomical_arguments(epoch_s: float) -> np.ndarray:
+    """(T + h - s, s, h, p, N, p1, 90) in degrees at ``epoch_s`` (UTC)."""
+    jd, t = _julian_centuries(epoch_s)
+    s = 218.3164591 + 481267.88134236 * t - 0.0013268 * t**2 + t**3 / 538841.0 - t**4 / 65194000.0
+    h = 280.46645 + 36000.76983 * t + 0.0003032 * t**2
+    p = 83.3532430 + 4069.0137111 * t - 0.0103238 * t**2 - t**3 / 80053.0 + t**4 / 18999000.0
+    n = 125.0445550 - 1934.1361849 * t + 0.0020762 * t**2 + t**3 / 467410.0 - t**4 / 60616000.0
+    p1 = -77.0626500 + 1.7190200 * t + 0.0004591 * t**2 + 0.00000048 * t**3
+    # Hour angle of the mean Sun at Greenwich: zero at noon UT.
+    hour_angle = (jd - math.floor(jd)) * 360.0
+    return np.mod([hour_angle + h - s, s, h, p, n, p1, 90.0], 360.0)
+
+
+def node_factors(epoch_s: float) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Schureman's node factors ``f`` and corrections ``u`` (degrees)."""
+    _, t = _julian_centuries(epoch_s)
+    args = astronomical_arguments(epoch_s)
+    p, n = math.radians(args[3]), math.radians(args[4])
+    omega = math.radians(23.4392911 - 0.0130042 * t)  # obliquity of the ecliptic
+    i = math.radians(5.145)  # inclination of the lunar orbit
+
+    cos_big_i = math.cos(i) * math.cos(omega) - math.sin(i) * math.sin(omega) * math.cos(n)
+    big_i = math.acos(cos_big_i)
+    a1 = math.atan(math.cos((omega - i) / 2) / math.cos((omega + i) / 2) * math.tan(n / 2)) - n / 2
+    a2 = math.atan(math.sin((omega - i) / 2) / math.sin((omega + i) / 2) * math.tan(n / 2)) - n / 2
+    xi, nu = -(a1 + a2), a1 - a2
+    sin2i = math.sin(2 * big_i)
+    nu_p = math.atan2(sin2i * math.sin(nu), sin2i * math.cos(nu) + 0.3347)
+    two_nu_pp = math.atan2(
+        math.sin(big_i) ** 2 * math.sin(2 * nu), math.sin(big_i) ** 2 * math.cos(2 * nu) + 0.0727
+    )
+    big_p = p - xi
+
+    # Mean values of the lunar terms, for normalizing f to 1 on average.
+    sin_w, cos_hw, cos_hi = math.sin(omega), math.cos(omega / 2), math.cos(i / 2)
+    sin_i_mean = 1 - 1.5 * math.sin(i) ** 2
+    f_m2 = math.cos(big_i / 2) ** 4 / (cos_hw**4 * cos_hi**4)
+    f_o1 = (math.sin(big_i) * math.cos(big_i / 2) ** 2) / (sin_w * cos_hw**2 * cos_hi**4)
+    r_a_inv = math.sqrt(
+        1 - 12 * math.tan(big_i / 2) ** 2 * math.cos(2 * big_p) + 36 * math.tan(big_i / 2) ** 4
+    )
+    q_a_inv = math.sqrt(
+        0.25
+        + 1.5 * math.cos(big_i) / math.cos(big_i / 2) ** 2 * math.cos(2 * big_p)
+        + 2.25 * math.cos(big_i) ** 2 / math.cos(big_i / 2) ** 4
+    )
+    f = {
+        "M2": f_m2,
+        "O1": f_o1,
+        "K1": math.sqrt(0.2523 * sin2i**2 + 0.1689 * sin2i * math.cos(nu) + 0.0283)
+        / (0.5023 * math.sin(2 * omega) * sin_i_mean + 0.1681),
+        "OO1": math.sin(big_i) * math.sin(big_i / 2) ** 2
+        / (sin_w * math.sin(omega / 2) ** 2 * cos_hi**4),
+        "J1": sin2i / (math.sin(2 * omega) * sin_i_mean),
+        "M1": f_o1 * q_a_inv,
+        "Mm": (2 / 3 - math.sin(big_i) ** 2) / ((2 / 3 - sin_w**2) * sin_i_mean),
+        "Mf": math.sin(big_i) ** 2 / (sin_w**2 * cos_hi**4),
+        "L2": f_m2 * r_a_inv,
+        "K2": math.sqrt(
+            0.2533 * math.sin(big_i) ** 4 + 0.0367 * math.sin(big_i) ** 2 * math.cos(2 * nu) + 0.0013
+        )
+        / (0.5023 * sin_w**2 * sin_i_mean + 0.0365),
+    }
+    r = math.atan(math.sin(2 * big_p) / (math.tan(big_i / 2) ** -2 / 6 - math.cos(2 * big_p)))
+    q = math.atan((5 * math.cos(big_i) - 1) / (7 * math.cos(big_i) + 1) * math.tan(big_p))
+    u = {
+        "M2": 2 * xi - 2 * nu,
+        "O1": 2 * xi - nu,
+        "K1": -nu_p,
+        "OO1": -2 * xi - nu,
+        "J1": -nu,
+        "M1": xi - nu + q,
+        "Mm": 0.0,
+        "Mf": -2 * xi,
+        "L2": 2 * xi - 2 * nu - r,
+        "K2": -two_nu_pp,
+    }
+    return f, {name: math.degrees(value) for name, value in u.items()}
+
+
+@dataclass
+class HarmonicModel:
+    """One station's constituents, in the station's height units."""
+
+    station_id: str
+    name: str
+    z0: float  # mean sea level above the prediction datum
+    units: str
+    constituents: List[str]
+    amplitude: np.ndarray
+    phase_deg: np.ndarray  # Greenwich phase lag (kappa)
+    speed_deg_h: np.ndarray
+    arguments: np.ndarray  # (n, 7) argument multipliers
+    node_powers: np.ndarray  # (n, len(NODE_NAMES))
+
+    @classmethod
+    def from_doc(cls, station_id: str, doc: dict) -> "HarmonicModel":
+        names, amplitude, phase, speed = [], [], [], []
+        for c in doc["constituents"]:
+            name = c["name"].upper()
+            if name not in CONSTITUENTS:
+                logger.warning("Station %s: skipping unknown constituent %s", station_id, name)
+                continue
+            if not c["amplitude"]:
+                continue
+            names.append(name)
+            amplitude.append(c["amplitude"])
+            phase.append(c["phase_gmt"])
+            speed.append(c["speed"])
+        return cls(
+            station_id=station_id,
+            name=doc.get("name", ""),
+            z0=float(doc["z0"]),
+            units=doc.get("units", "meters"),
+            constituents=names,
+            amplitude=np.asarray(amplitude, dtype=np.float64),
+            phase_deg=np.asarray(phase, dtype=np.float64),
+            speed_deg_h=np.asarray(speed, dtype=np.float64),
+            arguments=np.array([CONSTITUENTS[n][0] for n in names], dtype=np.float64).reshape(-1, 7),
+            node_powers=np.array(
+                [[CONSTITUENTS[n][1].get(node, 0) for node in NODE_NAMES] for n in names],
+                dtype=np.float64,
+            ).reshape(-1, len(NODE_NAMES)),
+        )
+
+    def _year_terms(self, start_s: float, year: int) -> np.ndarray:
+        """Complex amplitude f H exp(i (V0 + u - kappa)) at ``start_s``."""
+        mid_year = to_epoch_seconds(datetime(year, 7, 2))
+        f, u = node_factors(mid_year)
+        f_vec = np.array([f[n] for n in NODE_NAMES])
+        u_vec = np.array([u[n] for n in NODE_NAMES])
+        node_f = np.prod(f_vec ** np.abs(self.node_powers), axis=1)
+        node_u = self.node_powers @ u_vec
+        v0 = self.arguments @ astronomical_arguments(start_s)
+        phase = np.radians(v0 + node_u - self.phase_deg)
+        return node_f * self.amplitude * np.exp(1j * phase)
+
+    def water_levels(self, start: datetime, end: datetime, step_s: int = DEFAULT_STEP_S):
+        """Epoch seconds and heights every ``step_s`` in [start, end)."""
+        start_s, end_s = to_epoch_seconds(start), to_epoch_seconds(end)
+        times = np.arange(start_s, end_s, step_s, dtype=np.float64)
+        heights = np.empty(len(times))
+        omega = np.radians(self.speed_deg_h) * step_s / 3600.0  # radians per step
+        offsets = np.exp(1j * np.outer(omega, np.arange(BLOCK_STEPS)))  # (n, B)
+        # Node factors change per calendar year; evaluate each year apart.
+        year = start.year
+        lo = 0
+        while lo < len(times):
+            boundary = to_epoch_seconds(datetime(year + 1, 1, 1))
+            hi = int(np.searchsorted(times, boundary, side="left"))
+            if hi > lo:
+                terms = self._year_terms(times[lo], year)
+                n_blocks = -(-(hi - lo) // BLOCK_STEPS)
+                blocks = np.exp(1j * np.outer(np.arange(n_blocks) * BLOCK_STEPS, omega))  # (b, n)
+                series = ((blocks * terms) @ offsets).real.ravel()
+                heights[lo:hi] = self.z0 + series[: hi - lo]
+            lo = hi
+            year += 1
+        return times, heights
+
+    def high_low(self, start: datetime, end: datetime, step_s: int = DEFAULT_STEP_S):
+        """(time, height, "H" | "L") for each extremum in [start, end)."""
+        times, heights = self.water_levels(start - EXTREMA_MARGIN, end + EXTREMA_MARGIN, step_s)
+        events = []
+        for t, height, kind in extrema(times, heights):
+            when = from_epoch_seconds(t)
+            if start <= when < end:
+                events.append((when, height, kind))
+        return events
+
+
+def extrema(times: np.ndarray, heights: np.ndarray) -> List[Tuple[float, float, str]]:
+    """Turning points of a sampled series, refined by a parabola through
+    each extreme sample and its neighbours."""
+    slope = np.diff(heights)
+    k = np.flatnonzero(np.sign(slope[:-1]) != np.sign(slope[1:])) + 1
+    k = k[(slope[k - 1] != 0)]
+    y0, y1, y2 = heights[k - 1], heights[k], heights[k + 1]
+    curvature = y0 - 2 * y1 + y2
+    safe = np.where(curvature == 0, 1.0, curvature)
+    offset = np.where(curvature == 0, 0.0, 0.5 * (y0 - y2) / safe)
+    peak = y1 - 0.25 * (y0 - y2) * offset
+    step = times[1] - times[0] if len(times) > 1 else 0.0
+    when = times[k] + offset * step
+    kinds = np.where(curvature < 0, "H", "L")
+    return list(zip(when.tolist(), peak.tolist(), kinds.tolist()))
+
+
+def station_doc_from_noaa(name: str, harcon: dict, datums: dict, datum: str = "MLLW") -> dict:
+    """Constituent-file entry from NOAA metadata ``harcon`` and ``datums``.
+
+    Heights are referred to ``datum`` by taking Z0 as MSL above it.
+    """
+    if harcon.get("units") != datums.get("units"):
+        raise ValueError("harcon and datums use different units")
+    levels = {d["name"]: d["value"] for d in datums["datums"]}
+    return {
+        "name": name,
+        "units": harcon["units"],
+        "datum": datum,
+        "z0": levels["MSL"] - levels[datum],
+        "constituents": [
+            {
+                "name": c["name"],
+                "amplitude": c["amplitude"],
+                "phase_gmt": c["phase_GMT"],
+                "speed": c["speed"],
+            }
+            for c in harcon["HarmonicConstituents"]
+        ],
+    }
+
+
+def to_feet(height: float, units: str) -> float:
+    return height * FEET_PER_METER if units == "meters" else height
+
+
+def load_constituent_file(path: Path) -> Dict[str, HarmonicModel]:
+    """Models for every station in a constituent file; empty if absent."""
+    if not path.exists():
+        return {}
+    with open(path) as fh:
+        stations = json.load(fh)["stations"]
+    return {station_id: HarmonicModel.from_doc(station_id, doc) for station_id, doc in stations.items()}
+
+
+def predictions_for_day(model: HarmonicModel, day) -> List[dict]:
+    """Hi/lo events for one UTC day as ``TidePredictionPoint`` dicts, in
+    feet and rounded to the minute like NOAA's hilo product."""
+    start = datetime(day.year, day.month, day.day)
+    points = []
+    for when, height, kind in model.high_low(start, start + timedelta(days=1)):
+        minute = (when + timedelta(seconds=30)).replace(second=0, microsecond=0)
+        points.append(
+            {"time": minute, "height_ft": round(to_feet(height, model.units), 3), "type": kind}
+        )
+    return points
@@ -0,0 +1,62 @@
+"""Download NOAA harmonic constituents into the offline constituent file.
+
+Run from the backend directory while online:
+
+    python import_tide_constituents.py STATION_ID [STATION_ID ...] [--file PATH]
+
+Each station's constituents (metric) and datums are fetched from the NOAA
+metadata API and stored with Z0 referred to MLLW, the datum the live
+predictions use. Existing entries for other stations are kept, so the file
+can be built up a few stations at a time.
+"""
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+
+import httpx
+
+from harmonic_tides import station_doc_from_noaa
+
+logger = logging.getLogger("import_tide_constituents")
+
+NOAA_STATION_URL = "https://api.tidesandcurrents.noaa.gov/mdapi/prod/webapi/stations/{id}{resource}.json"
+DEFAULT_FILE = Path(__file__).parent / "tide_constituents.json"
+
+
+def fetch_station(client: httpx.Client, station_id: str) -> dict:
+    def get(resource: str) -> dict:
+        url = NOAA_STATION_URL.format(id=station_id, resource=resource)
+        resp = client.get(url, params={"units": "metric"})
+        resp.raise_for_status()
+        return resp.json()
+
+    station = get("")["stations"][0]
+    return station_doc_from_noaa(station["name"], get("/harcon"), get("/datums"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("station_ids", nargs="+")
+    parser.add_argument(
+        "--file",
+        type=Path,
+        default=Path(os.environ.get("TIDE_CONSTITUENTS_FILE", DEFAULT_FILE)),
+        help="constituent file to create or update",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    data = json.loads(args.file.read_text()) if args.file.exists() else {"stations": {}}
+    with httpx.Client(timeout=30) as client:
+        for station_id in args.station_ids:
+            doc = fetch_station(client, station_id)
+            data["stations"][station_id] = doc
+            logger.info("Station %s (%s): %d constituents", station_id, doc["name"], len(doc["constituents"]))
+    args.file.write_text(json.dumps(data, indent=1))
+    logger.info("Wrote %d stations to %s", len(data["stations"]), args.file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Index bootstrap and query-plan checks run at startup.
+
+``ensure_indexes`` is idempotent: ``create_indexes`` is a no-op for indexes
+that already exist with the same key and options. Moving ``track_points``
+to its unique index removes duplicate fixes first; if the build still
+fails on duplicates, the non-unique index is kept and the server carries
+on without idempotent ingest until ``dedupe_track_points.py`` is run.
+``trips`` gets the same treatment for its unique ``track_id``, keeping the
+most recently updated trip of each track.
+Documents written before ``updated_at`` existed are given one, so
+``updated_since`` sync listings see them.
+``check_query_plans``
+explains every hot query and raises if any of them would scan a whole
+collection, so a missing or mismatched index shows up at boot instead of as
+slow requests.
+"""
+import logging
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+from geojson import box_geometry, point
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+# Unique so re-sent fixes are rejected by the index on insert.
+FIX_INDEX = IndexModel(
+    [("track_id", ASCENDING), ("timestamp", ASCENDING)],
+    name="track_id_timestamp_unique",
+    unique=True,
+)
+# What track_points had before; kept as the fallback when duplicates block
+# the unique build.
+LEGACY_FIX_INDEX = IndexModel([("track_id", ASCENDING), ("timestamp", ASCENDING)], name="track_id_timestamp")
+
+# Groups of fixes stored more than once, earliest inserted first.
+DUPLICATE_FIXES_PIPELINE = [
+    {"$sort": {"_id": 1}},
+    {
+        "$group": {
+            "_id": {"track_id": "$track_id", "timestamp": "$timestamp"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }
+    },
+    {"$match": {"count": {"$gt": 1}}},
+]
+
+# One trip per track; a non-unique index stands in while duplicates remain.
+TRIP_INDEX = IndexModel([("track_id", ASCENDING)], name="track_id_unique", unique=True)
+FALLBACK_TRIP_INDEX = IndexModel([("track_id", ASCENDING)], name="track_id")
+
+# Tracks with more than one trip, most recently updated trip first.
+DUPLICATE_TRIPS_PIPELINE = [
+    {"$sort": {"updated_at": -1, "_id": -1}},
+    {"$group": {"_id": "$track_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+    {"$match": {"count": {"$gt": 1}}},
+]
+
+DELETE_BATCH = 1000
+
+# Where each sync-listed collection's missing updated_at is taken from.
+UPDATED_AT_BACKFILL = {
+    "tracks": "start_time",
+    "trips": "start_time",
+    "waypoints": "created_at",
+    "routes": "created_at",
+}
+
+# How long tombstones of deleted waypoints and routes are kept for sync.
+DELETION_RETENTION_S = 30 * 24 * 3600
+
+
+INDEXES = {
+    # Built by ensure_fix_index, which handles the move from the legacy index.
+    "track_points": [FIX_INDEX],
+    "ingest_batches": [
+        IndexModel([("track_id", ASCENDING), ("batch_id", ASCENDING)], name="track_id_batch_id", unique=True),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "track_point_buckets": [
+        IndexModel([("track_id", ASCENDING), ("start_time", ASCENDING)], name="track_id_start_time"),
+    ],
+    # Empty tide days carry an expires_at; full ones never expire.
+    "tide_predictions": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "track_geometries": [
+        IndexModel([("track_id", ASCENDING), ("zoom", ASCENDING)], name="track_id_zoom", unique=True),
+    ],
+    # List endpoints page by (sort field, _id) and sync by (updated_at, _id).
+    "tracks": [
+        IndexModel([("start_time", DESCENDING), ("_id", DESCENDING)], name="start_time_id"),
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"),
+        # Area queries: simplified line of finished tracks, and the few
+        # tracks still recording.
+        IndexModel([("path", GEOSPHERE)], name="path_2dsphere"),
+        IndexModel([("end_time", ASCENDING)], name="end_time"),
+    ],
+    # Built by ensure_trip_index, which removes duplicate trips first.
+    "trips": [
+        TRIP_INDEX,
+        IndexModel([("start_time", DESCENDING), ("_id", DESCENDING)], name="start_time_id"),
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"),
+    ],
+    "waypoints": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+    ],
+    "deleted_items": [
+        IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl", expireAfterSeconds=DELETION_RETENTION_S),
+    ],
+    "routes": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"),
+        # Multikey: finds the routes to patch when a waypoint changes.
+        IndexModel([("waypoint_ids", ASCENDING)], name="waypoint_ids"),
+    ],
+}
+
+
+# Indexes replaced by a better one. MongoDB refuses a new index with the same
+# keys but different options, and prefixes of a compound index are redundant.
+SUPERSEDED_INDEXES = {
+    "tracks": ["start_time"],
+    "trips": ["start_time"],
+    "waypoints": ["created_at"],
+    "routes": ["created_at"],
+}
+
+
+class HotQuery(NamedTuple):
+    collection: str
+    filter: dict
+    sort: Optional[list] = None
+
+
+def hot_queries() -> List[HotQuery]:
+    """Queries the API issues on every request path that must use an index."""
+    probe_id = ObjectId()
+    probe_box = box_geometry(-90.5, 29.0, -89.5, 30.0)
+    return [
+        HotQuery("track_points", {"track_id": probe_id}, [("timestamp", ASCENDING)]),
+        HotQuery("track_point_buckets", {"track_id": probe_id}, [("start_time", ASCENDING)]),
+        HotQuery("track_geometries", {"track_id": probe_id, "zoom": 12}),
+        HotQuery("trips", {"track_id": probe_id}),
+        HotQuery("ingest_batches", {"track_id": probe_id, "batch_id": "probe"}),
+        HotQuery("routes", {"waypoint_ids": probe_id}),
+        HotQuery("waypoints", {"location": {"$geoWithin": {"$geometry": probe_box}}}),
+        HotQuery("waypoints", {"location": {"$nearSphere": {"$geometry": point(29.5, -90.0), "$maxDistance": 1000}}}),
+        HotQuery("tracks", {"path": {"$geoIntersects": {"$geometry": probe_box}}}),
+        HotQuery("tracks", {"end_time": None}),
+        HotQuery("deleted_items", {"deleted_at": {"$gte": datetime(2000, 1, 1)}}),
+    ] + [
+        query
+        for collection, field in (
+            ("tracks", "start_time"),
+            ("trips", "start_time"),
+            ("waypoints", "created_at"),
+            ("routes", "created_at"),
+        )
+        for query in (
+            HotQuery(collection, {}, [(field, DESCENDING), ("_id", DESCENDING)]),
+            HotQuery(
+                collection,
+                {"updated_at": {"$gte": datetime(2000, 1, 1)}},
+                [("updated_at", ASCENDING), ("_id", ASCENDING)],
+            ),
+        )
+    ]
+
+
+class CollectionScanError(RuntimeError):
+    pass
+
+
+def plan_stages(plan) -> Iterator[str]:
+    """Every ``stage`` name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        stage = plan.get("stage")
+        if isinstance(stage, str):
+            yield stage
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+def winning_plan(explain: dict) -> dict:
+    planner = explain.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    # Slot-based engine (MongoDB 7+) nests the classic plan under queryPlan.
+    return plan.get("queryPlan", plan)
+
+
+async def remove_duplicate_fixes(db, dry_run: bool = False) -> Tuple[int, int]:
+    """Keep the earliest of every repeated (track_id, timestamp) fix.
+
+    Returns (fixes removed, tracks affected); affected tracks have their
+    running stats marked stale so the next read recomputes them. With
+    ``dry_run`` nothing is changed and the counts are what would be removed.
+    """
+    doomed = []
+    tracks = set()
+    removed = 0
+
+    async def delete(ids):
+        if dry_run:
+            return len(ids)
+        return (await db.track_points.delete_many({"_id": {"$in": ids}})).deleted_count
+
+    async for group in db.track_points.aggregate(DUPLICATE_FIXES_PIPELINE, allowDiskUse=True):
+        tracks.add(group["_id"]["track_id"])
+        doomed.extend(group["ids"][1:])
+        if len(doomed) >= DELETE_BATCH:
+            removed += await delete(doomed)
+            doomed = []
+    if doomed:
+        removed += await delete(doomed)
+    if tracks and not dry_run:
+        await db.tracks.update_many(
+            {"_id": {"$in": list(tracks)}},
+            {"$set": {"running_stats.stale": True}, "$inc": {"running_stats.revision": 1}},
+        )
+    return removed, len(tracks)
+
+
+async def remove_duplicate_trips(db) -> int:
+    """Keep the most recently updated trip of every track; returns trips removed."""
+    doomed = []
+    removed = 0
+    async for group in db.trips.aggregate(DUPLICATE_TRIPS_PIPELINE, allowDiskUse=True):
+        doomed.extend(group["ids"][1:])
+        if len(doomed) >= DELETE_BATCH:
+            removed += (await db.trips.delete_many({"_id": {"$in": doomed}})).deleted_count
+            doomed = []
+    if doomed:
+        removed += (await db.trips.delete_many({"_id": {"$in": doomed}})).deleted_count
+    return removed
+
+
+async def build_unique_index(collection, unique: IndexModel, fallback: IndexModel) -> bool:
+    """Replace ``fallback`` with ``unique`` once duplicates have been removed.
+
+    MongoDB will not hold two indexes on the same keys with different
+    options, so the fallback has to go before the unique one is built.
+    Duplicates written by another process in between can still break the
+    build: the fallback is then rebuilt and False returned, so the
+    collection is never left without an index on those keys.
+    """
+    existing = await collection.index_information()
+    if fallback.document["name"] in existing:
+        logger.info("Dropping superseded index %s.%s", collection.name, fallback.document["name"])
+        await collection.drop_index(fallback.document["name"])
+    try:
+        await collection.create_indexes([unique])
+    except OperationFailure as exc:
+        if exc.code != DUPLICATE_KEY:
+            raise
+        logger.error("Duplicates block the unique index %s.%s: %s", collection.name, unique.document["name"], exc)
+        await collection.create_indexes([fallback])
+        return False
+    return True
+
+
+async def ensure_fix_index(db) -> bool:
+    """Put the unique (track_id, timestamp) index on ``track_points``.
+
+    Duplicate fixes are removed first; if the build still fails, the legacy
+    non-unique index is kept.
+    """
+    existing = await db.track_points.index_information()
+    if FIX_INDEX.document["name"] in existing:
+        return True
+    removed, tracks = await remove_duplicate_fixes(db)
+    if removed:
+        logger.warning("Removed %d duplicate fixes across %d tracks", removed, tracks)
+    if not await build_unique_index(db.track_points, FIX_INDEX, LEGACY_FIX_INDEX):
+        logger.error("Re-sent fixes are stored twice until dedupe_track_points.py is run")
+        return False
+    return True
+
+
+async def ensure_trip_index(db) -> bool:
+    """Put the unique ``track_id`` index on ``trips``, keeping each track's newest trip."""
+    existing = await db.trips.index_information()
+    if TRIP_INDEX.document["name"] in existing:
+        return True
+    removed = await remove_duplicate_trips(db)
+    if removed:
+        logger.warning("Removed %d duplicate trips", removed)
+    return await build_unique_index(db.trips, TRIP_INDEX, FALLBACK_TRIP_INDEX)
+
+
+async def backfill_updated_at(db) -> None:
+    """Stamp ``updated_at`` on documents that predate it, from their sort field."""
+    for collection, field in UPDATED_AT_BACKFILL.items():
+        result = await db[collection].update_many(
+            {"updated_at": {"$exists": False}},
+            [{"$set": {"updated_at": {"$ifNull": [f"${field}", "$$NOW"]}}}],
+        )
+        if result.modified_count:
+            logger.info("Backfilled updated_at on %d %s from %s", result.modified_count, collection, field)
+
+
+async def ensure_indexes(db) -> None:
+    for collection, names in SUPERSEDED_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                logger.info("Dropping superseded index %s.%s", collection, name)
+                await db[collection].drop_index(name)
+    if await ensure_fix_index(db):
+        logger.info("Indexes ensured on track_points: %s", FIX_INDEX.document["name"])
+    if await ensure_trip_index(db):
+        logger.info("Indexes ensured on trips: %s", TRIP_INDEX.document["name"])
+    for collection, models in INDEXES.items():
+        models = [model for model in models if model is not FIX_INDEX and model is not TRIP_INDEX]
+        if not models:
+            continue
+        names = await db[collection].create_indexes(models)
+        logger.info("Indexes ensured on %s: %s", collection, ", ".join(names))
+    await backfill_updated_at(db)
+
+
+async def check_query_plans(db) -> None:
+    queries = hot_queries()
+    offenders = []
+    for query in queries:
+        cursor = db[query.collection].find(query.filter)
+        if query.sort:
+            cursor = cursor.sort(query.sort)
+        stages = set(plan_stages(winning_plan(await cursor.explain())))
+        if "COLLSCAN" in stages:
+            offenders.append(f"{query.collection} {query.filter} sort={query.sort}")
+    if offenders:
+        for offender in offenders:
+            logger.error("Hot query falls back to a collection scan: %s", offender)
+        raise CollectionScanError(f"{len(offenders)} hot queries are not index-backed")
+    logger.info("All %d hot queries are index-backed", len(queries))
@@ -0,0 +1,225 @@
+"""Write-behind buffer that coalesces point uploads across requests.
+
+Phones post a handful of fixes every few seconds. Instead of one
+``insert_many`` per request, ``IngestBuffer`` queues decoded batches in
+process and writes everything queued, for all tracks, with a single
+unordered bulk insert once ``max_points`` fixes are pending or
+``max_delay_s`` has passed. Callers either return as soon as their batch is
+queued or await the flush that persists it.
+
+A failed write marks the affected tracks' running stats stale, since part of
+it may have landed without being folded in. Batches nobody is waiting on are
+requeued for a few more flushes; re-sent fixes are skipped on the way in, so
+retrying after a partial write is safe.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from point_store import point_docs
+from trip_stats import TrackArrays
+
+logger = logging.getLogger(__name__)
+
+
+class KnownIdCache:
+    """Bounded TTL set of ids already confirmed to exist."""
+
+    def __init__(self, ttl_s: float = 300.0, max_size: int = 10000):
+        self.ttl_s = ttl_s
+        self.max_size = max_size
+        self._expiry: "OrderedDict[ObjectId, float]" = OrderedDict()
+
+    def __contains__(self, key: ObjectId) -> bool:
+        expiry = self._expiry.get(key)
+        if expiry is None:
+            return False
+        if expiry < time.monotonic():
+            del self._expiry[key]
+            return False
+        return True
+
+    def add(self, key: ObjectId) -> None:
+        self._expiry[key] = time.monotonic() + self.ttl_s
+        self._expiry.move_to_end(key)
+        while len(self._expiry) > self.max_size:
+            self._expiry.popitem(last=False)
+
+    def discard(self, key: ObjectId) -> None:
+        self._expiry.pop(key, None)
+
+
+class IngestResult(NamedTuple):
+    accepted: int
+    # Only known once the batch has been written; None for queued batches.
+    inserted: Optional[int] = None
+    skipped: Optional[int] = None
+
+
+class _Entry(NamedTuple):
+    track_id: ObjectId
+    arrays: TrackArrays
+    future: asyncio.Future
+    wait: bool
+    attempts: int = 0
+
+
+class IngestBuffer:
+    def __init__(
+        self,
+        store,
+        after_flush: Callable[[ObjectId, TrackArrays], Awaitable[None]],
+        mark_stale: Callable[[List[ObjectId]], Awaitable[None]],
+        max_points: int = 5000,
+        max_delay_s: float = 1.0,
+        max_attempts: int = 3,
+    ):
+        self.store = store
+        self.after_flush = after_flush
+        self.mark_stale = mark_stale
+        self.max_points = max_points
+        self.max_delay_s = max_delay_s
+        self.max_attempts = max_attempts
+        self._pending: List[_Entry] = []
+        self._pending_points = 0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    async def submit(self, track_id: ObjectId, arrays: TrackArrays, wait: bool = False) -> IngestResult:
+        """Queue a batch; with ``wait`` return only once it has been written.
+
+        Fixes already stored for the track (same timestamp) are skipped, and
+        the waited-for result says how many.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Entry(track_id, arrays, future, wait))
+        self._pending_points += len(arrays)
+        if self._pending_points >= self.max_points or self._task is None:
+            self._wakeup.set()
+            if self._task is None:
+                # Not started (or already stopped): write through.
+                await self.flush()
+        if wait:
+            return await future
+        return IngestResult(len(arrays))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write whatever is still queued."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.max_delay_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:  # keep flushing later batches
+                logger.exception("Ingest flush failed")
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            entries, self._pending = self._pending, []
+            self._pending_points = 0
+            if not entries:
+                return
+
+            # Merge each track's batches into one time-sorted run, remembering
+            # which entry every fix came from so results can be split back.
+            by_track: Dict[ObjectId, List[int]] = defaultdict(list)
+            for i, entry in enumerate(entries):
+                by_track[entry.track_id].append(i)
+            runs = []
+            docs = []
+            for track_id, entry_ids in by_track.items():
+                arrays = TrackArrays.concat(entries[i].arrays for i in entry_ids)
+                origin = np.concatenate(
+                    [np.full(len(entries[i].arrays), i, dtype=np.int64) for i in entry_ids]
+                )
+                order = np.argsort(arrays.t, kind="stable")
+                arrays, origin = arrays.select(order), origin[order]
+                # Identical timestamps within the flush are the same fix re-sent.
+                first = np.ones(len(arrays), dtype=bool)
+                first[1:] = np.diff(arrays.t) != 0
+                arrays, origin = arrays.select(first), origin[first]
+                runs.append((track_id, arrays, origin, len(docs)))
+                docs.extend(point_docs(track_id, arrays))
+
+            try:
+                outcome = await self.store.insert(docs)
+            except Exception as exc:
+                await self._mark_stale(list(by_track))
+                self._retry_or_fail(entries, exc)
+                raise
+
+            duplicate = np.zeros(len(docs), dtype=bool)
+            duplicate[list(outcome.duplicates)] = True
+            inserted = np.zeros(len(entries), dtype=np.int64)
+            for track_id, arrays, origin, offset in runs:
+                fresh = ~duplicate[offset : offset + len(arrays)]
+                inserted += np.bincount(origin[fresh], minlength=len(entries))
+                if not fresh.any():
+                    continue
+                try:
+                    await self.after_flush(track_id, arrays.select(fresh))
+                except Exception:
+                    logger.exception("Post-flush update failed for track %s", track_id)
+                    await self._mark_stale([track_id])
+            for i, entry in enumerate(entries):
+                if not entry.future.done():
+                    n = int(inserted[i])
+                    entry.future.set_result(IngestResult(len(entry.arrays), n, len(entry.arrays) - n))
+
+    async def _mark_stale(self, track_ids: List[ObjectId]) -> None:
+        try:
+            await self.mark_stale(track_ids)
+        except Exception:
+            logger.exception("Could not mark running stats stale for tracks %s", track_ids)
+
+    def _retry_or_fail(self, entries: List[_Entry], exc: Exception) -> None:
+        """Requeue acked batches that have attempts left; fail the rest."""
+        retry = [
+            entry._replace(attempts=entry.attempts + 1)
+            for entry in entries
+            if not entry.wait and entry.attempts + 1 < self.max_attempts
+        ]
+        retried = {id(entry.future) for entry in retry}
+        failed = [entry for entry in entries if id(entry.future) not in retried]
+        if retry:
+            logger.warning(
+                "Requeueing %d buffered points after failed insert: %s",
+                sum(len(entry.arrays) for entry in retry),
+                exc,
+            )
+            self._pending[:0] = retry
+            self._pending_points += sum(len(entry.arrays) for entry in retry)
+        if failed:
+            logger.error(
+                "Dropping %d buffered points after failed insert: %s",
+                sum(len(entry.arrays) for entry in failed),
+                exc,
+            )
+        for entry in failed:
+            if not entry.future.done():
+                entry.future.set_exception(exc)
+                # Nobody may be waiting on it; don't warn about that.
+                entry.future.exception()
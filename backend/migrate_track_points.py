@@ -0,0 +1,81 @@
+"""Convert per-fix ``track_points`` documents into ``track_point_buckets``.
+
+Run from the backend directory with the same .env as the server:
+
+    python migrate_track_points.py [--track TRACK_ID ...] [--delete-source]
+
+Each track is rewritten from scratch (its existing buckets are replaced), so
+the tool is safe to re-run after an interruption. Source documents are kept
+unless ``--delete-source`` is given; switch ``TRACK_POINT_STORAGE=buckets``
+once the migration has finished.
+"""
+import argparse
+import logging
+import os
+from pathlib import Path
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from point_store import BUCKET_SIZE, POINT_FIELDS_PROJECTION, bucket_update
+
+logger = logging.getLogger("migrate_track_points")
+
+
+def bucket_document(track_id: ObjectId, docs: list) -> dict:
+    update = bucket_update(docs)
+    bucket = {"track_id": track_id}
+    bucket.update({field: spec["$each"] for field, spec in update["$push"].items()})
+    bucket.update(update["$inc"])
+    bucket.update(update["$min"])
+    bucket.update(update["$max"])
+    return bucket
+
+
+def migrate_track(db, track_id: ObjectId, delete_source: bool) -> int:
+    cursor = (
+        db.track_points.find({"track_id": track_id}, POINT_FIELDS_PROJECTION)
+        .sort("timestamp", 1)
+        .batch_size(BUCKET_SIZE)
+    )
+    db.track_point_buckets.delete_many({"track_id": track_id})
+    migrated = 0
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) == BUCKET_SIZE:
+            db.track_point_buckets.insert_one(bucket_document(track_id, batch))
+            migrated += len(batch)
+            batch = []
+    if batch:
+        db.track_point_buckets.insert_one(bucket_document(track_id, batch))
+        migrated += len(batch)
+    if delete_source:
+        db.track_points.delete_many({"track_id": track_id})
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--track", action="append", default=[], help="only migrate this track id")
+    parser.add_argument("--delete-source", action="store_true", help="remove migrated track_points")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    load_dotenv(Path(__file__).parent / ".env")
+    client = MongoClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+
+    track_ids = [ObjectId(t) for t in args.track] or db.track_points.distinct("track_id")
+    total = 0
+    for track_id in track_ids:
+        count = migrate_track(db, track_id, args.delete_source)
+        total += count
+        logger.info("Track %s: %d points -> %d buckets", track_id, count, -(-count // BUCKET_SIZE))
+    logger.info("Migrated %d points across %d tracks", total, len(track_ids))
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
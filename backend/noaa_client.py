@@ -0,0 +1,142 @@
+"""App-scoped HTTP client for the NOAA tides & currents APIs.
+
+One pooled ``httpx.AsyncClient`` is shared by every NOAA call so
+connections (and their TLS sessions) are kept alive between requests. HTTP/2
+is used when the optional ``h2`` package is installed. Transient failures
+are retried with jittered exponential backoff, and each call's latency is
+recorded per operation so the effect of pooling is visible.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+except ImportError:
+    HTTP2_AVAILABLE = False
+else:
+    HTTP2_AVAILABLE = True
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+LATENCY_WINDOW = 500
+
+
+class NoaaError(Exception):
+    """NOAA could not be reached or kept answering with an error."""
+
+
+class NoaaUnexpectedResponse(NoaaError):
+    """NOAA answered, but without the data that was asked for."""
+
+
+class LatencyStats:
+    """Rolling window of call latencies for one operation."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples_ms: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def record(self, elapsed_ms: float) -> None:
+        self.calls += 1
+        self.samples_ms.append(elapsed_ms)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 1)
+
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "last_ms": round(self.samples_ms[-1], 1) if self.samples_ms else None,
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+        }
+
+
+class NoaaClient:
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        timeout_s: float = 10.0,
+        max_attempts: int = 3,
+        backoff_s: float = 0.2,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=30.0,
+        )
+        self.timeout = httpx.Timeout(timeout_s, connect=min(timeout_s, 5.0))
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.latency: Dict[str, LatencyStats] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=self.limits, timeout=self.timeout, http2=HTTP2_AVAILABLE
+            )
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    async def get_json(self, operation: str, url: str, params: dict):
+        """GET ``url`` and decode JSON, retrying transient failures.
+
+        Latency is recorded per attempt under ``operation``. Raises
+        ``NoaaError`` once the attempts are used up or on a non-retryable
+        error status.
+        """
+        self.start()
+        stats = self.latency.setdefault(operation, LatencyStats())
+        for attempt in range(self.max_attempts):
+            if attempt:
+                stats.retries += 1
+                delay = self.backoff_s * 2 ** (attempt - 1)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            started = time.perf_counter()
+            try:
+                resp = await self._client.get(url, params=params)
+            except httpx.TransportError as exc:
+                stats.record((time.perf_counter() - started) * 1000)
+                error = f"{type(exc).__name__}: {exc}"
+                continue
+            stats.record((time.perf_counter() - started) * 1000)
+            if resp.status_code in RETRY_STATUSES:
+                error = f"HTTP {resp.status_code}"
+                continue
+            if resp.status_code != 200:
+                stats.failures += 1
+                raise NoaaError(f"{operation}: HTTP {resp.status_code}")
+            try:
+                return resp.json()
+            except ValueError:
+                stats.failures += 1
+                raise NoaaError(f"{operation}: response is not JSON") from None
+        stats.failures += 1
+        logger.warning("NOAA %s failed after %d attempts: %s", operation, self.max_attempts, error)
+        raise NoaaError(f"{operation}: {error}")
+
+    def latency_summary(self) -> dict:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "operations": {op: stats.summary() for op, stats in self.latency.items()},
+        }
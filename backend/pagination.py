@@ -0,0 +1,84 @@
+"""Keyset (seek) pagination for the list endpoints.
+
+Pages are ordered by a (field, _id) pair and the cursor carries the last
+row's values, so page N is a bounded index range scan from that position
+rather than a skip over the N - 1 pages before it. Cursors are opaque
+base64url JSON tokens that also record which ordering they belong to.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Ordering(NamedTuple):
+    field: str
+    direction: int  # 1 ascending, -1 descending
+
+    @property
+    def sort(self) -> list:
+        return [(self.field, self.direction), ("_id", self.direction)]
+
+
+# Incremental sync walks changes oldest first so a client can resume from
+# the last cursor it saw.
+SYNC_ORDERING = Ordering("updated_at", 1)
+
+
+def encode_cursor(ordering: Ordering, doc: dict) -> str:
+    payload = {
+        "f": ordering.field,
+        "d": ordering.direction,
+        "v": doc[ordering.field].isoformat(),
+        "i": str(doc["_id"]),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(ordering: Ordering, cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if (payload["f"], payload["d"]) != (ordering.field, ordering.direction):
+            raise InvalidCursor("cursor belongs to a different ordering")
+        return datetime.fromisoformat(payload["v"]), ObjectId(payload["i"])
+    except InvalidCursor:
+        raise
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidCursor("malformed cursor") from None
+
+
+def after_cursor(ordering: Ordering, value: datetime, last_id: ObjectId) -> dict:
+    """Filter for rows strictly after (value, last_id) in ``ordering``."""
+    op = "$gt" if ordering.direction > 0 else "$lt"
+    return {"$or": [{ordering.field: {op: value}}, {ordering.field: value, "_id": {op: last_id}}]}
+
+
+async def fetch_page(
+    collection,
+    ordering: Ordering,
+    query: dict,
+    cursor: Optional[str],
+    limit: int,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of documents plus the cursor for the next page (None at the end)."""
+    if cursor:
+        query = {"$and": [query, after_cursor(ordering, *decode_cursor(ordering, cursor))]}
+    docs = await collection.find(query, projection).sort(ordering.sort).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(ordering, docs[-1])
@@ -0,0 +1,111 @@
+"""Wire formats for track point uploads, decoded straight into TrackArrays.
+
+Besides the JSON ``TrackPointBatch`` body, ``POST /tracks/{id}/points``
+accepts:
+
+``application/vnd.kajun.trackpoints``
+    Packed little-endian float64 records of
+    ``(epoch_seconds, lat, lon, speed_kn, course_deg)``, 40 bytes per fix;
+    NaN marks a missing speed or course. Decoded with one ``frombuffer``.
+
+``application/x-ndjson``
+    One JSON object per line with the ``TrackPoint`` fields, read from the
+    request stream and handed back in bounded chunks for large backfills.
+
+Neither path builds a model object per point. All three formats, JSON
+included, are checked in bulk by ``validate_arrays``, so a fix is accepted
+or rejected the same way whichever one carries it.
+"""
+import json
+from datetime import datetime
+from typing import AsyncIterator, List
+
+import numpy as np
+
+from trip_stats import TrackArrays, optional_floats, to_epoch_seconds
+
+PACKED_CONTENT_TYPE = "application/vnd.kajun.trackpoints"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+PACKED_POINT_DTYPE = np.dtype("<f8")
+PACKED_FIELDS = 5
+
+
+class PointDecodeError(ValueError):
+    pass
+
+
+def validate_arrays(arrays: TrackArrays) -> TrackArrays:
+    if not np.isfinite(arrays.t).all():
+        raise PointDecodeError("timestamps must be finite")
+    if not (np.isfinite(arrays.lat).all() and (np.abs(arrays.lat) <= 90).all()):
+        raise PointDecodeError("lat must be within [-90, 90]")
+    if not (np.isfinite(arrays.lon).all() and (np.abs(arrays.lon) <= 180).all()):
+        raise PointDecodeError("lon must be within [-180, 180]")
+    return arrays
+
+
+def decode_packed(body: bytes) -> TrackArrays:
+    record_size = PACKED_FIELDS * PACKED_POINT_DTYPE.itemsize
+    if len(body) % record_size:
+        raise PointDecodeError(f"body length is not a multiple of {record_size} bytes")
+    records = np.frombuffer(body, dtype=PACKED_POINT_DTYPE).reshape(-1, PACKED_FIELDS)
+    records = records.astype(np.float64)  # native byte order, contiguous columns
+    return validate_arrays(
+        TrackArrays(
+            t=records[:, 0].copy(),
+            lat=records[:, 1].copy(),
+            lon=records[:, 2].copy(),
+            speed=records[:, 3].copy(),
+            course=records[:, 4].copy(),
+        )
+    )
+
+
+def encode_packed(arrays: TrackArrays) -> bytes:
+    """Inverse of decode_packed, for clients and tests."""
+    records = np.column_stack((arrays.t, arrays.lat, arrays.lon, arrays.speed, arrays.course))
+    return records.astype(PACKED_POINT_DTYPE).tobytes()
+
+
+def _ndjson_rows_to_arrays(rows: List[dict]) -> TrackArrays:
+    try:
+        t = np.array(
+            [to_epoch_seconds(datetime.fromisoformat(r["timestamp"])) for r in rows],
+            dtype=np.float64,
+        )
+        lat = np.array([r["lat"] for r in rows], dtype=np.float64)
+        lon = np.array([r["lon"] for r in rows], dtype=np.float64)
+        speed = optional_floats([r.get("speed_kn") for r in rows])
+        course = optional_floats([r.get("course_deg") for r in rows])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise PointDecodeError(f"invalid NDJSON point: {exc}") from None
+    return validate_arrays(TrackArrays(t=t, lat=lat, lon=lon, speed=speed, course=course))
+
+
+async def iter_ndjson_chunks(stream: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[TrackArrays]:
+    """Decode an NDJSON byte stream into TrackArrays of up to chunk_size points."""
+    buffer = b""
+    rows: List[dict] = []
+    line_no = 0
+
+    def parse(line: bytes):
+        nonlocal line_no
+        line_no += 1
+        if line.strip():
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                raise PointDecodeError(f"line {line_no} is not valid JSON") from None
+
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse(line)
+        if len(rows) >= chunk_size:
+            yield _ndjson_rows_to_arrays(rows)
+            rows = []
+    parse(buffer)
+    if rows:
+        yield _ndjson_rows_to_arrays(rows)
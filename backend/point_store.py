@@ -0,0 +1,285 @@
+"""Storage layouts for recorded track points.
+
+``DocumentPointStore`` is the original layout: one ``track_points`` document
+per GPS fix. ``BucketPointStore`` packs fixes into per-track bucket documents
+in ``track_point_buckets`` that hold up to ``BUCKET_SIZE`` fixes as parallel
+arrays, so ``track_id`` and the field names are stored once per bucket
+instead of once per fix, and reads fetch a thousand fixes per document.
+
+Both expose the same interface, so ingest, trip computation and export do
+not care which one is configured.
+"""
+from datetime import datetime
+from typing import AsyncIterator, List, NamedTuple, Set
+
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from trip_stats import (
+    TrackArrays,
+    from_epoch_seconds,
+    optional_floats,
+    points_to_arrays,
+    to_epoch_seconds,
+)
+from trip_pipeline import trip_stats_pipeline
+
+# Fixes per bucket document. 1000 fixes of five fields stay far below the
+# 16 MB document limit while keeping bucket count low.
+BUCKET_SIZE = 1000
+POINT_FIELDS_PROJECTION = {
+    "_id": 0,
+    "timestamp": 1,
+    "lat": 1,
+    "lon": 1,
+    "speed_kn": 1,
+    "course_deg": 1,
+}
+
+
+def _optional(values: np.ndarray) -> list:
+    return [None if v != v else v for v in values.tolist()]
+
+
+def point_docs(track_id: ObjectId, arrays: TrackArrays) -> List[dict]:
+    """Per-fix documents in the ``track_points`` shape, NaN mapped to None."""
+    return [
+        {
+            "track_id": track_id,
+            "timestamp": from_epoch_seconds(t),
+            "lat": lat,
+            "lon": lon,
+            "speed_kn": speed,
+            "course_deg": course,
+        }
+        for t, lat, lon, speed, course in zip(
+            arrays.t.tolist(),
+            arrays.lat.tolist(),
+            arrays.lon.tolist(),
+            _optional(arrays.speed),
+            _optional(arrays.course),
+        )
+    ]
+
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class InsertOutcome(NamedTuple):
+    inserted: int
+    # Positions in the submitted docs that were already stored.
+    duplicates: List[int]
+
+
+class DocumentPointStore:
+    """One document per fix in ``track_points``.
+
+    The unique (track_id, timestamp) index makes inserts idempotent: a
+    re-sent fix fails with a duplicate-key error that the unordered bulk
+    insert reports without stopping, and it is counted as skipped.
+    """
+
+    def __init__(self, db):
+        self.collection = db.track_points
+
+    async def insert(self, docs: List[dict]) -> InsertOutcome:
+        try:
+            result = await self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            duplicates = [e["index"] for e in errors if e.get("code") == DUPLICATE_KEY_ERROR]
+            if len(duplicates) != len(errors) or exc.details.get("writeConcernErrors"):
+                raise
+            return InsertOutcome(exc.details.get("nInserted", 0), duplicates)
+        return InsertOutcome(len(result.inserted_ids), [])
+
+    async def iter_chunks(self, track_id: ObjectId, chunk_size: int) -> AsyncIterator[TrackArrays]:
+        """Yield a track's points in timestamp order as bounded chunks."""
+        cursor = (
+            self.collection.find({"track_id": track_id}, POINT_FIELDS_PROJECTION)
+            .sort("timestamp", 1)
+            .batch_size(chunk_size)
+        )
+        while True:
+            docs = await cursor.to_list(chunk_size)
+            if not docs:
+                break
+            yield points_to_arrays(docs)
+
+    def aggregate_stats(self, track_id: ObjectId):
+        return self.collection.aggregate(trip_stats_pipeline(track_id), allowDiskUse=True)
+
+
+def bucket_update(docs: List[dict]) -> dict:
+    """``$push``/``$inc`` update that appends ``docs`` to one bucket."""
+    times = [d["timestamp"] for d in docs]
+    return {
+        "$push": {
+            "t": {"$each": times},
+            "lat": {"$each": [d["lat"] for d in docs]},
+            "lon": {"$each": [d["lon"] for d in docs]},
+            "speed_kn": {"$each": [d.get("speed_kn") for d in docs]},
+            "course_deg": {"$each": [d.get("course_deg") for d in docs]},
+        },
+        "$inc": {"count": len(docs)},
+        "$min": {"start_time": min(times)},
+        "$max": {"end_time": max(times)},
+    }
+
+
+def time_ms(ts: datetime) -> int:
+    """BSON dates keep milliseconds, so fixes are the same at that resolution."""
+    return round(to_epoch_seconds(ts) * 1000)
+
+
+def drop_repeated_timestamps(arrays: TrackArrays) -> TrackArrays:
+    """Keep the first of each run of equal timestamps in sorted arrays."""
+    first = np.ones(len(arrays), dtype=bool)
+    first[1:] = np.diff(arrays.t) != 0
+    return arrays if first.all() else arrays.select(first)
+
+
+def bucket_to_arrays(bucket: dict) -> TrackArrays:
+    arrays = TrackArrays(
+        t=np.array([to_epoch_seconds(ts) for ts in bucket["t"]], dtype=np.float64),
+        lat=np.asarray(bucket["lat"], dtype=np.float64),
+        lon=np.asarray(bucket["lon"], dtype=np.float64),
+        speed=optional_floats(bucket["speed_kn"]),
+        course=optional_floats(bucket["course_deg"]),
+    )
+    return arrays.select(np.argsort(arrays.t, kind="stable"))
+
+
+class BucketPointStore:
+    """Up to ``BUCKET_SIZE`` fixes per document in ``track_point_buckets``."""
+
+    def __init__(self, db):
+        self.collection = db.track_point_buckets
+
+    async def stored_times(self, track_id: ObjectId, first: datetime, last: datetime) -> Set[int]:
+        """Millisecond timestamps already stored for the track in [first, last]."""
+        cursor = self.collection.find(
+            {"track_id": track_id, "start_time": {"$lte": last}, "end_time": {"$gte": first}},
+            {"_id": 0, "t": 1},
+        )
+        stored = set()
+        async for bucket in cursor:
+            stored.update(time_ms(ts) for ts in bucket["t"])
+        return stored
+
+    async def insert(self, docs: List[dict]) -> InsertOutcome:
+        """Append fixes to the track's open bucket, opening new ones as needed.
+
+        Buckets cannot carry a per-fix unique index, so fixes whose
+        timestamp is already stored (looked up in the buckets overlapping
+        the batch's time range) are reported as duplicates and not written.
+        Two processes appending the same fix at once can still both store
+        it; reads and ``aggregate_stats`` keep only one per timestamp.
+
+        The filter only matches a bucket with room for the whole slice, so
+        concurrent appends can never overfill one; if none has room the
+        upsert opens a fresh bucket.
+        """
+        by_track = {}
+        for i, doc in enumerate(docs):
+            by_track.setdefault(doc["track_id"], []).append(i)
+        inserted = 0
+        duplicates = []
+        for track_id, positions in by_track.items():
+            times = [docs[i]["timestamp"] for i in positions]
+            seen = await self.stored_times(track_id, min(times), max(times))
+            fresh = []
+            for i in positions:
+                key = time_ms(docs[i]["timestamp"])
+                if key in seen:
+                    duplicates.append(i)
+                else:
+                    seen.add(key)
+                    fresh.append(docs[i])
+            for start in range(0, len(fresh), BUCKET_SIZE):
+                part = fresh[start : start + BUCKET_SIZE]
+                await self.collection.update_one(
+                    {"track_id": track_id, "count": {"$lte": BUCKET_SIZE - len(part)}},
+                    bucket_update(part),
+                    upsert=True,
+                )
+                inserted += len(part)
+        return InsertOutcome(inserted, sorted(duplicates))
+
+    async def iter_chunks(self, track_id: ObjectId, chunk_size: int) -> AsyncIterator[TrackArrays]:
+        """Yield a track's points in timestamp order.
+
+        Buckets are read in ``start_time`` order. Their time ranges can
+        overlap (late or concurrent batches), so fixes are held back until
+        the next bucket's start time proves nothing earlier can still come.
+        Fixes sharing a timestamp are re-sent duplicates; only the first is
+        kept.
+        """
+        cursor = (
+            self.collection.find({"track_id": track_id}, {"_id": 0, "track_id": 0})
+            .sort("start_time", 1)
+            .batch_size(max(1, chunk_size // BUCKET_SIZE))
+        )
+        pending = None
+        async for bucket in cursor:
+            arrays = drop_repeated_timestamps(bucket_to_arrays(bucket))
+            if pending is not None:
+                merged = TrackArrays.concat([pending, arrays])
+                merged = drop_repeated_timestamps(merged.select(np.argsort(merged.t, kind="stable")))
+                ready = int(np.searchsorted(merged.t, arrays.t[0], side="left"))
+                if ready:
+                    yield merged.select(slice(0, ready))
+                arrays = merged.select(slice(ready, None))
+            pending = arrays
+        if pending is not None and len(pending):
+            yield pending
+
+    def aggregate_stats(self, track_id: ObjectId):
+        unwind = [
+            {"$match": {"track_id": track_id}},
+            {
+                "$project": {
+                    "track_id": 1,
+                    "points": {
+                        "$zip": {"inputs": ["$t", "$lat", "$lon", "$speed_kn", "$course_deg"]}
+                    },
+                }
+            },
+            {"$unwind": "$points"},
+            {
+                "$project": {
+                    "track_id": 1,
+                    "timestamp": {"$arrayElemAt": ["$points", 0]},
+                    "lat": {"$arrayElemAt": ["$points", 1]},
+                    "lon": {"$arrayElemAt": ["$points", 2]},
+                    "speed_kn": {"$arrayElemAt": ["$points", 3]},
+                }
+            },
+            # A fix stored twice by racing appends counts once, as on read.
+            {
+                "$group": {
+                    "_id": "$timestamp",
+                    "track_id": {"$first": "$track_id"},
+                    "lat": {"$first": "$lat"},
+                    "lon": {"$first": "$lon"},
+                    "speed_kn": {"$first": "$speed_kn"},
+                }
+            },
+            {"$set": {"timestamp": "$_id"}},
+        ]
+        pipeline = unwind + trip_stats_pipeline(track_id)[1:]
+        return self.collection.aggregate(pipeline, allowDiskUse=True)
+
+
+POINT_STORES = {
+    "documents": DocumentPointStore,
+    "buckets": BucketPointStore,
+}
+
+
+def make_point_store(db, layout: str):
+    try:
+        return POINT_STORES[layout](db)
+    except KeyError:
+        raise ValueError(f"Unknown track point storage layout: {layout}") from None
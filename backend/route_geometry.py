@@ -0,0 +1,135 @@
+"""Leg geometry stored on route documents.
+
+A route keeps, next to ``waypoint_ids``, a snapshot of its waypoints and
+the distance and initial bearing of every leg, so the details endpoint is
+one document read. ``routes.waypoint_ids`` is indexed and serves as the
+reverse index from a waypoint to the routes using it: when a waypoint is
+edited or deleted only the legs touching it are recomputed.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from geo import haversine_nm, initial_bearing_deg_array, leg_distances_nm
+
+WAYPOINT_SNAPSHOT_FIELDS = ("name", "description", "lat", "lon", "created_at")
+
+
+def waypoint_snapshot(doc: dict) -> dict:
+    snapshot = {"_id": doc["_id"]}
+    snapshot.update({field: doc.get(field) for field in WAYPOINT_SNAPSHOT_FIELDS})
+    return snapshot
+
+
+def leg(a: dict, b: dict) -> dict:
+    return {
+        "distance_nm": haversine_nm(a["lat"], a["lon"], b["lat"], b["lon"]),
+        "bearing_deg": float(initial_bearing_deg_array(a["lat"], a["lon"], b["lat"], b["lon"])),
+    }
+
+
+def route_geometry(waypoints: List[dict]) -> dict:
+    """Fields to ``$set`` on a route for waypoint docs in route order."""
+    snapshots = [waypoint_snapshot(w) for w in waypoints]
+    lats = [w["lat"] for w in snapshots]
+    lons = [w["lon"] for w in snapshots]
+    distances = leg_distances_nm(lats, lons)
+    bearings = initial_bearing_deg_array(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    legs = [
+        {"distance_nm": d, "bearing_deg": b}
+        for d, b in zip(distances.tolist(), bearings.tolist())
+    ]
+    return with_total(
+        {"waypoint_ids": [w["_id"] for w in snapshots], "waypoints": snapshots, "legs": legs}
+    )
+
+
+def with_total(fields: dict) -> dict:
+    fields["total_distance_nm"] = float(sum(segment["distance_nm"] for segment in fields["legs"]))
+    return fields
+
+
+def has_geometry(route_doc: dict) -> bool:
+    return "legs" in route_doc and "waypoints" in route_doc
+
+
+def replace_waypoint(route_doc: dict, waypoint: dict) -> Optional[dict]:
+    """Geometry fields after ``waypoint`` was edited, or None if unchanged.
+
+    Only the legs into and out of each occurrence are recomputed, and only
+    when the waypoint moved.
+    """
+    snapshots = list(route_doc["waypoints"])
+    legs = list(route_doc["legs"])
+    new = waypoint_snapshot(waypoint)
+    changed = False
+    for i, old in enumerate(snapshots):
+        if old["_id"] != new["_id"] or old == new:
+            continue
+        changed = True
+        snapshots[i] = new
+        if (old["lat"], old["lon"]) != (new["lat"], new["lon"]):
+            if i > 0:
+                legs[i - 1] = leg(snapshots[i - 1], new)
+            if i < len(legs):
+                legs[i] = leg(new, snapshots[i + 1])
+    if not changed:
+        return None
+    return with_total({"waypoints": snapshots, "legs": legs})
+
+
+def remove_waypoint(route_doc: dict, waypoint_id: ObjectId) -> dict:
+    """Geometry fields after every occurrence of ``waypoint_id`` is dropped;
+    its neighbours are joined by one new leg."""
+    snapshots = list(route_doc["waypoints"])
+    legs = list(route_doc["legs"])
+    i = 0
+    while i < len(snapshots):
+        if snapshots[i]["_id"] != waypoint_id:
+            i += 1
+            continue
+        del snapshots[i]
+        if i == len(snapshots):  # was the last waypoint
+            if legs:
+                legs.pop()
+        elif i == 0:
+            legs.pop(0)
+        else:
+            legs[i - 1 : i + 1] = [leg(snapshots[i - 1], snapshots[i])]
+    return with_total(
+        {"waypoint_ids": [w["_id"] for w in snapshots], "waypoints": snapshots, "legs": legs}
+    )
+
+
+def leg_breakdown(
+    route_doc: dict, speed_kn: Optional[float] = None, departure: Optional[datetime] = None
+) -> List[dict]:
+    """Stored legs as ``RouteLeg`` dicts with running totals.
+
+    With ``speed_kn`` each leg also gets the hours from the start of the
+    route to its end, and with ``departure`` as well the arrival time.
+    """
+    legs = route_doc["legs"]
+    ids = [str(w["_id"]) for w in route_doc["waypoints"]]
+    distances = np.array([segment["distance_nm"] for segment in legs], dtype=np.float64)
+    cumulative = np.cumsum(distances)
+    hours = cumulative / speed_kn if speed_kn else None
+    rows = []
+    for i, segment in enumerate(legs):
+        row = {
+            "from_waypoint_id": ids[i],
+            "to_waypoint_id": ids[i + 1],
+            "distance_nm": segment["distance_nm"],
+            "bearing_deg": segment["bearing_deg"],
+            "cumulative_distance_nm": float(cumulative[i]),
+            "eta_hours": None,
+            "eta": None,
+        }
+        if hours is not None:
+            row["eta_hours"] = float(hours[i])
+            if departure is not None:
+                row["eta"] = departure + timedelta(hours=row["eta_hours"])
+        rows.append(row)
+    return rows
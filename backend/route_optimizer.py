@@ -0,0 +1,91 @@
+"""Waypoint order optimization for open multi-stop routes.
+
+A nearest-neighbour tour seeds a 2-opt local search over a precomputed
+distance matrix. The path is padded with a dummy stop at each end that is
+zero distance from everything, so reversing a segment that touches either
+end of the route is costed like any other move. The first or last stop can
+be pinned by keeping moves away from it. For each segment start, every
+segment end is scored in one vectorized step, so a pass is n NumPy
+operations rather than n² Python ones.
+"""
+from typing import List
+
+import numpy as np
+
+# Moves must gain more than this many nm, so float noise cannot cycle.
+MIN_GAIN_NM = 1e-9
+
+
+def path_length(order: List[int], dist: np.ndarray) -> float:
+    if len(order) < 2:
+        return 0.0
+    idx = np.asarray(order)
+    return float(dist[idx[:-1], idx[1:]].sum())
+
+
+def nearest_neighbor_order(dist: np.ndarray, start: int, end: int = None) -> List[int]:
+    """Greedy path from ``start``, always to the closest unvisited stop;
+    ``end``, if given, is kept for last."""
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    if end is not None:
+        visited[end] = True
+    order = [start]
+    current = start
+    for _ in range(n - 1 - (end is not None)):
+        row = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        order.append(current)
+    if end is not None:
+        order.append(end)
+    return order
+
+
+def two_opt(order: List[int], dist: np.ndarray, fix_start: bool, fix_end: bool) -> List[int]:
+    """Reverse segments of ``order`` while that shortens the path."""
+    n = len(order)
+    if n < 3:
+        return list(order)
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = dist
+    dummy = n
+    path = np.array([dummy, *order, dummy])
+    lo = 2 if fix_start else 1  # first position a reversed segment may cover
+    hi = n - 1 if fix_end else n  # last position
+    improved = True
+    while improved:
+        improved = False
+        for i in range(lo, hi):
+            j = np.arange(i + 1, hi + 1)
+            a, b = path[i - 1], path[i]
+            c, d = path[j], path[j + 1]
+            delta = padded[a, c] + padded[b, d] - padded[a, b] - padded[c, d]
+            best = int(np.argmin(delta))
+            if delta[best] < -MIN_GAIN_NM:
+                k = j[best]
+                path[i : k + 1] = path[i : k + 1][::-1].copy()
+                improved = True
+    return path[1:-1].tolist()
+
+
+def optimize_order(dist: np.ndarray, fix_start: bool = True, fix_end: bool = False) -> List[int]:
+    """A short visiting order of positions ``0..n-1`` (the current order).
+
+    Never longer than the current order, which is returned unchanged when
+    the search does not beat it.
+    """
+    n = len(dist)
+    current = list(range(n))
+    if n < 3:
+        return current
+    seed = nearest_neighbor_order(dist, 0, n - 1 if fix_end else None)
+    candidates = [
+        two_opt(seed, dist, fix_start, fix_end),
+        two_opt(current, dist, fix_start, fix_end),
+    ]
+    best = min(candidates, key=lambda order: path_length(order, dist))
+    if path_length(best, dist) < path_length(current, dist) - MIN_GAIN_NM:
+        return best
+    return current
@@ -1,17 +1,81 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, BackgroundTasks, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
 import logging
+import zlib
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from starlette.requests import ClientDisconnect
+from typing import Callable, List, Optional
 import uuid
-from datetime import datetime, date
-import httpx
+from xml.etree.ElementTree import ParseError
+from datetime import datetime, date, timedelta, timezone
+import numpy as np
 from bson import ObjectId
-import math
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, WriteError
+
+from fast_json import FastJSONResponse
+from geo import KM_PER_NM, distance_matrix_nm, simplification_levels
+from gpx_import import GpxFix, GpxReader, GpxTrackEnd, GpxTrackStart, GpxWaypoint
+from geojson import box_around, box_geometry, boxes_overlap, line_geometry, point
+from harmonic_tides import load_constituent_file, predictions_for_day
+from indexes import DELETION_RETENTION_S, check_query_plans, ensure_indexes
+from ingest_buffer import IngestBuffer, IngestResult, KnownIdCache
+from noaa_client import NoaaClient, NoaaError, NoaaUnexpectedResponse
+from pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    SYNC_ORDERING,
+    InvalidCursor,
+    Ordering,
+    fetch_page,
+)
+from point_codecs import (
+    NDJSON_CONTENT_TYPE,
+    PACKED_CONTENT_TYPE,
+    PointDecodeError,
+    decode_packed,
+    iter_ndjson_chunks,
+    validate_arrays,
+)
+from point_store import drop_repeated_timestamps, make_point_store, point_docs
+from route_geometry import (
+    has_geometry,
+    leg_breakdown,
+    remove_waypoint,
+    replace_waypoint,
+    route_geometry,
+)
+from route_optimizer import optimize_order
+from station_catalog import CatalogUnavailable, StationCatalog
+from tide_cache import TidePredictionCache
+from tide_curve import cosine_curve
+from track_export import (
+    FORMATS as EXPORT_FORMATS,
+    RangeNotSatisfiable,
+    byte_count,
+    byte_slice,
+    counting_chunks,
+    export_chunks,
+    gzip_chunks,
+    parse_range,
+)
+from trip_pipeline import accumulator_from_summary
+from trip_stats import (
+    OutOfOrderError,
+    TrackArrays,
+    TripAccumulator,
+    from_epoch_seconds,
+    points_to_arrays,
+    to_epoch_seconds,
+)
 
 
 ROOT_DIR = Path(__file__).parent
@@ -22,6 +86,16 @@ mongo_url = os.environ["MONGO_URL"]
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ["DB_NAME"]]
 
+# "python" streams points through trip_stats; "mongo" runs the aggregation
+# pipeline in trip_pipeline server-side (requires MongoDB 5.2+).
+TRIP_STATS_BACKEND = os.environ.get("TRIP_STATS_BACKEND", "python")
+
+# "documents" keeps one track_points document per fix; "buckets" packs fixes
+# into track_point_buckets (see point_store). Run migrate_track_points.py
+# before switching an existing deployment to buckets.
+TRACK_POINT_STORAGE = os.environ.get("TRACK_POINT_STORAGE", "documents")
+point_store = make_point_store(db, TRACK_POINT_STORAGE)
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -96,6 +170,20 @@ class Track(BaseModel):
     end_time: Optional[datetime] = None
 
 
+TRACK_PROJECTION = {"name": 1, "notes": 1, "start_time": 1, "end_time": 1}
+
+
+def track_row(doc: dict) -> dict:
+    """A track document as a dict in ``Track`` field order."""
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name"),
+        "notes": doc.get("notes"),
+        "start_time": doc["start_time"],
+        "end_time": doc.get("end_time"),
+    }
+
+
 class TrackPointBatch(BaseModel):
     points: List[TrackPoint]
 
@@ -109,47 +197,199 @@ class Trip(BaseModel):
     distance_nm: float
     avg_speed_kn: float
     max_speed_kn: float
+    moving_time_s: float = 0.0
+    speed_p50_kn: float = 0.0
+    speed_p90_kn: float = 0.0
+    speed_p95_kn: float = 0.0
+
+
+TRIP_PROJECTION = {
+    "track_id": 1,
+    "name": 1,
+    "start_time": 1,
+    "end_time": 1,
+    "distance_nm": 1,
+    "avg_speed_kn": 1,
+    "max_speed_kn": 1,
+    "moving_time_s": 1,
+    "speed_p50_kn": 1,
+    "speed_p90_kn": 1,
+    "speed_p95_kn": 1,
+}
+
+
+def trip_row(doc: dict) -> dict:
+    """A trip document as a dict in ``Trip`` field order."""
+    return {
+        "id": str(doc["_id"]),
+        "track_id": str(doc["track_id"]),
+        "name": doc.get("name"),
+        "start_time": doc["start_time"],
+        "end_time": doc.get("end_time"),
+        "distance_nm": float(doc.get("distance_nm", 0.0)),
+        "avg_speed_kn": float(doc.get("avg_speed_kn", 0.0)),
+        "max_speed_kn": float(doc.get("max_speed_kn", 0.0)),
+        "moving_time_s": float(doc.get("moving_time_s", 0.0)),
+        "speed_p50_kn": float(doc.get("speed_p50_kn", 0.0)),
+        "speed_p90_kn": float(doc.get("speed_p90_kn", 0.0)),
+        "speed_p95_kn": float(doc.get("speed_p95_kn", 0.0)),
+    }
+
+
+def trip_from_doc(doc: dict) -> Trip:
+    return Trip(**trip_row(doc))
+
+
+class BoundingBox(BaseModel):
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+
+
+class TrackStats(BaseModel):
+    track_id: str
+    point_count: int
+    distance_nm: float
+    avg_speed_kn: float
+    max_speed_kn: float
+    moving_time_s: float
+    speed_p50_kn: float
+    speed_p90_kn: float
+    speed_p95_kn: float
+    last_fix_time: Optional[datetime] = None
+    last_lat: Optional[float] = None
+    last_lon: Optional[float] = None
+    bbox: Optional[BoundingBox] = None
+
+
+# Optimistic-concurrency attempts before giving up on folding a batch into
+# the running stats and marking them stale instead.
+RUNNING_STATS_MAX_RETRIES = 5
+
+
+def new_running_stats() -> dict:
+    return {**TripAccumulator().to_doc(), "revision": 0, "stale": False}
+
+
+def fresh_accumulator(track_doc: dict) -> Optional[TripAccumulator]:
+    """The track's running stats, or None if they must be recomputed."""
+    running = track_doc.get("running_stats")
+    if not running or running.get("stale"):
+        return None
+    return TripAccumulator.from_doc(running)
+
+
+async def fold_into_running_stats(track_doc: dict, arrays) -> None:
+    """Fold a newly appended, time-sorted batch into the track's running stats.
+
+    Updates are compare-and-swap on ``running_stats.revision`` so concurrent
+    batches for the same track cannot clobber each other. A batch that
+    starts before the last folded fix marks the stats stale; the next read
+    recomputes them from the stored points.
+    """
+    track_id = track_doc["_id"]
+    for _ in range(RUNNING_STATS_MAX_RETRIES):
+        running = track_doc.get("running_stats") or {}
+        revision = running.get("revision")
+        acc = fresh_accumulator(track_doc)
+        if acc is not None:
+            try:
+                acc.fold(arrays)
+            except OutOfOrderError:
+                logger.info("Out-of-order points for track %s; stats marked stale", track_id)
+                acc = None
+        if acc is None:
+            new_running = {"stale": True}
+        else:
+            new_running = {**acc.to_doc(), "stale": False}
+        new_running["revision"] = (revision or 0) + 1
+
+        result = await db.tracks.update_one(
+            {"_id": track_id, "running_stats.revision": revision},
+            {"$set": {"running_stats": new_running}},
+        )
+        if result.matched_count:
+            return
+        track_doc = await db.tracks.find_one({"_id": track_id})
+        if not track_doc:
+            return
+
+    await mark_running_stats_stale([track_id])
 
 
-def haversine_nm(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Great-circle distance between two points in nautical miles."""
-    r_km = 6371.0
-    km_per_nm = 1.852
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = (
-        math.sin(dphi / 2) ** 2
-        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+async def mark_running_stats_stale(track_ids: List[ObjectId]) -> None:
+    """Make the next read recompute these tracks' stats from their points."""
+    await db.tracks.update_many(
+        {"_id": {"$in": track_ids}},
+        {"$set": {"running_stats.stale": True}, "$inc": {"running_stats.revision": 1}},
     )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    d_km = r_km * c
-    return d_km / km_per_nm
+
+
+# Points are pulled from storage and folded this many at a time, so memory
+# stays flat regardless of track length.
+POINT_CHUNK_SIZE = 5000
+
+
+async def aggregate_trip_stats(track_id: ObjectId) -> TripAccumulator:
+    """Full pass over a track's points with the configured backend."""
+    if TRIP_STATS_BACKEND == "mongo":
+        summary = await point_store.aggregate_stats(track_id).to_list(1)
+        return accumulator_from_summary(summary[0] if summary else None)
+
+    acc = TripAccumulator()
+    async for chunk in point_store.iter_chunks(track_id, POINT_CHUNK_SIZE):
+        acc.fold(chunk)
+    return acc
+
+
+async def recompute_running_stats(track_doc: dict) -> TripAccumulator:
+    """Rebuild running stats from the stored points and persist them."""
+    track_id = track_doc["_id"]
+    acc = TripAccumulator()
+    for _ in range(RUNNING_STATS_MAX_RETRIES):
+        revision = (track_doc.get("running_stats") or {}).get("revision")
+        acc = await aggregate_trip_stats(track_id)
+        result = await db.tracks.update_one(
+            {"_id": track_id, "running_stats.revision": revision},
+            {"$set": {"running_stats": {**acc.to_doc(), "revision": (revision or 0) + 1, "stale": False}}},
+        )
+        if result.matched_count:
+            break
+        # Points were appended while we were reading; start over.
+        track_doc = await db.tracks.find_one({"_id": track_id}) or track_doc
+    return acc
+
+
+async def load_accumulator(track_doc: dict) -> TripAccumulator:
+    acc = fresh_accumulator(track_doc)
+    if acc is None:
+        acc = await recompute_running_stats(track_doc)
+    return acc
+
+
+def average_speed_kn(distance_nm: float, start_time: datetime, end_time: Optional[datetime]) -> float:
+    if end_time is None:
+        return 0.0
+    duration_hours = max(0.0, (end_time - start_time).total_seconds() / 3600.0)
+    return distance_nm / duration_hours if duration_hours > 0 else 0.0
 
 
 async def compute_and_store_trip(track_doc: dict):
-    """Compute trip stats from track points and upsert into trips collection."""
+    """Finalize trip stats from the track's running stats and upsert into trips.
+
+    This is O(1) in the number of points unless the running stats are stale
+    (legacy track or out-of-order ingest), in which case they are recomputed.
+    """
     track_id = track_doc["_id"]
-    # Load points in time order
-    points = await db.track_points.find({"track_id": track_id}).sort("timestamp", 1).to_list(10000)
-    if not points:
-        distance_nm = 0.0
-        avg_speed_kn = 0.0
-        max_speed_kn = 0.0
-    else:
-        distance_nm = 0.0
-        max_speed_kn = 0.0
-        for i in range(len(points) - 1):
-            p1 = points[i]
-            p2 = points[i + 1]
-            distance_nm += haversine_nm(p1["lat"], p1["lon"], p2["lat"], p2["lon"])
-        speeds = [p["speed_kn"] for p in points if p.get("speed_kn") is not None]
-        max_speed_kn = max(speeds) if speeds else 0.0
-        start_time = track_doc["start_time"]
-        end_time = track_doc.get("end_time") or points[-1]["timestamp"]
-        duration_hours = max(0.0, (end_time - start_time).total_seconds() / 3600.0)
-        avg_speed_kn = distance_nm / duration_hours if duration_hours > 0 else 0.0
+    acc = await load_accumulator(track_doc)
+    stats = acc.stats()
+    distance_nm = stats.distance_nm
+    max_speed_kn = stats.max_speed_kn
+    avg_speed_kn = 0.0
+    if acc.point_count:
+        end_time = track_doc.get("end_time") or from_epoch_seconds(acc.last_t)
+        avg_speed_kn = average_speed_kn(distance_nm, track_doc["start_time"], end_time)
 
     trip_doc = {
         "track_id": track_id,
@@ -159,6 +399,11 @@ async def compute_and_store_trip(track_doc: dict):
         "distance_nm": distance_nm,
         "avg_speed_kn": avg_speed_kn,
         "max_speed_kn": max_speed_kn,
+        "moving_time_s": stats.moving_time_s,
+        "speed_p50_kn": stats.speed_p50_kn,
+        "speed_p90_kn": stats.speed_p90_kn,
+        "speed_p95_kn": stats.speed_p95_kn,
+        "updated_at": datetime.utcnow(),
     }
 
     result = await db.trips.update_one(
@@ -180,6 +425,8 @@ async def create_track(payload: TrackCreate):
         "notes": payload.notes,
         "start_time": payload.start_time or now,
         "end_time": None,
+        "running_stats": new_running_stats(),
+        "updated_at": now,
     }
     result = await db.tracks.insert_one(doc)
     return Track(
@@ -191,8 +438,157 @@ async def create_track(payload: TrackCreate):
     )
 
 
-@api_router.post("/tracks/{track_id}/points")
-async def append_track_points(track_id: str, batch: TrackPointBatch):
+async def after_points_stored(track_id: ObjectId, arrays: TrackArrays) -> None:
+    """Bookkeeping once a time-sorted batch of fixes has been written."""
+    track = await db.tracks.find_one({"_id": track_id})
+    if not track:
+        return
+    if track.get("end_time") is not None:
+        # Cached geometries of a finished track are served without checking
+        # for new points, so drop them.
+        await db.track_geometries.delete_many({"track_id": track_id})
+    await fold_into_running_stats(track, arrays)
+
+
+# Uploads are coalesced in process and written in one unordered bulk insert
+# per flush. With INGEST_BUFFER=off the buffer is never started and every
+# upload is written through immediately.
+INGEST_BUFFER_ENABLED = os.environ.get("INGEST_BUFFER", "on") == "on"
+# "ack" answers once a batch is queued; "flush" waits until it is written.
+# Callers can override per request with ?wait=.
+INGEST_DURABILITY = os.environ.get("INGEST_DURABILITY", "ack")
+ingest_buffer = IngestBuffer(
+    point_store,
+    after_points_stored,
+    mark_running_stats_stale,
+    max_points=int(os.environ.get("INGEST_FLUSH_POINTS", "5000")),
+    max_delay_s=float(os.environ.get("INGEST_FLUSH_INTERVAL_S", "1.0")),
+)
+known_tracks = KnownIdCache()
+
+
+# NDJSON uploads are inserted in batches of this many fixes as they stream in.
+NDJSON_INGEST_CHUNK = 5000
+
+
+async def ingest_request_body(track_id: ObjectId, request: Request, wait: bool) -> IngestResult:
+    """Decode an upload according to its Content-Type and queue the fixes."""
+    content_type = request.headers.get("content-type", "application/json")
+    content_type = content_type.split(";")[0].strip().lower()
+    try:
+        if content_type == NDJSON_CONTENT_TYPE:
+            accepted = inserted = 0
+            async for chunk in iter_ndjson_chunks(request.stream(), NDJSON_INGEST_CHUNK):
+                # Wait on each chunk so a large backfill cannot outrun the writer.
+                result = await ingest_buffer.submit(track_id, chunk, wait=True)
+                accepted += result.accepted
+                inserted += result.inserted
+            return IngestResult(accepted, inserted, accepted - inserted)
+
+        if content_type == PACKED_CONTENT_TYPE:
+            arrays = decode_packed(await request.body())
+        elif content_type == "application/json":
+            try:
+                batch = TrackPointBatch.model_validate_json(await request.body())
+            except ValidationError as exc:
+                raise RequestValidationError(exc.errors())
+            arrays = validate_arrays(points_to_arrays(p.dict() for p in batch.points))
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+    except PointDecodeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if not len(arrays):
+        return IngestResult(0, 0, 0)
+    return await ingest_buffer.submit(track_id, arrays, wait=wait)
+
+
+def ingest_summary(result: IngestResult) -> dict:
+    """``inserted`` is always present, as before the ingest buffer existed.
+
+    Until a batch is durable it is provisional: the accepted count, before
+    re-sent fixes have been skipped.
+    """
+    durable = result.inserted is not None
+    summary = {
+        "inserted": result.inserted if durable else result.accepted,
+        "accepted": result.accepted,
+        "durable": durable,
+    }
+    if durable:
+        summary["skipped"] = result.skipped
+    return summary
+
+
+@api_router.post(
+    "/tracks/{track_id}/points",
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": TrackPointBatch.model_json_schema()},
+                PACKED_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+                NDJSON_CONTENT_TYPE: {"schema": {"type": "string"}},
+            },
+            "required": True,
+        }
+    },
+)
+async def append_track_points(
+    track_id: str,
+    request: Request,
+    wait: Optional[bool] = None,
+    batch_id: Optional[str] = None,
+):
+    """Append fixes as a JSON TrackPointBatch, packed float64 records or NDJSON.
+
+    The format is chosen by Content-Type; see point_codecs. Points go through
+    the ingest buffer; ``wait=true`` (or INGEST_DURABILITY=flush) responds
+    only after they are written, with final inserted and skipped counts.
+    Otherwise ``inserted`` is the provisional accepted count and
+    ``durable`` is false.
+
+    Ingestion is idempotent: a fix whose (track, timestamp) is already
+    stored is skipped. A client-supplied ``batch_id`` (or Idempotency-Key
+    header) additionally short-circuits a retried batch without decoding it.
+    """
+    try:
+        track_obj_id = ObjectId(track_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid track id")
+
+    if track_obj_id not in known_tracks:
+        if not await db.tracks.count_documents({"_id": track_obj_id}, limit=1):
+            raise HTTPException(status_code=404, detail="Track not found")
+        known_tracks.add(track_obj_id)
+    if wait is None:
+        wait = INGEST_DURABILITY == "flush"
+
+    batch_id = batch_id or request.headers.get("idempotency-key")
+    if not batch_id:
+        return ingest_summary(await ingest_request_body(track_obj_id, request, wait))
+
+    # The unique ledger entry is claimed before any point is written, so a
+    # concurrent or later retry of the same batch is rejected by the index.
+    ledger_key = {"track_id": track_obj_id, "batch_id": batch_id}
+    try:
+        await db.ingest_batches.insert_one({**ledger_key, "created_at": datetime.utcnow()})
+    except DuplicateKeyError:
+        prior = await db.ingest_batches.find_one(ledger_key) or {}
+        return {**prior.get("summary", {"inserted": 0, "accepted": 0}), "duplicate_batch": True}
+    try:
+        summary = ingest_summary(await ingest_request_body(track_obj_id, request, wait=True))
+    except BaseException:
+        # Chunks written before the failure may not have been folded in.
+        await mark_running_stats_stale([track_obj_id])
+        await db.ingest_batches.delete_one(ledger_key)
+        raise
+    await db.ingest_batches.update_one(ledger_key, {"$set": {"summary": summary}})
+    return summary
+
+
+@api_router.get("/tracks/{track_id}/stats", response_model=TrackStats)
+async def get_track_stats(track_id: str):
+    """Live trip stats for a track, available while it is still recording."""
     try:
         track_obj_id = ObjectId(track_id)
     except Exception:
@@ -202,36 +598,47 @@ async def append_track_points(track_id: str, batch: TrackPointBatch):
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
 
-    if not batch.points:
-        return {"inserted": 0}
-
-    docs = []
-    for p in batch.points:
-        docs.append(
-            {
-                "track_id": track_obj_id,
-                "timestamp": p.timestamp,
-                "lat": p.lat,
-                "lon": p.lon,
-                "speed_kn": p.speed_kn,
-                "course_deg": p.course_deg,
-            }
+    acc = await load_accumulator(track)
+    stats = acc.stats()
+    last_fix_time = from_epoch_seconds(acc.last_t) if acc.last_t is not None else None
+    bbox = None
+    if acc.point_count:
+        bbox = BoundingBox(
+            min_lat=acc.min_lat, min_lon=acc.min_lon, max_lat=acc.max_lat, max_lon=acc.max_lon
         )
-
-    result = await db.track_points.insert_many(docs)
-    return {"inserted": len(result.inserted_ids)}
+    return TrackStats(
+        track_id=track_id,
+        point_count=stats.point_count,
+        distance_nm=stats.distance_nm,
+        avg_speed_kn=average_speed_kn(
+            stats.distance_nm, track["start_time"], track.get("end_time") or last_fix_time
+        ),
+        max_speed_kn=stats.max_speed_kn,
+        moving_time_s=stats.moving_time_s,
+        speed_p50_kn=stats.speed_p50_kn,
+        speed_p90_kn=stats.speed_p90_kn,
+        speed_p95_kn=stats.speed_p95_kn,
+        last_fix_time=last_fix_time,
+        last_lat=acc.last_lat,
+        last_lon=acc.last_lon,
+        bbox=bbox,
+    )
 
 
 @api_router.patch("/tracks/{track_id}/end", response_model=Track)
-async def end_track(track_id: str, end_time: Optional[datetime] = None):
+async def end_track(
+    track_id: str, background_tasks: BackgroundTasks, end_time: Optional[datetime] = None
+):
     try:
         track_obj_id = ObjectId(track_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid track id")
 
     end_ts = end_time or datetime.utcnow()
+    # Stats must include every point posted before the end request.
+    await ingest_buffer.flush()
     update_result = await db.tracks.update_one(
-        {"_id": track_obj_id}, {"$set": {"end_time": end_ts}}
+        {"_id": track_obj_id}, {"$set": {"end_time": end_ts, "updated_at": datetime.utcnow()}}
     )
     if update_result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Track not found")
@@ -239,6 +646,8 @@ async def end_track(track_id: str, end_time: Optional[datetime] = None):
     updated = await db.tracks.find_one({"_id": track_obj_id})
     # Compute and store trip stats automatically
     await compute_and_store_trip(updated)
+    # Simplified geometries are only needed for display; build them after responding.
+    background_tasks.add_task(cache_track_geometries, updated)
 
     return Track(
         id=str(updated["_id"]),
@@ -249,41 +658,302 @@ async def end_track(track_id: str, end_time: Optional[datetime] = None):
     )
 
 
-@api_router.get("/tracks", response_model=List[Track])
-async def list_tracks():
-    cursor = db.tracks.find().sort("start_time", -1).limit(100)
-    items: List[Track] = []
-    async for doc in cursor:
-        items.append(
-            Track(
-                id=str(doc["_id"]),
-                name=doc.get("name"),
-                notes=doc.get("notes"),
-                start_time=doc["start_time"],
-                end_time=doc.get("end_time"),
-            )
+class TrackGeometry(BaseModel):
+    track_id: str
+    zoom: int
+    tolerance_m: float
+    source_point_count: int
+    coordinates: List[List[float]]  # [lon, lat] pairs, GeoJSON order
+
+
+GEOMETRY_MIN_ZOOM = 0
+GEOMETRY_MAX_ZOOM = 16
+# Fixes that stray less than this many screen pixels from the simplified line
+# at a given zoom are dropped.
+GEOMETRY_TOLERANCE_PX = 1.0
+
+
+# The line at this zoom is also stored on the track as its 2dsphere-indexed
+# ``path`` for area queries.
+TRACK_PATH_ZOOM = 10
+
+
+async def cache_track_geometries(track_doc: dict) -> dict:
+    """Simplify a track for every zoom level and cache the results.
+
+    Returns the cached documents keyed by zoom. Documents carry the running
+    stats revision they were built from; those of a finished track are
+    marked final and served without further checks.
+    """
+    track_id = track_doc["_id"]
+    revision = (track_doc.get("running_stats") or {}).get("revision")
+    chunks = [chunk async for chunk in point_store.iter_chunks(track_id, POINT_CHUNK_SIZE)]
+    arrays = TrackArrays.concat(chunks)
+    levels = await asyncio.to_thread(
+        simplification_levels,
+        arrays.lat,
+        arrays.lon,
+        range(GEOMETRY_MIN_ZOOM, GEOMETRY_MAX_ZOOM + 1),
+        GEOMETRY_TOLERANCE_PX,
+    )
+
+    docs = {}
+    for zoom, (tolerance_m, kept) in levels.items():
+        docs[zoom] = {
+            "track_id": track_id,
+            "zoom": zoom,
+            "tolerance_m": tolerance_m,
+            "source_point_count": len(arrays),
+            "coordinates": np.column_stack((arrays.lon[kept], arrays.lat[kept])).tolist(),
+            "revision": revision,
+            "final": track_doc.get("end_time") is not None,
+        }
+    await db.track_geometries.bulk_write(
+        [
+            ReplaceOne({"track_id": track_id, "zoom": zoom}, doc, upsert=True)
+            for zoom, doc in docs.items()
+        ],
+        ordered=False,
+    )
+    await store_track_path(track_id, docs[TRACK_PATH_ZOOM]["coordinates"])
+    return docs
+
+
+async def store_track_path(track_id: ObjectId, coordinates: List[List[float]]) -> None:
+    path = line_geometry(coordinates)
+    update = {"$set": {"path": path}} if path else {"$unset": {"path": ""}}
+    try:
+        await db.tracks.update_one({"_id": track_id}, update)
+    except WriteError as exc:
+        # 2dsphere refuses some degenerate lines; the track just stays out
+        # of area queries.
+        logger.warning("Track %s path not indexable: %s", track_id, exc)
+
+
+def track_geometry_from_doc(doc: dict) -> TrackGeometry:
+    return TrackGeometry(
+        track_id=str(doc["track_id"]),
+        zoom=doc["zoom"],
+        tolerance_m=doc["tolerance_m"],
+        source_point_count=doc["source_point_count"],
+        coordinates=doc["coordinates"],
+    )
+
+
+@api_router.get("/tracks/{track_id}/geometry", response_model=TrackGeometry)
+async def get_track_geometry(track_id: str, zoom: int = Query(12, ge=0, le=22)):
+    """Track line simplified for display at a map zoom level."""
+    try:
+        track_obj_id = ObjectId(track_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid track id")
+
+    zoom = min(max(zoom, GEOMETRY_MIN_ZOOM), GEOMETRY_MAX_ZOOM)
+    cached = await db.track_geometries.find_one({"track_id": track_obj_id, "zoom": zoom})
+    if cached and cached.get("final"):
+        return track_geometry_from_doc(cached)
+
+    track = await db.tracks.find_one({"_id": track_obj_id})
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    revision = (track.get("running_stats") or {}).get("revision")
+    if cached and cached.get("revision") == revision and revision is not None:
+        return track_geometry_from_doc(cached)
+
+    docs = await cache_track_geometries(track)
+    return track_geometry_from_doc(docs[zoom])
+
+
+@api_router.get("/tracks/{track_id}/export")
+async def export_track(
+    track_id: str,
+    request: Request,
+    format: str = Query("gpx", pattern="^(gpx|geojson|csv)$"),
+    gzip: bool = False,
+):
+    """Download a track's fixes as GPX, GeoJSON or CSV, optionally gzipped.
+
+    The body is streamed from the sorted point store a chunk at a time.
+    Exports are byte-for-byte reproducible while the track is unchanged
+    (the ETag follows the running stats revision), so an interrupted
+    download resumes with ``Range: bytes=N-``; the export is regenerated
+    and the first N bytes skipped. The total length a range response needs
+    is stored on a finished track per revision and variant whenever a full
+    export has been generated, so only a resume that comes before any
+    complete pass has to generate the export twice.
+    """
+    try:
+        track_obj_id = ObjectId(track_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid track id")
+
+    track = await db.tracks.find_one(
+        {"_id": track_obj_id}, {"name": 1, "end_time": 1, "running_stats.revision": 1, "export_lengths": 1}
+    )
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+
+    export_format = EXPORT_FORMATS[format]
+    revision = (track.get("running_stats") or {}).get("revision")
+    variant = f"{format}-gz" if gzip else format
+    etag = f'"{track_id}-{revision}-{variant}"'
+    filename = f"track-{track_id}.{export_format.extension}{'.gz' if gzip else ''}"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+    }
+    media_type = "application/gzip" if gzip else export_format.media_type
+
+    # Only finished tracks: a recording one changes with every upload.
+    cacheable = revision is not None and track.get("end_time") is not None
+
+    async def record_length(total: int) -> None:
+        if not cacheable:
+            return
+        # Only while the revision still matches, so a stale length is never stored.
+        await db.tracks.update_one(
+            {"_id": track_obj_id, "running_stats.revision": revision},
+            {"$set": {f"export_lengths.{variant}": {"revision": revision, "bytes": total}}},
         )
-    return items
+
+    def body():
+        chunks = export_chunks(
+            point_store.iter_chunks(track_obj_id, POINT_CHUNK_SIZE), format, track_id, track.get("name")
+        )
+        return gzip_chunks(chunks) if gzip else chunks
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        known = (track.get("export_lengths") or {}).get(variant) or {}
+        if cacheable and known.get("revision") == revision:
+            total = known["bytes"]
+        else:
+            total = await byte_count(body())
+            await record_length(total)
+        try:
+            byte_range = parse_range(range_header, total)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{total}"})
+        if byte_range is not None:
+            first, last = byte_range
+            headers["Content-Range"] = f"bytes {first}-{last}/{total}"
+            headers["Content-Length"] = str(last - first + 1)
+            return StreamingResponse(
+                byte_slice(body(), first, last), status_code=206, media_type=media_type, headers=headers
+            )
+    return StreamingResponse(counting_chunks(body(), record_length), media_type=media_type, headers=headers)
+
+
+async def list_page_response(
+    collection,
+    ordering: Ordering,
+    projection: dict,
+    to_row: Callable[[dict], dict],
+    cursor: Optional[str],
+    limit: int,
+    updated_since: Optional[datetime],
+) -> FastJSONResponse:
+    """Shared keyset paging and serialization for the list endpoints.
+
+    Only the projected fields are fetched and each document is mapped
+    straight to its response dict, bypassing per-item models. The next
+    page's cursor is returned in the X-Next-Cursor header so the response
+    bodies keep their list schema. With ``updated_since`` the listing
+    switches to (updated_at, _id) order for incremental sync; deletes are
+    not listed there, see ``list_deletions``.
+    """
+    query = {}
+    if updated_since is not None:
+        ordering = SYNC_ORDERING
+        query = {"updated_at": {"$gte": updated_since}}
+    # The cursor is built from the last row's ordering field.
+    projection = {**projection, ordering.field: 1}
+    try:
+        docs, next_cursor = await fetch_page(collection, ordering, query, cursor, limit, projection)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {exc}")
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse([to_row(doc) for doc in docs], headers=headers)
+
+
+PageSize = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
+
+@api_router.get("/tracks", response_model=List[Track])
+async def list_tracks(
+    cursor: Optional[str] = None,
+    limit: int = PageSize,
+    updated_since: Optional[datetime] = None,
+):
+    return await list_page_response(
+        db.tracks,
+        Ordering("start_time", -1),
+        TRACK_PROJECTION,
+        track_row,
+        cursor,
+        limit,
+        updated_since,
+    )
 
 
 @api_router.get("/trips", response_model=List[Trip])
-async def list_trips():
-    cursor = db.trips.find().sort("start_time", -1).limit(100)
-    items: List[Trip] = []
-    async for doc in cursor:
-        items.append(
-            Trip(
-                id=str(doc["_id"]),
-                track_id=str(doc["track_id"]),
-                name=doc.get("name"),
-                start_time=doc["start_time"],
-                end_time=doc.get("end_time"),
-                distance_nm=float(doc.get("distance_nm", 0.0)),
-                avg_speed_kn=float(doc.get("avg_speed_kn", 0.0)),
-                max_speed_kn=float(doc.get("max_speed_kn", 0.0)),
-            )
+async def list_trips(
+    cursor: Optional[str] = None,
+    limit: int = PageSize,
+    updated_since: Optional[datetime] = None,
+):
+    return await list_page_response(
+        db.trips,
+        Ordering("start_time", -1),
+        TRIP_PROJECTION,
+        trip_row,
+        cursor,
+        limit,
+        updated_since,
+    )
+
+
+class Deletion(BaseModel):
+    collection: str
+    id: str
+    deleted_at: datetime
+
+
+DELETION_ORDERING = Ordering("deleted_at", 1)
+
+
+async def record_deletion(collection: str, item_id: ObjectId) -> None:
+    """Leave a tombstone so incremental sync can see the delete."""
+    await db.deleted_items.insert_one(
+        {"collection": collection, "item_id": item_id, "deleted_at": datetime.utcnow()}
+    )
+
+
+@api_router.get("/deletions", response_model=List[Deletion])
+async def list_deletions(since: datetime, cursor: Optional[str] = None, limit: int = PageSize):
+    """Waypoints and routes deleted at or after ``since``, oldest first.
+
+    The companion to ``updated_since`` listings. Tombstones expire after
+    DELETION_RETENTION_S, so a client whose last sync is older than that
+    gets 410 and has to resync in full.
+    """
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    if since < datetime.utcnow() - timedelta(seconds=DELETION_RETENTION_S):
+        raise HTTPException(status_code=410, detail="Deletions that old are no longer kept; resync in full")
+    try:
+        docs, next_cursor = await fetch_page(
+            db.deleted_items, DELETION_ORDERING, {"deleted_at": {"$gte": since}}, cursor, limit
         )
-    return items
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {exc}")
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse(
+        [{"collection": d["collection"], "id": str(d["item_id"]), "deleted_at": d["deleted_at"]} for d in docs],
+        headers=headers,
+    )
 
 
 @api_router.get("/trips/{trip_id}", response_model=Trip)
@@ -296,16 +966,7 @@ async def get_trip(trip_id: str):
     doc = await db.trips.find_one({"_id": obj_id})
     if not doc:
         raise HTTPException(status_code=404, detail="Trip not found")
-    return Trip(
-        id=str(doc["_id"]),
-        track_id=str(doc["track_id"]),
-        name=doc.get("name"),
-        start_time=doc["start_time"],
-        end_time=doc.get("end_time"),
-        distance_nm=float(doc.get("distance_nm", 0.0)),
-        avg_speed_kn=float(doc.get("avg_speed_kn", 0.0)),
-        max_speed_kn=float(doc.get("max_speed_kn", 0.0)),
-    )
+    return trip_from_doc(doc)
 
 
 # -------------------------
@@ -314,13 +975,16 @@ async def get_trip(trip_id: str):
 class WaypointCreate(BaseModel):
     name: str
     description: Optional[str] = None
-    lat: float
-    lon: float
+    # Range-checked: location_2dsphere rejects anything else.
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
 
 
 class WaypointUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class Waypoint(BaseModel):
@@ -351,15 +1015,23 @@ class Route(BaseModel):
     created_at: datetime
 
 
+WAYPOINT_PROJECTION = {"name": 1, "description": 1, "lat": 1, "lon": 1, "created_at": 1}
+
+
+def waypoint_row(doc: dict) -> dict:
+    """A waypoint document as a dict in ``Waypoint`` field order."""
+    return {
+        "id": str(doc["_id"]),
+        "name": doc["name"],
+        "description": doc.get("description"),
+        "lat": float(doc["lat"]),
+        "lon": float(doc["lon"]),
+        "created_at": doc["created_at"],
+    }
+
+
 def waypoint_from_doc(doc: dict) -> Waypoint:
-    return Waypoint(
-        id=str(doc["_id"]),
-        name=doc["name"],
-        description=doc.get("description"),
-        lat=doc["lat"],
-        lon=doc["lon"],
-        created_at=doc["created_at"],
-    )
+    return Waypoint(**waypoint_row(doc))
 
 
 @api_router.post("/waypoints", response_model=Waypoint)
@@ -370,7 +1042,9 @@ async def create_waypoint(payload: WaypointCreate):
         "description": payload.description,
         "lat": payload.lat,
         "lon": payload.lon,
+        "location": point(payload.lat, payload.lon),
         "created_at": now,
+        "updated_at": now,
     }
     result = await db.waypoints.insert_one(doc)
     doc["_id"] = result.inserted_id
@@ -378,12 +1052,74 @@ async def create_waypoint(payload: WaypointCreate):
 
 
 @api_router.get("/waypoints", response_model=List[Waypoint])
-async def list_waypoints():
-    cursor = db.waypoints.find().sort("created_at", -1).limit(200)
-    items: List[Waypoint] = []
-    async for doc in cursor:
-        items.append(waypoint_from_doc(doc))
-    return items
+async def list_waypoints(
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=MAX_PAGE_SIZE),
+    updated_since: Optional[datetime] = None,
+):
+    return await list_page_response(
+        db.waypoints,
+        Ordering("created_at", -1),
+        WAYPOINT_PROJECTION,
+        waypoint_row,
+        cursor,
+        limit,
+        updated_since,
+    )
+
+
+class WaypointDistanceMatrixRequest(BaseModel):
+    waypoint_ids: List[str]
+
+
+class WaypointDistanceMatrix(BaseModel):
+    waypoint_ids: List[str]
+    distances_nm: List[List[float]]
+
+
+DISTANCE_MATRIX_MAX_WAYPOINTS = 500
+
+
+def parse_waypoint_ids(waypoint_ids: List[str]) -> List[ObjectId]:
+    try_ids = []
+    for wid in waypoint_ids:
+        try:
+            try_ids.append(ObjectId(wid))
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"Invalid waypoint id: {wid}")
+    return try_ids
+
+
+async def fetch_waypoints_in_order(waypoint_ids: List[ObjectId]) -> List[dict]:
+    """Waypoint docs for ``waypoint_ids`` in the given order; missing ids are dropped."""
+    docs = await db.waypoints.find({"_id": {"$in": waypoint_ids}}).to_list(None)
+    by_id = {doc["_id"]: doc for doc in docs}
+    return [by_id[wid] for wid in waypoint_ids if wid in by_id]
+
+
+@api_router.post("/waypoints/distance-matrix", response_model=WaypointDistanceMatrix)
+async def waypoint_distance_matrix(payload: WaypointDistanceMatrixRequest):
+    """Great-circle distances between every pair of the given waypoints.
+
+    Row and column ``i`` belong to ``waypoint_ids[i]``; distances are in
+    nautical miles rounded to 0.001 nm.
+    """
+    if not payload.waypoint_ids:
+        raise HTTPException(status_code=400, detail="At least one waypoint id is required")
+    if len(payload.waypoint_ids) > DISTANCE_MATRIX_MAX_WAYPOINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {DISTANCE_MATRIX_MAX_WAYPOINTS} waypoints per request",
+        )
+    try_ids = parse_waypoint_ids(payload.waypoint_ids)
+    waypoint_docs = await fetch_waypoints_in_order(try_ids)
+    if len(waypoint_docs) != len(try_ids):
+        raise HTTPException(status_code=400, detail="One or more waypoints do not exist")
+
+    matrix = distance_matrix_nm([w["lat"] for w in waypoint_docs], [w["lon"] for w in waypoint_docs])
+    return FastJSONResponse(
+        {"waypoint_ids": payload.waypoint_ids, "distances_nm": np.round(matrix, 3).tolist()}
+    )
 
 
 @api_router.delete("/waypoints/{waypoint_id}")
@@ -396,17 +1132,113 @@ async def delete_waypoint(waypoint_id: str):
     result = await db.waypoints.delete_one({"_id": obj_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Waypoint not found")
+    await record_deletion("waypoints", obj_id)
+    await update_dependent_routes(obj_id, lambda route_doc: remove_waypoint(route_doc, obj_id))
     return {"deleted": True}
 
 
-def route_from_doc(doc: dict) -> Route:
-    return Route(
-        id=str(doc["_id"]),
-        name=doc["name"],
-        description=doc.get("description"),
-        waypoint_ids=[str(wid) for wid in doc.get("waypoint_ids", [])],
-        created_at=doc["created_at"],
+@api_router.patch("/waypoints/{waypoint_id}", response_model=Waypoint)
+async def update_waypoint(waypoint_id: str, payload: WaypointUpdate):
+    try:
+        obj_id = ObjectId(waypoint_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid waypoint id")
+
+    changes = payload.model_dump(exclude_unset=True)
+    for field in ("name", "lat", "lon"):
+        if field in changes and changes[field] is None:
+            raise HTTPException(status_code=400, detail=f"{field} cannot be null")
+    changes["updated_at"] = datetime.utcnow()
+    # Pipeline update so the GeoJSON location is rebuilt from the stored
+    # lat/lon even when only one of them changes.
+    doc = await db.waypoints.find_one_and_update(
+        {"_id": obj_id},
+        [
+            {"$set": {field: {"$literal": value} for field, value in changes.items()}},
+            {"$set": {"location": {"type": "Point", "coordinates": ["$lon", "$lat"]}}},
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Waypoint not found")
+    await update_dependent_routes(obj_id, lambda route_doc: replace_waypoint(route_doc, doc))
+    return waypoint_from_doc(doc)
+
+
+# Routes store a snapshot of their waypoints plus per-leg distance and
+# bearing (see route_geometry). Waypoint edits and deletes patch the routes
+# found through the waypoint_ids index, compare-and-swap on
+# geometry_revision like the running trip stats.
+ROUTE_GEOMETRY_MAX_RETRIES = 5
+
+
+async def save_route_geometry(route_doc: dict, fields: dict) -> bool:
+    revision = route_doc.get("geometry_revision")
+    result = await db.routes.update_one(
+        {"_id": route_doc["_id"], "geometry_revision": revision},
+        {
+            "$set": {
+                **fields,
+                "geometry_revision": (revision or 0) + 1,
+                "updated_at": datetime.utcnow(),
+            }
+        },
     )
+    return result.matched_count == 1
+
+
+async def rebuild_route_geometry(route_doc: dict) -> dict:
+    """Compute and store the geometry of a route saved without it, or
+    whose incremental update kept losing races. Returns the updated doc."""
+    for _ in range(ROUTE_GEOMETRY_MAX_RETRIES):
+        fields = route_geometry(await fetch_waypoints_in_order(route_doc.get("waypoint_ids", [])))
+        if await save_route_geometry(route_doc, fields):
+            break
+        latest = await db.routes.find_one({"_id": route_doc["_id"]})
+        if not latest:
+            break
+        if has_geometry(latest):
+            return latest
+        route_doc = latest
+    return {**route_doc, **fields}
+
+
+async def update_dependent_routes(
+    waypoint_id: ObjectId, change: Callable[[dict], Optional[dict]]
+) -> None:
+    """Apply ``change`` (route doc -> geometry fields, or None) to every
+    route that contains ``waypoint_id``."""
+    async for route_doc in db.routes.find({"waypoint_ids": waypoint_id}):
+        for _ in range(ROUTE_GEOMETRY_MAX_RETRIES):
+            if not has_geometry(route_doc):
+                await rebuild_route_geometry(route_doc)
+                break
+            fields = change(route_doc)
+            if fields is None or await save_route_geometry(route_doc, fields):
+                break
+            route_doc = await db.routes.find_one({"_id": route_doc["_id"]})
+            if not route_doc:
+                break
+        else:
+            await rebuild_route_geometry(route_doc)
+
+
+ROUTE_PROJECTION = {"name": 1, "description": 1, "waypoint_ids": 1, "created_at": 1}
+
+
+def route_row(doc: dict) -> dict:
+    """A route document as a dict in ``Route`` field order."""
+    return {
+        "id": str(doc["_id"]),
+        "name": doc["name"],
+        "description": doc.get("description"),
+        "waypoint_ids": [str(wid) for wid in doc.get("waypoint_ids", [])],
+        "created_at": doc["created_at"],
+    }
+
+
+def route_from_doc(doc: dict) -> Route:
+    return Route(**route_row(doc))
 
 
 @api_router.post("/routes", response_model=Route)
@@ -414,24 +1246,21 @@ async def create_route(payload: RouteCreate):
     if not payload.waypoint_ids or len(payload.waypoint_ids) < 2:
         raise HTTPException(status_code=400, detail="Route must have at least two waypoints")
 
-    try_ids = []
-    for wid in payload.waypoint_ids:
-        try:
-            try_ids.append(ObjectId(wid))
-        except Exception:
-            raise HTTPException(status_code=400, detail=f"Invalid waypoint id: {wid}")
+    try_ids = parse_waypoint_ids(payload.waypoint_ids)
 
     # Ensure all waypoints exist
-    count = await db.waypoints.count_documents({"_id": {"$in": try_ids}})
-    if count != len(try_ids):
+    waypoint_docs = await fetch_waypoints_in_order(try_ids)
+    if len(waypoint_docs) != len(try_ids):
         raise HTTPException(status_code=400, detail="One or more waypoints do not exist")
 
     now = datetime.utcnow()
     doc = {
         "name": payload.name,
         "description": payload.description,
-        "waypoint_ids": try_ids,
+        **route_geometry(waypoint_docs),
+        "geometry_revision": 0,
         "created_at": now,
+        "updated_at": now,
     }
     result = await db.routes.insert_one(doc)
     doc["_id"] = result.inserted_id
@@ -439,12 +1268,20 @@ async def create_route(payload: RouteCreate):
 
 
 @api_router.get("/routes", response_model=List[Route])
-async def list_routes():
-    cursor = db.routes.find().sort("created_at", -1).limit(100)
-    items: List[Route] = []
-    async for doc in cursor:
-        items.append(route_from_doc(doc))
-    return items
+async def list_routes(
+    cursor: Optional[str] = None,
+    limit: int = PageSize,
+    updated_since: Optional[datetime] = None,
+):
+    return await list_page_response(
+        db.routes,
+        Ordering("created_at", -1),
+        ROUTE_PROJECTION,
+        route_row,
+        cursor,
+        limit,
+        updated_since,
+    )
 
 
 @api_router.get("/routes/{route_id}", response_model=Route)
@@ -470,21 +1307,42 @@ async def delete_route(route_id: str):
     result = await db.routes.delete_one({"_id": obj_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Route not found")
+    await record_deletion("routes", obj_id)
     return {"deleted": True}
 
 
+class RouteLeg(BaseModel):
+    from_waypoint_id: str
+    to_waypoint_id: str
+    distance_nm: float
+    bearing_deg: float
+    cumulative_distance_nm: float
+    eta_hours: Optional[float] = None
+    eta: Optional[datetime] = None
+
+
 class RouteWithWaypoints(BaseModel):
     id: str
     name: str
     description: Optional[str] = None
     waypoints: List[Waypoint]
+    legs: List[RouteLeg] = []
     total_distance_nm: float
     created_at: datetime
 
 
 @api_router.get("/routes/{route_id}/details", response_model=RouteWithWaypoints)
-async def get_route_with_waypoints(route_id: str):
-    """Get a route with full waypoint details and calculate total distance."""
+async def get_route_with_waypoints(
+    route_id: str,
+    speed_kn: Optional[float] = Query(None, gt=0),
+    departure: Optional[datetime] = None,
+):
+    """Get a route with its waypoints and precomputed leg geometry.
+
+    Each leg has its distance, initial bearing and the distance run so far;
+    given ``speed_kn`` also the elapsed hours at its end, and given
+    ``departure`` as well the arrival time.
+    """
     try:
         obj_id = ObjectId(route_id)
     except Exception:
@@ -493,42 +1351,483 @@ async def get_route_with_waypoints(route_id: str):
     route_doc = await db.routes.find_one({"_id": obj_id})
     if not route_doc:
         raise HTTPException(status_code=404, detail="Route not found")
+    if not has_geometry(route_doc):
+        route_doc = await rebuild_route_geometry(route_doc)
+    return route_details_from_doc(route_doc, speed_kn, departure)
 
-    waypoint_ids = route_doc.get("waypoint_ids", [])
-    if not waypoint_ids:
-        return RouteWithWaypoints(
-            id=str(route_doc["_id"]),
-            name=route_doc["name"],
-            description=route_doc.get("description"),
-            waypoints=[],
-            total_distance_nm=0.0,
-            created_at=route_doc["created_at"],
-        )
-
-    # Fetch all waypoints in a single query (optimized - no N+1)
-    waypoints_docs = await db.waypoints.find({"_id": {"$in": waypoint_ids}}).to_list(None)
-    waypoints_map = {str(doc["_id"]): waypoint_from_doc(doc) for doc in waypoints_docs}
-    
-    # Maintain order from waypoint_ids
-    waypoints_list = [waypoints_map[str(wid)] for wid in waypoint_ids if str(wid) in waypoints_map]
-
-    # Calculate total distance between consecutive waypoints
-    total_distance_nm = 0.0
-    for i in range(len(waypoints_list) - 1):
-        w1 = waypoints_list[i]
-        w2 = waypoints_list[i + 1]
-        total_distance_nm += haversine_nm(w1.lat, w1.lon, w2.lat, w2.lon)
 
+def route_details_from_doc(
+    route_doc: dict, speed_kn: Optional[float] = None, departure: Optional[datetime] = None
+) -> RouteWithWaypoints:
     return RouteWithWaypoints(
         id=str(route_doc["_id"]),
         name=route_doc["name"],
         description=route_doc.get("description"),
-        waypoints=waypoints_list,
-        total_distance_nm=total_distance_nm,
+        waypoints=[waypoint_from_doc(w) for w in route_doc["waypoints"]],
+        legs=leg_breakdown(route_doc, speed_kn, departure),
+        total_distance_nm=route_doc["total_distance_nm"],
         created_at=route_doc["created_at"],
     )
 
 
+class RouteOptimizeRequest(BaseModel):
+    fix_start: bool = True
+    fix_end: bool = False
+    save: bool = False
+
+
+class RouteOptimization(BaseModel):
+    route: RouteWithWaypoints
+    original_distance_nm: float
+    optimized_distance_nm: float
+    saved_distance_nm: float
+    saved: bool
+
+
+ROUTE_OPTIMIZE_MAX_WAYPOINTS = 1000
+
+
+@api_router.post("/routes/{route_id}/optimize", response_model=RouteOptimization)
+async def optimize_route(route_id: str, payload: RouteOptimizeRequest = RouteOptimizeRequest()):
+    """Reorder a route's waypoints to shorten it.
+
+    Nearest-neighbour plus 2-opt over the route's distance matrix, keeping
+    the first and/or last waypoint in place when asked. The result is only
+    a proposal unless ``save`` is set; saving fails with 409 if the route
+    changed in the meantime.
+    """
+    try:
+        obj_id = ObjectId(route_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid route id")
+
+    route_doc = await db.routes.find_one({"_id": obj_id})
+    if not route_doc:
+        raise HTTPException(status_code=404, detail="Route not found")
+    if not has_geometry(route_doc):
+        route_doc = await rebuild_route_geometry(route_doc)
+    waypoints = route_doc["waypoints"]
+    if len(waypoints) > ROUTE_OPTIMIZE_MAX_WAYPOINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Routes of at most {ROUTE_OPTIMIZE_MAX_WAYPOINTS} waypoints can be optimized",
+        )
+
+    dist = distance_matrix_nm([w["lat"] for w in waypoints], [w["lon"] for w in waypoints])
+    order = optimize_order(dist, payload.fix_start, payload.fix_end)
+    fields = route_geometry([waypoints[i] for i in order])
+    optimized = {**route_doc, **fields}
+
+    saved = False
+    if payload.save and order != list(range(len(waypoints))):
+        if not await save_route_geometry(route_doc, fields):
+            raise HTTPException(status_code=409, detail="Route changed while optimizing; try again")
+        saved = True
+
+    original_nm = route_doc["total_distance_nm"]
+    optimized_nm = optimized["total_distance_nm"]
+    return RouteOptimization(
+        route=route_details_from_doc(optimized),
+        original_distance_nm=original_nm,
+        optimized_distance_nm=optimized_nm,
+        saved_distance_nm=max(original_nm - optimized_nm, 0.0),
+        saved=saved,
+    )
+
+
+# -------------------------
+# Map Area Queries
+# -------------------------
+AREA_DEFAULT_LIMIT = 500
+AREA_MAX_LIMIT = 2000
+AREA_MAX_RADIUS_NM = 500.0
+METERS_PER_NM = KM_PER_NM * 1000.0
+AreaLimit = Query(AREA_DEFAULT_LIMIT, ge=1, le=AREA_MAX_LIMIT)
+LIVE_TRACK_BOUNDS = {
+    f"running_stats.{field}": 1 for field in ("min_lat", "min_lon", "max_lat", "max_lon")
+}
+
+
+def parse_area(
+    bbox: Optional[str], lat: Optional[float], lon: Optional[float], radius_nm: Optional[float]
+) -> Optional[tuple]:
+    """The box (min_lon, min_lat, max_lon, max_lat) from ``bbox``, or None
+    for a ``lat``/``lon``/``radius_nm`` circle. Exactly one must be given."""
+    circle = (lat, lon, radius_nm)
+    if bbox is not None:
+        if any(v is not None for v in circle):
+            raise HTTPException(status_code=400, detail="Give either bbox or lat/lon/radius_nm, not both")
+        try:
+            box = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            box = ()
+        if (
+            len(box) != 4
+            or not all(-180.0 <= box[i] <= 180.0 for i in (0, 2))
+            or not -90.0 <= box[1] <= box[3] <= 90.0
+        ):
+            raise HTTPException(status_code=400, detail="Invalid bbox; expected min_lon,min_lat,max_lon,max_lat")
+        return box
+    if any(v is None for v in circle):
+        raise HTTPException(status_code=400, detail="Give either bbox or lat, lon and radius_nm")
+    return None
+
+
+def near_filter(lat: float, lon: float, radius_nm: float) -> dict:
+    return {"$nearSphere": {"$geometry": point(lat, lon), "$maxDistance": radius_nm * METERS_PER_NM}}
+
+
+@api_router.get("/waypoints/within", response_model=List[Waypoint])
+async def waypoints_within(
+    bbox: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_nm: Optional[float] = Query(None, gt=0, le=AREA_MAX_RADIUS_NM),
+    limit: int = AreaLimit,
+):
+    """Waypoints inside a map viewport or within a radius.
+
+    ``bbox`` is min_lon,min_lat,max_lon,max_lat (min_lon > max_lon crosses
+    the antimeridian). Radius results are nearest first.
+    """
+    box = parse_area(bbox, lat, lon, radius_nm)
+    if box is not None:
+        query = {"location": {"$geoWithin": {"$geometry": box_geometry(*box)}}}
+    else:
+        query = {"location": near_filter(lat, lon, radius_nm)}
+    docs = await db.waypoints.find(query, WAYPOINT_PROJECTION).limit(limit).to_list(limit)
+    return FastJSONResponse([waypoint_row(doc) for doc in docs])
+
+
+@api_router.get("/tracks/within", response_model=List[Track])
+async def tracks_within(
+    bbox: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_nm: Optional[float] = Query(None, gt=0, le=AREA_MAX_RADIUS_NM),
+    limit: int = AreaLimit,
+):
+    """Tracks passing through a map viewport or within a radius.
+
+    Finished tracks are matched on their indexed simplified ``path``.
+    Tracks still recording have no path yet and are matched when the
+    bounding box of their running stats overlaps the area; they are listed
+    first.
+    """
+    box = parse_area(bbox, lat, lon, radius_nm)
+    if box is not None:
+        query = {"path": {"$geoIntersects": {"$geometry": box_geometry(*box)}}}
+        search_box = box
+    else:
+        query = {"path": near_filter(lat, lon, radius_nm)}
+        search_box = box_around(lat, lon, radius_nm)
+
+    rows = []
+    async for doc in db.tracks.find({"end_time": None}, {**TRACK_PROJECTION, **LIVE_TRACK_BOUNDS}):
+        running = doc.get("running_stats") or {}
+        bounds = tuple(running.get(f) for f in ("min_lon", "min_lat", "max_lon", "max_lat"))
+        if None not in bounds and boxes_overlap(bounds, search_box):
+            rows.append(track_row(doc))
+    if len(rows) < limit:
+        query["end_time"] = {"$ne": None}
+        remaining = limit - len(rows)
+        docs = await db.tracks.find(query, TRACK_PROJECTION).limit(remaining).to_list(remaining)
+        rows.extend(track_row(doc) for doc in docs)
+    return FastJSONResponse(rows[:limit])
+
+
+# -------------------------
+# GPX Import
+# -------------------------
+class GpxImport(BaseModel):
+    id: str
+    status: str  # pending, running, done or failed
+    bytes_read: int = 0
+    content_length: Optional[int] = None
+    tracks: int = 0
+    waypoints: int = 0
+    points: int = 0
+    points_skipped: int = 0
+    track_ids: List[str] = []
+    # The track that was being written when a failed import stopped.
+    partial_track_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+def gpx_import_from_doc(doc: dict) -> GpxImport:
+    return GpxImport(
+        id=str(doc["_id"]),
+        status=doc["status"],
+        bytes_read=doc.get("bytes_read", 0),
+        content_length=doc.get("content_length"),
+        tracks=doc.get("tracks", 0),
+        waypoints=doc.get("waypoints", 0),
+        points=doc.get("points", 0),
+        points_skipped=doc.get("points_skipped", 0),
+        track_ids=[str(tid) for tid in doc.get("track_ids", [])],
+        partial_track_id=str(doc["partial_track_id"]) if doc.get("partial_track_id") else None,
+        error=doc.get("error"),
+        created_at=doc["created_at"],
+        updated_at=doc["updated_at"],
+    )
+
+
+# Fixes are written (and folded into the track's trip stats) this many at a
+# time; progress is saved after every batch.
+GPX_IMPORT_BATCH_POINTS = 20000
+GPX_IMPORT_BATCH_WAYPOINTS = 1000
+
+
+class GpxTrackImport:
+    """One GPX ``<trk>`` being written: its fixes are bulk-inserted in
+    batches and folded into trip stats in the same pass.
+
+    The stats are stored with every batch, so ``/tracks/{id}/stats`` is
+    right while the import runs. They are marked stale before each insert
+    and only cleared once the batch is folded, so an import that dies
+    part-way leaves stats that the next read recomputes, never zeros.
+    """
+
+    def __init__(self, name: Optional[str]):
+        self.name = name
+        self.track_id: Optional[ObjectId] = None
+        self.acc = TripAccumulator()
+        self.stale = False
+        self.fixes: List[GpxFix] = []
+        self.inserted = 0
+
+    async def flush(self) -> None:
+        if not self.fixes:
+            return
+        columns = np.array(self.fixes, dtype=np.float64)
+        self.fixes = []
+        arrays = TrackArrays(*columns.T)
+        arrays = drop_repeated_timestamps(arrays.select(np.argsort(arrays.t, kind="stable")))
+        if self.track_id is None:
+            now = datetime.utcnow()
+            result = await db.tracks.insert_one(
+                {
+                    "name": self.name,
+                    "notes": None,
+                    "start_time": from_epoch_seconds(arrays.t[0]),
+                    "end_time": None,
+                    "running_stats": {"stale": True, "revision": 0},
+                    "updated_at": now,
+                }
+            )
+            self.track_id = result.inserted_id
+        else:
+            await mark_running_stats_stale([self.track_id])
+        outcome = await point_store.insert(point_docs(self.track_id, arrays))
+        self.inserted += outcome.inserted
+        if not self.stale:
+            try:
+                self.acc.fold(arrays)
+            except OutOfOrderError:
+                # The file's fixes are not in time order; recompute on read.
+                self.stale = True
+        if not self.stale:
+            # $inc, so a reader's recompute that raced this batch fails its
+            # compare-and-swap and starts over.
+            await db.tracks.update_one(
+                {"_id": self.track_id},
+                {
+                    "$set": {f"running_stats.{k}": v for k, v in {**self.acc.to_doc(), "stale": False}.items()},
+                    "$inc": {"running_stats.revision": 1},
+                },
+            )
+
+    async def finish(self) -> Optional[dict]:
+        """Flush, close the track and store its trip; the track doc or None
+        if it had no usable fixes."""
+        await self.flush()
+        if self.track_id is None:
+            return None
+        track = await db.tracks.find_one({"_id": self.track_id})
+        acc = await load_accumulator(track)
+        track = await db.tracks.find_one_and_update(
+            {"_id": self.track_id},
+            {
+                "$set": {
+                    "start_time": from_epoch_seconds(acc.first_t),
+                    "end_time": from_epoch_seconds(acc.last_t),
+                    "updated_at": datetime.utcnow(),
+                }
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        await compute_and_store_trip(track)
+        return track
+
+
+async def run_gpx_import(import_id: ObjectId, request: Request, background_tasks: BackgroundTasks) -> None:
+    """Parse the upload as it arrives and write tracks, fixes and waypoints."""
+    reader = GpxReader()
+    gunzip = None
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        gunzip = zlib.decompressobj(wbits=47)
+    progress = {"bytes_read": 0, "tracks": 0, "waypoints": 0, "points": 0, "points_skipped": 0}
+    track_ids: List[ObjectId] = []
+    finished_points = 0
+    track: Optional[GpxTrackImport] = None
+    waypoint_docs: List[dict] = []
+
+    async def save_progress() -> None:
+        if track is not None and track.track_id is not None and track.track_id not in track_ids:
+            track_ids.append(track.track_id)
+        progress["tracks"] = len(track_ids)
+        progress["points"] = finished_points + (track.inserted if track is not None else 0)
+        progress["points_skipped"] = reader.skipped
+        await db.gpx_imports.update_one(
+            {"_id": import_id},
+            {"$set": {**progress, "track_ids": track_ids, "updated_at": datetime.utcnow()}},
+        )
+
+    async def flush_waypoints() -> None:
+        if waypoint_docs:
+            await db.waypoints.insert_many(waypoint_docs, ordered=False)
+            progress["waypoints"] += len(waypoint_docs)
+            waypoint_docs.clear()
+
+    async def finish_track() -> None:
+        nonlocal track, finished_points
+        doc = await track.finish()
+        await save_progress()
+        finished_points += track.inserted
+        track = None
+        if doc is not None:
+            # Simplified geometry (and the area-query path) after responding.
+            background_tasks.add_task(cache_track_geometries, doc)
+
+    async def handle(items) -> None:
+        nonlocal track
+        for item in items:
+            if isinstance(item, GpxFix):
+                if track is None:
+                    continue
+                track.fixes.append(item)
+                if len(track.fixes) >= GPX_IMPORT_BATCH_POINTS:
+                    await track.flush()
+                    await save_progress()
+            elif isinstance(item, GpxTrackStart):
+                track = GpxTrackImport(item.name)
+            elif isinstance(item, GpxTrackEnd):
+                await finish_track()
+            elif isinstance(item, GpxWaypoint):
+                now = datetime.utcnow()
+                waypoint_docs.append(
+                    {
+                        "name": item.name,
+                        "description": item.description,
+                        "lat": item.lat,
+                        "lon": item.lon,
+                        "location": point(item.lat, item.lon),
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                )
+                if len(waypoint_docs) >= GPX_IMPORT_BATCH_WAYPOINTS:
+                    await flush_waypoints()
+                    await save_progress()
+
+    try:
+        async for chunk in request.stream():
+            progress["bytes_read"] += len(chunk)
+            if gunzip is not None:
+                chunk = gunzip.decompress(chunk)
+            await handle(reader.feed(chunk))
+        await handle(reader.close())
+    except BaseException:
+        if track is not None and track.track_id is not None:
+            # Its stored fixes stay; make sure their stats are recomputed
+            # and say which track was cut short.
+            await mark_running_stats_stale([track.track_id])
+            await save_progress()
+            await db.gpx_imports.update_one({"_id": import_id}, {"$set": {"partial_track_id": track.track_id}})
+        raise
+    await flush_waypoints()
+    await save_progress()
+
+
+@api_router.post("/imports", response_model=GpxImport)
+async def create_gpx_import():
+    """Start an import; upload the file to ``/imports/{id}/gpx`` and poll
+    ``/imports/{id}`` for progress."""
+    now = datetime.utcnow()
+    doc = {"status": "pending", "created_at": now, "updated_at": now}
+    result = await db.gpx_imports.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    return gpx_import_from_doc(doc)
+
+
+@api_router.post("/imports/{import_id}/gpx", response_model=GpxImport)
+async def upload_gpx_import(import_id: str, request: Request, background_tasks: BackgroundTasks):
+    """Import a GPX file (optionally ``Content-Encoding: gzip``).
+
+    The body is parsed incrementally while it streams in, never held whole.
+    Each ``<trk>`` becomes a finished track whose fixes are bulk-inserted
+    in unordered batches and whose trip stats are built in the same pass;
+    each ``<wpt>`` becomes a waypoint. Counters are saved after every batch
+    so ``GET /imports/{id}`` reports progress while this request runs.
+    """
+    try:
+        obj_id = ObjectId(import_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid import id")
+
+    content_length = request.headers.get("content-length")
+    claimed = await db.gpx_imports.update_one(
+        {"_id": obj_id, "status": "pending"},
+        {
+            "$set": {
+                "status": "running",
+                "content_length": int(content_length) if content_length and content_length.isdigit() else None,
+                "updated_at": datetime.utcnow(),
+            }
+        },
+    )
+    if claimed.matched_count == 0:
+        if await db.gpx_imports.count_documents({"_id": obj_id}, limit=1):
+            raise HTTPException(status_code=409, detail="Import already uploaded")
+        raise HTTPException(status_code=404, detail="Import not found")
+
+    try:
+        await run_gpx_import(obj_id, request, background_tasks)
+    except (ParseError, zlib.error, ClientDisconnect) as exc:
+        error = "Upload interrupted" if isinstance(exc, ClientDisconnect) else f"Invalid GPX: {exc}"
+        await db.gpx_imports.update_one(
+            {"_id": obj_id}, {"$set": {"status": "failed", "error": error, "updated_at": datetime.utcnow()}}
+        )
+        raise HTTPException(status_code=400, detail=error)
+    except BaseException as exc:
+        await db.gpx_imports.update_one(
+            {"_id": obj_id},
+            {"$set": {"status": "failed", "error": str(exc) or type(exc).__name__, "updated_at": datetime.utcnow()}},
+        )
+        raise
+    doc = await db.gpx_imports.find_one_and_update(
+        {"_id": obj_id},
+        {"$set": {"status": "done", "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    return gpx_import_from_doc(doc)
+
+
+@api_router.get("/imports/{import_id}", response_model=GpxImport)
+async def get_gpx_import(import_id: str):
+    try:
+        obj_id = ObjectId(import_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid import id")
+
+    doc = await db.gpx_imports.find_one({"_id": obj_id})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return gpx_import_from_doc(doc)
+
+
 # -------------------------
 # Tide (NOAA) Models & Routes
 # -------------------------
@@ -540,6 +1839,10 @@ class TideStation(BaseModel):
     lon: Optional[float] = None
 
 
+class NearbyTideStation(TideStation):
+    distance_nm: float
+
+
 class TidePredictionPoint(BaseModel):
     time: datetime
     height_ft: float
@@ -556,47 +1859,49 @@ NOAA_METADATA_URL = "https://api.tidesandcurrents.noaa.gov/mdapi/prod/webapi/sta
 NOAA_PREDICTIONS_URL = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter"
 
 
+# Shared, pooled client for every NOAA call; opened and closed with the app.
+noaa = NoaaClient()
+
+
+async def fetch_noaa_stations() -> List[dict]:
+    data = await noaa.get_json("stations", NOAA_METADATA_URL, {"type": "tidepredictions"})
+    return data.get("stations", [])
+
+
+station_catalog = StationCatalog(
+    db.tide_station_catalog,
+    fetch_noaa_stations,
+    ttl_s=float(os.environ.get("TIDE_STATION_CATALOG_TTL_S", "86400")),
+)
+
+
 @api_router.get("/tides/stations", response_model=List[TideStation])
 async def search_stations(search: Optional[str] = None, state: Optional[str] = None):
-    params = {"type": "tidepredictions"}
-    async with httpx.AsyncClient(timeout=10) as client_http:
-        resp = await client_http.get(NOAA_METADATA_URL, params=params)
-    if resp.status_code != 200:
+    """Stations whose name words start with every word of ``search``, or
+    failing that, whose name contains ``search``."""
+    try:
+        index = await station_catalog.index()
+    except CatalogUnavailable:
         raise HTTPException(status_code=502, detail="Failed to fetch stations from NOAA")
+    return FastJSONResponse(index.search(search, state))
 
-    data = resp.json()
-    stations_raw = data.get("stations", [])
-
-    results: List[TideStation] = []
-    search_lower = search.lower() if search else None
-    state_lower = state.lower() if state else None
-
-    for s in stations_raw:
-        name = s.get("name", "")
-        st = s.get("state")
-        if search_lower and search_lower not in name.lower():
-            continue
-        if state_lower and (not st or state_lower != st.lower()):
-            continue
-
-        results.append(
-            TideStation(
-                id=str(s.get("id")),
-                name=name,
-                state=st,
-                lat=s.get("lat"),
-                lon=s.get("lng"),
-            )
-        )
-
-    return results
 
+@api_router.get("/tides/stations/nearest", response_model=List[NearbyTideStation])
+async def nearest_stations(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=50),
+):
+    try:
+        index = await station_catalog.index()
+    except CatalogUnavailable:
+        raise HTTPException(status_code=502, detail="Failed to fetch stations from NOAA")
+    return FastJSONResponse(
+        [{**station, "distance_nm": distance} for station, distance in index.nearest(lat, lon, k)]
+    )
 
-@api_router.get("/tides/stations/{station_id}/predictions", response_model=TidePredictionResponse)
-async def get_station_predictions(station_id: str, target_date: Optional[date] = None):
-    d = target_date or date.today()
-    day_str = d.strftime("%Y%m%d")
 
+async def fetch_prediction_range(station_id: str, first_day: date, last_day: date) -> List[dict]:
     params = {
         "station": station_id,
         "product": "predictions",
@@ -605,38 +1910,191 @@ async def get_station_predictions(station_id: str, target_date: Optional[date] =
         "units": "english",
         "interval": "hilo",
         "format": "json",
-        "begin_date": day_str,
-        "end_date": day_str,
+        "begin_date": first_day.strftime("%Y%m%d"),
+        "end_date": last_day.strftime("%Y%m%d"),
     }
-    async with httpx.AsyncClient(timeout=10) as client_http:
-        resp = await client_http.get(NOAA_PREDICTIONS_URL, params=params)
-
-    if resp.status_code != 200:
-        raise HTTPException(status_code=502, detail="Failed to fetch predictions from NOAA")
-
-    data = resp.json()
+    data = await noaa.get_json("predictions", NOAA_PREDICTIONS_URL, params)
     preds_raw = data.get("predictions")
     if preds_raw is None:
-        raise HTTPException(status_code=502, detail="Unexpected response from NOAA")
-
-    preds: List[TidePredictionPoint] = []
-    for item in preds_raw:
-        t_str = item.get("t")
-        v_str = item.get("v")
-        typ = item.get("type")
-        if not t_str or v_str is None:
-            continue
-        try:
-            t_dt = datetime.strptime(t_str, "%Y-%m-%d %H:%M")
-            height = float(v_str)
-        except Exception:
-            continue
+        raise NoaaUnexpectedResponse("predictions missing from NOAA response")
+    return preds_raw
+
 
-        preds.append(TidePredictionPoint(time=t_dt, height_ft=height, type=typ))
+tide_cache = TidePredictionCache(
+    db.tide_predictions,
+    fetch_prediction_range,
+    max_entries=int(os.environ.get("TIDE_CACHE_MAX_ENTRIES", "4096")),
+    empty_ttl_s=float(os.environ.get("TIDE_CACHE_EMPTY_TTL_S", "3600")),
+)
+
+
+# Offline predictions from locally stored harmonic constituents, filled by
+# import_tide_constituents.py. Stations missing from the file need NOAA.
+harmonic_models = load_constituent_file(
+    Path(os.environ.get("TIDE_CONSTITUENTS_FILE", ROOT_DIR / "tide_constituents.json"))
+)
+
+
+async def load_predictions(station_id: str, d: date, source: str = "auto") -> TidePredictionResponse:
+    """Hi/lo predictions for one day.
 
+    ``source`` "noaa" uses the NOAA-backed cache only, "harmonic" the local
+    engine only, and "auto" NOAA with the local engine as fallback when
+    NOAA cannot be reached.
+    """
+    model = harmonic_models.get(station_id)
+    if source == "harmonic":
+        if model is None:
+            raise HTTPException(status_code=404, detail="No harmonic constituents for station")
+        points = predictions_for_day(model, d)
+    else:
+        try:
+            points = await tide_cache.get(station_id, d)
+        except NoaaUnexpectedResponse:
+            raise HTTPException(status_code=502, detail="Unexpected response from NOAA")
+        except NoaaError:
+            if source == "noaa" or model is None:
+                raise HTTPException(status_code=502, detail="Failed to fetch predictions from NOAA")
+            logger.warning("NOAA unavailable, using harmonic predictions for station %s", station_id)
+            points = predictions_for_day(model, d)
+
+    preds = [TidePredictionPoint(**point) for point in points]
     return TidePredictionResponse(station_id=station_id, date=d, predictions=preds)
 
 
+@api_router.get("/tides/stations/{station_id}/predictions", response_model=TidePredictionResponse)
+async def get_station_predictions(
+    station_id: str,
+    target_date: Optional[date] = None,
+    source: str = Query("auto", pattern="^(auto|noaa|harmonic)$"),
+):
+    return await load_predictions(station_id, target_date or date.today(), source)
+
+
+class TideCurvePoint(BaseModel):
+    time: datetime
+    height_ft: float
+
+
+class TideCurveResponse(BaseModel):
+    station_id: str
+    date: date
+    interval_min: int
+    points: List[TideCurvePoint]
+
+
+@api_router.get(
+    "/tides/stations/{station_id}/predictions/curve", response_model=TideCurveResponse
+)
+async def get_station_prediction_curve(
+    station_id: str,
+    target_date: Optional[date] = None,
+    interval_min: int = Query(6, ge=1, le=60),
+    source: str = Query("auto", pattern="^(auto|noaa|harmonic)$"),
+):
+    """A water-level curve for one day at ``interval_min`` resolution.
+
+    Built by cosine interpolation between the hi/lo events of the day and
+    its neighbours (so the ends of the day are bracketed), all of which
+    come from the prediction cache; no 6-minute series is requested.
+    """
+    d = target_date or date.today()
+    days = await asyncio.gather(
+        *(load_predictions(station_id, d + timedelta(days=offset), source) for offset in (-1, 0, 1))
+    )
+    events = [p for day in days for p in day.predictions]
+    event_times = np.array([to_epoch_seconds(p.time) for p in events], dtype=np.float64)
+    event_heights = np.array([p.height_ft for p in events], dtype=np.float64)
+
+    points = []
+    if events:
+        start_s = to_epoch_seconds(datetime(d.year, d.month, d.day))
+        offsets_s = np.arange(0, 86400, interval_min * 60)
+        heights = cosine_curve(event_times, event_heights, start_s + offsets_s)
+        # ISO strings straight from NumPy, matching the datetime encoding.
+        times = (np.datetime64(d.isoformat(), "s") + offsets_s.astype("timedelta64[s]")).astype(str)
+        points = [
+            {"time": t, "height_ft": h} for t, h in zip(times.tolist(), np.round(heights, 3).tolist())
+        ]
+    return FastJSONResponse(
+        {"station_id": station_id, "date": d.isoformat(), "interval_min": interval_min, "points": points}
+    )
+
+
+class BulkTidePredictionRequest(BaseModel):
+    station_ids: List[str]
+    start_date: date
+    end_date: Optional[date] = None
+
+
+class StationTidePredictions(BaseModel):
+    station_id: str
+    days: List[TidePredictionResponse] = []
+    error: Optional[str] = None
+
+
+class BulkTidePredictionResponse(BaseModel):
+    results: List[StationTidePredictions]
+
+
+BULK_TIDE_MAX_STATIONS = 50
+BULK_TIDE_MAX_DAYS = 31
+BULK_TIDE_CONCURRENCY = int(os.environ.get("TIDE_BULK_CONCURRENCY", "8"))
+
+
+@api_router.post("/tides/predictions/bulk", response_model=BulkTidePredictionResponse)
+async def bulk_station_predictions(payload: BulkTidePredictionRequest):
+    """Predictions for several stations over a date range in one response.
+
+    Stations are loaded concurrently (at most TIDE_BULK_CONCURRENCY at a
+    time) through the prediction cache, whose week-sized loads cover most
+    of a range in one NOAA call. A station that fails reports its error
+    without failing the others.
+    """
+    station_ids = list(dict.fromkeys(payload.station_ids))
+    if not station_ids:
+        raise HTTPException(status_code=400, detail="At least one station id is required")
+    if len(station_ids) > BULK_TIDE_MAX_STATIONS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {BULK_TIDE_MAX_STATIONS} stations per request"
+        )
+    end_date = payload.end_date or payload.start_date
+    day_count = (end_date - payload.start_date).days + 1
+    if day_count < 1:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if day_count > BULK_TIDE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_TIDE_MAX_DAYS} days per request")
+    days = [payload.start_date + timedelta(days=i) for i in range(day_count)]
+
+    limit = asyncio.Semaphore(BULK_TIDE_CONCURRENCY)
+
+    async def load_station(station_id: str) -> StationTidePredictions:
+        async with limit:
+            try:
+                return StationTidePredictions(
+                    station_id=station_id,
+                    days=[await load_predictions(station_id, d) for d in days],
+                )
+            except HTTPException as exc:
+                return StationTidePredictions(station_id=station_id, error=exc.detail)
+            except Exception as exc:
+                # Anything unforeseen (malformed NOAA data, a client error that
+                # got through) stays with its station.
+                logger.exception("Bulk tide predictions failed for station %s", station_id)
+                return StationTidePredictions(
+                    station_id=station_id, error=f"Failed to load predictions: {type(exc).__name__}"
+                )
+
+    results = await asyncio.gather(*(load_station(station_id) for station_id in station_ids))
+    return BulkTidePredictionResponse(results=results)
+
+
+@api_router.get("/tides/upstream-latency")
+async def noaa_upstream_latency():
+    """Per-operation latency of recent NOAA calls made by this process."""
+    return noaa.latency_summary()
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -646,6 +2104,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Configure logging
@@ -656,6 +2115,26 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    await ensure_indexes(db)
+    await check_query_plans(db)
+
+
+@app.on_event("startup")
+async def start_ingest_buffer():
+    if INGEST_BUFFER_ENABLED:
+        ingest_buffer.start()
+
+
+@app.on_event("startup")
+async def open_noaa_client():
+    noaa.start()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await ingest_buffer.stop()
+    await station_catalog.stop()
+    await noaa.aclose()
     client.close()
@@ -0,0 +1,94 @@
+"""In-memory k-nearest-neighbour index over lat/lon points.
+
+Points are mapped to unit vectors on the sphere, where straight-line
+(chord) distance increases monotonically with great-circle distance, so an
+ordinary Euclidean KD-tree gives exact nearest neighbours with no
+antimeridian or polar special cases.
+"""
+import heapq
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+LEAF_SIZE = 16
+
+
+def unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi = math.radians(lat)
+    lam = math.radians(lon)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+class SphereKDTree:
+    """Static KD-tree over unit vectors, built once per data snapshot.
+
+    Nodes are ``(start, end, dim, split, left, right)`` over a permutation
+    of the points; leaves have ``dim == -1`` and are scanned directly.
+    """
+
+    def __init__(self, lats, lons):
+        lats = np.radians(np.asarray(lats, dtype=np.float64))
+        lons = np.radians(np.asarray(lons, dtype=np.float64))
+        xyz = np.column_stack(
+            (np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats))
+        )
+        self._order = np.arange(len(xyz))
+        self._nodes: List[tuple] = []
+        if len(xyz):
+            self._build(xyz, 0, len(xyz))
+        # Python tuples scan faster than tiny NumPy slices at query time.
+        self._points = [tuple(p) for p in xyz[self._order].tolist()]
+        self._ids = self._order.tolist()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _build(self, xyz: np.ndarray, start: int, end: int) -> int:
+        node = len(self._nodes)
+        self._nodes.append(None)
+        if end - start <= LEAF_SIZE:
+            self._nodes[node] = (start, end, -1, 0.0, -1, -1)
+            return node
+        members = self._order[start:end]
+        pts = xyz[members]
+        dim = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+        sort = np.argsort(pts[:, dim], kind="stable")
+        self._order[start:end] = members[sort]
+        mid = (start + end) // 2
+        split = float(xyz[self._order[mid], dim])
+        left = self._build(xyz, start, mid)
+        right = self._build(xyz, mid, end)
+        self._nodes[node] = (start, end, dim, split, left, right)
+        return node
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[int]:
+        """Indices of the ``k`` points closest to (lat, lon), nearest first."""
+        if not self._nodes or k <= 0:
+            return []
+        q = unit_vector(lat, lon)
+        qx, qy, qz = q
+        best: List[Tuple[float, int]] = []  # max-heap of (-chord², position)
+        stack = [(0, 0.0)]  # (node, squared distance to its region's nearest plane)
+        nodes, points = self._nodes, self._points
+        while stack:
+            node, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            start, end, dim, split, left, right = nodes[node]
+            if dim < 0:
+                for pos in range(start, end):
+                    px, py, pz = points[pos]
+                    d2 = (px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, pos))
+                    elif d2 < -best[0][0]:
+                        heapq.heapreplace(best, (-d2, pos))
+                continue
+            diff = q[dim] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            # The far side is skipped once the splitting plane is farther than
+            # the current k-th best; push it first so the near side pops first.
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+        return [self._ids[pos] for _, pos in sorted(best, reverse=True)]
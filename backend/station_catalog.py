@@ -0,0 +1,199 @@
+"""Locally cached and indexed NOAA tide-station catalog.
+
+The catalog (a few thousand stations) changes rarely, so it is fetched from
+NOAA once, kept in Mongo so restarts do not need NOAA, and held in memory as
+a ``StationIndex``. Once the copy is older than the TTL it is still served
+while a single background task refetches it (stale-while-revalidate); a
+failed refresh keeps serving the old copy.
+"""
+import asyncio
+import bisect
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from geo import haversine_nm
+from spatial_index import SphereKDTree
+
+logger = logging.getLogger(__name__)
+
+CATALOG_DOC_ID = "noaa_tide_stations"
+REFRESH_RETRY_S = 300.0
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def name_tokens(text: str) -> List[str]:
+    """Lowercased alphanumeric words, e.g. "St. Mary's" -> ["st", "mary", "s"]."""
+    return _TOKEN.findall(text.lower())
+
+
+def station_row(raw: dict) -> dict:
+    """A NOAA metadata record in ``TideStation`` field order."""
+    lat, lon = raw.get("lat"), raw.get("lng")
+    return {
+        "id": str(raw.get("id")),
+        "name": raw.get("name") or "",
+        "state": raw.get("state") or None,
+        "lat": float(lat) if lat is not None else None,
+        "lon": float(lon) if lon is not None else None,
+    }
+
+
+class CatalogUnavailable(Exception):
+    """No copy of the catalog is available and NOAA could not be reached."""
+
+
+class StationIndex:
+    """Immutable lookup structures over one snapshot of the catalog.
+
+    ``by_state`` maps a lowercased state to station positions. Name search
+    uses a sorted vocabulary of name tokens: each query token selects the
+    vocabulary range it is a prefix of (two bisects), and the stations
+    holding every query token are returned in catalog order. When that
+    finds nothing (text inside a word, as "port" in "Newport", or a query
+    with no words at all) the names are scanned for the query as a plain
+    substring, which is how search worked before the index. Stations with
+    coordinates also go into a ``SphereKDTree`` for nearest-station queries.
+    """
+
+    def __init__(self, stations: List[dict], fetched_at: datetime):
+        self.stations = stations
+        self.fetched_at = fetched_at
+        self.names = [station["name"].lower() for station in stations]
+        self.by_state: Dict[str, List[int]] = {}
+        postings: Dict[str, set] = {}
+        for i, station in enumerate(stations):
+            if station["state"]:
+                self.by_state.setdefault(station["state"].lower(), []).append(i)
+            for token in name_tokens(station["name"]):
+                postings.setdefault(token, set()).add(i)
+        self.vocabulary = sorted(postings)
+        self.postings = [postings[token] for token in self.vocabulary]
+        self.located = [s for s in stations if s["lat"] is not None and s["lon"] is not None]
+        self.spatial = SphereKDTree([s["lat"] for s in self.located], [s["lon"] for s in self.located])
+
+    def _prefix_matches(self, prefix: str) -> set:
+        lo = bisect.bisect_left(self.vocabulary, prefix)
+        hi = bisect.bisect_left(self.vocabulary, prefix + "\uffff")
+        if hi - lo == 1:
+            return self.postings[lo]
+        return set().union(*self.postings[lo:hi])
+
+    def _word_matches(self, search: str, candidates: Optional[set]) -> List[int]:
+        tokens = name_tokens(search)
+        if not tokens:
+            return []
+        for token in tokens:
+            matches = self._prefix_matches(token)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+        return sorted(candidates)
+
+    def search(self, search: Optional[str] = None, state: Optional[str] = None) -> List[dict]:
+        candidates = None
+        if state:
+            candidates = set(self.by_state.get(state.lower(), ()))
+        if not search:
+            if candidates is None:
+                return list(self.stations)
+            return [self.stations[i] for i in sorted(candidates)]
+        positions = self._word_matches(search, candidates)
+        if not positions:
+            needle = search.lower()
+            pool = range(len(self.stations)) if candidates is None else sorted(candidates)
+            positions = [i for i in pool if needle in self.names[i]]
+        return [self.stations[i] for i in positions]
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[Tuple[dict, float]]:
+        """The ``k`` closest stations with their distance in nautical miles."""
+        ranked = []
+        for i in self.spatial.nearest(lat, lon, k):
+            station = self.located[i]
+            ranked.append((station, haversine_nm(lat, lon, station["lat"], station["lon"])))
+        ranked.sort(key=lambda item: item[1])
+        return ranked
+
+
+class StationCatalog:
+    def __init__(
+        self,
+        collection,
+        fetch: Callable[[], Awaitable[List[dict]]],
+        ttl_s: float = 86400.0,
+    ):
+        self.collection = collection
+        self.fetch = fetch
+        self.ttl_s = ttl_s
+        self._index: Optional[StationIndex] = None
+        self._loaded_at = 0.0
+        self._load_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def index(self) -> StationIndex:
+        """The current index, loading it on first use.
+
+        Raises ``CatalogUnavailable`` only when there is no copy at all.
+        """
+        if self._index is None:
+            async with self._load_lock:
+                if self._index is None:
+                    await self._load()
+        if time.monotonic() - self._loaded_at > self.ttl_s:
+            self.refresh_in_background()
+        return self._index
+
+    async def _load(self) -> None:
+        doc = await self.collection.find_one({"_id": CATALOG_DOC_ID})
+        if doc is not None:
+            self._install(StationIndex(doc["stations"], doc["fetched_at"]))
+            # Age the in-memory copy by how old the stored one already is.
+            age_s = (datetime.utcnow() - doc["fetched_at"]).total_seconds()
+            self._loaded_at -= max(age_s, 0.0)
+            return
+        try:
+            await self.refresh()
+        except Exception as exc:
+            raise CatalogUnavailable(str(exc)) from exc
+
+    def _install(self, index: StationIndex) -> None:
+        self._index = index
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self) -> StationIndex:
+        """Refetch the catalog from NOAA, persist it and swap it in."""
+        stations = [station_row(raw) for raw in await self.fetch()]
+        index = StationIndex(stations, datetime.utcnow())
+        await self.collection.replace_one(
+            {"_id": CATALOG_DOC_ID},
+            {"stations": stations, "fetched_at": index.fetched_at},
+            upsert=True,
+        )
+        self._install(index)
+        logger.info("Tide station catalog refreshed: %d stations", len(stations))
+        return index
+
+    def refresh_in_background(self) -> None:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_quietly())
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            # Keep serving the copy we have and retry in a few minutes.
+            logger.exception("Tide station catalog refresh failed")
+            self._loaded_at = time.monotonic() - self.ttl_s + min(self.ttl_s, REFRESH_RETRY_S)
+
+    async def stop(self) -> None:
+        task, self._refresh_task = self._refresh_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,137 @@
+"""Two-tier cache of NOAA high/low tide predictions per (station, day).
+
+Predictions for a station and date never change, so entries never expire,
+except for days that came back empty: NOAA may not have published them yet
+or the response may have been a transient blank, so those are kept for
+only ``empty_ttl_s`` (an ``expires_at`` date that the TTL index on
+``tide_predictions`` also acts on). Lookups go to an in-process LRU first,
+then to the ``tide_predictions`` collection, and only then to NOAA. Misses
+are resolved a whole week (Monday to Sunday) at a time: one ranged NOAA
+request fills seven per-day entries, and concurrent misses anywhere in the
+same station-week share that single load.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+
+PREFETCH_DAYS = 7
+EMPTY_DAY_TTL_S = 3600.0
+
+
+def parse_predictions(raw: List[dict]) -> List[dict]:
+    """NOAA ``predictions`` items as ``TidePredictionPoint`` dicts.
+
+    Items with a missing or unparseable time or height are skipped.
+    """
+    points = []
+    for item in raw:
+        t_str = item.get("t")
+        v_str = item.get("v")
+        if not t_str or v_str is None:
+            continue
+        try:
+            t_dt = datetime.strptime(t_str, "%Y-%m-%d %H:%M")
+            height = float(v_str)
+        except Exception:
+            continue
+        points.append({"time": t_dt, "height_ft": height, "type": item.get("type")})
+    return points
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def cache_id(station_id: str, day: date) -> str:
+    return f"{station_id}:{day.isoformat()}"
+
+
+class TidePredictionCache:
+    def __init__(
+        self,
+        collection,
+        fetch_range: Callable[[str, date, date], Awaitable[List[dict]]],
+        max_entries: int = 4096,
+        empty_ttl_s: float = EMPTY_DAY_TTL_S,
+    ):
+        """``fetch_range(station_id, first_day, last_day)`` returns the raw
+        NOAA prediction items for that inclusive range."""
+        self.collection = collection
+        self.fetch_range = fetch_range
+        self.max_entries = max_entries
+        self.empty_ttl_s = empty_ttl_s
+        # (points, monotonic expiry or None for never)
+        self._memory: "OrderedDict[Tuple[str, date], Tuple[List[dict], Optional[float]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, date], asyncio.Future] = {}
+
+    async def get(self, station_id: str, day: date) -> List[dict]:
+        key = (station_id, day)
+        entry = self._memory.get(key)
+        if entry is not None:
+            points, expires = entry
+            if expires is None or expires > time.monotonic():
+                self._memory.move_to_end(key)
+                return points
+            del self._memory[key]
+
+        week = (station_id, week_start(day))
+        load = self._inflight.get(week)
+        if load is None:
+            load = asyncio.ensure_future(self._load_week(*week))
+            self._inflight[week] = load
+            load.add_done_callback(lambda _: self._inflight.pop(week, None))
+        # Shielded so one caller going away does not cancel the shared load.
+        days = await asyncio.shield(load)
+        return days[day]
+
+    async def _load_week(self, station_id: str, first_day: date) -> Dict[date, List[dict]]:
+        days = [first_day + timedelta(days=i) for i in range(PREFETCH_DAYS)]
+        now = datetime.utcnow()
+        stored = {
+            doc["_id"]: doc["predictions"]
+            async for doc in self.collection.find({"_id": {"$in": [cache_id(station_id, d) for d in days]}})
+            # The TTL monitor only runs once a minute.
+            if doc.get("expires_at") is None or doc["expires_at"] > now
+        }
+        if len(stored) == len(days):
+            by_day = {d: stored[cache_id(station_id, d)] for d in days}
+        else:
+            by_day = {d: [] for d in days}
+            for point in parse_predictions(await self.fetch_range(station_id, days[0], days[-1])):
+                by_day.setdefault(point["time"].date(), []).append(point)
+            by_day = {d: by_day[d] for d in days}
+            await self.collection.bulk_write(
+                [
+                    ReplaceOne(
+                        {"_id": cache_id(station_id, d)},
+                        self._stored_doc(station_id, d, points, now),
+                        upsert=True,
+                    )
+                    for d, points in by_day.items()
+                ],
+                ordered=False,
+            )
+        for d, points in by_day.items():
+            self._remember((station_id, d), points)
+        return by_day
+
+    def _stored_doc(self, station_id: str, day: date, points: List[dict], now: datetime) -> dict:
+        doc = {
+            "station_id": station_id,
+            "date": datetime.combine(day, datetime.min.time()),
+            "predictions": points,
+        }
+        if not points:
+            doc["expires_at"] = now + timedelta(seconds=self.empty_ttl_s)
+        return doc
+
+    def _remember(self, key: Tuple[str, date], points: List[dict]) -> None:
+        expires = None if points else time.monotonic() + self.empty_ttl_s
+        self._memory[key] = (points, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,33 @@
+"""Continuous water-level curves from high/low tide events.
+
+Between consecutive extremes (t0, h0) and (t1, h1) the tide is modelled as
+half a cosine wave,
+
+    h(t) = h0 + (h1 - h0) * (1 - cos(pi * (t - t0) / (t1 - t0))) / 2
+
+which has zero slope at both extremes, the usual "rule of twelfths" shape.
+Evaluation is one ``searchsorted`` plus a few array operations for the
+whole curve, so any resolution can be built from the cached hi/lo data
+without asking NOAA for 6-minute series.
+"""
+import numpy as np
+
+
+def cosine_curve(event_times: np.ndarray, event_heights: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Heights at ``times`` (same units as ``event_times``).
+
+    ``event_times`` must be increasing. Times outside the events hold the
+    nearest event's height.
+    """
+    event_times = np.asarray(event_times, dtype=np.float64)
+    event_heights = np.asarray(event_heights, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    if len(event_times) == 0:
+        return np.full(len(times), np.nan)
+    if len(event_times) == 1:
+        return np.full(len(times), event_heights[0])
+    seg = np.clip(np.searchsorted(event_times, times, side="right") - 1, 0, len(event_times) - 2)
+    t0, t1 = event_times[seg], event_times[seg + 1]
+    h0, h1 = event_heights[seg], event_heights[seg + 1]
+    phase = np.clip((times - t0) / (t1 - t0), 0.0, 1.0)
+    return h0 + (h1 - h0) * (1.0 - np.cos(np.pi * phase)) / 2.0
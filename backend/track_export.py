@@ -0,0 +1,220 @@
+"""Streaming export of recorded fixes as GPX, GeoJSON or CSV.
+
+Exports are produced chunk by chunk from ``point_store.iter_chunks``, so
+memory stays flat however long the track is. The output is a pure function
+of the stored fixes (gzip is written with a zero mtime), which is what lets
+a dropped download resume with a byte ``Range``: the export is regenerated
+and the bytes the client already has are skipped. The total length a range
+response needs is recorded when an export has been generated in full, so a
+resume normally costs one pass rather than two.
+"""
+import json
+import re
+import zlib
+from typing import AsyncIterator, Awaitable, Callable, NamedTuple, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from trip_stats import TrackArrays
+
+KNOTS_TO_MS = 1852.0 / 3600.0
+
+
+class ExportFormat(NamedTuple):
+    media_type: str
+    extension: str
+
+
+FORMATS = {
+    "gpx": ExportFormat("application/gpx+xml", "gpx"),
+    "geojson": ExportFormat("application/geo+json", "geojson"),
+    "csv": ExportFormat("text/csv", "csv"),
+}
+
+
+def iso_times(t: np.ndarray) -> list:
+    """Epoch seconds as ISO 8601 UTC strings with millisecond precision."""
+    ms = np.round(t * 1000.0).astype("datetime64[ms]")
+    return [s + "Z" for s in ms.astype(str).tolist()]
+
+
+def optional_values(values: np.ndarray) -> list:
+    return [None if v != v else v for v in values.tolist()]
+
+
+def json_number(value: Optional[float]) -> str:
+    return "null" if value is None else repr(value)
+
+
+def gpx_header(name: Optional[str]) -> str:
+    name_tag = f"<name>{escape(name)}</name>" if name else ""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx version="1.1" creator="NaviGator" xmlns="http://www.topografix.com/GPX/1/1">\n'
+        f"<trk>{name_tag}<trkseg>\n"
+    )
+
+
+GPX_FOOTER = "</trkseg></trk>\n</gpx>\n"
+
+
+def gpx_points(arrays: TrackArrays) -> str:
+    # Speed in m/s as most GPX readers expect; course in degrees.
+    rows = []
+    speeds = optional_values(arrays.speed * KNOTS_TO_MS)
+    courses = optional_values(arrays.course)
+    for time, lat, lon, speed, course in zip(
+        iso_times(arrays.t), arrays.lat.tolist(), arrays.lon.tolist(), speeds, courses
+    ):
+        extensions = ""
+        if speed is not None or course is not None:
+            extensions = (
+                "<extensions>"
+                + (f"<speed>{speed!r}</speed>" if speed is not None else "")
+                + (f"<course>{course!r}</course>" if course is not None else "")
+                + "</extensions>"
+            )
+        rows.append(f'<trkpt lat="{lat!r}" lon="{lon!r}"><time>{time}</time>{extensions}</trkpt>\n')
+    return "".join(rows)
+
+
+def geojson_header(name: Optional[str], track_id: str) -> str:
+    return '{"type":"FeatureCollection","name":%s,"track_id":"%s","features":[\n' % (
+        json.dumps(name, ensure_ascii=False),
+        track_id,
+    )
+
+
+GEOJSON_FOOTER = "\n]}\n"
+
+
+def geojson_points(arrays: TrackArrays, first: bool) -> str:
+    features = []
+    for time, lat, lon, speed, course in zip(
+        iso_times(arrays.t),
+        arrays.lat.tolist(),
+        arrays.lon.tolist(),
+        optional_values(arrays.speed),
+        optional_values(arrays.course),
+    ):
+        features.append(
+            '{"type":"Feature","geometry":{"type":"Point","coordinates":[%r,%r]},'
+            '"properties":{"time":"%s","speed_kn":%s,"course_deg":%s}}'
+            % (lon, lat, time, json_number(speed), json_number(course))
+        )
+    body = ",\n".join(features)
+    return body if first else ",\n" + body
+
+
+CSV_HEADER = "timestamp,lat,lon,speed_kn,course_deg\n"
+
+
+def csv_points(arrays: TrackArrays) -> str:
+    return "".join(
+        f"{time},{lat!r},{lon!r},{'' if speed is None else repr(speed)},{'' if course is None else repr(course)}\n"
+        for time, lat, lon, speed, course in zip(
+            iso_times(arrays.t),
+            arrays.lat.tolist(),
+            arrays.lon.tolist(),
+            optional_values(arrays.speed),
+            optional_values(arrays.course),
+        )
+    )
+
+
+async def export_chunks(
+    chunks: AsyncIterator[TrackArrays], fmt: str, track_id: str, name: Optional[str]
+) -> AsyncIterator[bytes]:
+    """The encoded export, one piece per chunk of fixes."""
+    if fmt == "gpx":
+        yield gpx_header(name).encode()
+        async for arrays in chunks:
+            if len(arrays):
+                yield gpx_points(arrays).encode()
+        yield GPX_FOOTER.encode()
+    elif fmt == "geojson":
+        yield geojson_header(name, track_id).encode()
+        first = True
+        async for arrays in chunks:
+            if len(arrays):
+                yield geojson_points(arrays, first).encode()
+                first = False
+        yield GEOJSON_FOOTER.encode()
+    elif fmt == "csv":
+        yield CSV_HEADER.encode()
+        async for arrays in chunks:
+            if len(arrays):
+                yield csv_points(arrays).encode()
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    # wbits=31 writes a gzip header with mtime 0, so output is reproducible.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+async def byte_count(chunks: AsyncIterator[bytes]) -> int:
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+    return total
+
+
+async def counting_chunks(
+    chunks: AsyncIterator[bytes], on_complete: Callable[[int], Awaitable[None]]
+) -> AsyncIterator[bytes]:
+    """Pass ``chunks`` through and report the total length once all were sent."""
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        yield chunk
+    await on_complete(total)
+
+
+async def byte_slice(chunks: AsyncIterator[bytes], start: int, end: int) -> AsyncIterator[bytes]:
+    """Bytes ``start`` to ``end`` inclusive of the stream."""
+    pos = 0
+    async for chunk in chunks:
+        chunk_end = pos + len(chunk)
+        if chunk_end > start and pos <= end:
+            yield chunk[max(start - pos, 0) : end - pos + 1]
+        pos = chunk_end
+        if pos > end:
+            break
+
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, total: int) -> Optional[Tuple[int, int]]:
+    """(first, last) byte positions for a single-range ``Range`` header.
+
+    Returns None for headers that are ignored (malformed or multi-range;
+    the full export is sent instead) and raises ``RangeNotSatisfiable`` for
+    ranges past the end.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(total - length, 0), total - 1
+    first = int(first)
+    last = total - 1 if last == "" else min(int(last), total - 1)
+    if first >= total or first > last:
+        raise RangeNotSatisfiable()
+    return first, last
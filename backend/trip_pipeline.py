@@ -0,0 +1,149 @@
+"""Trip statistics computed inside MongoDB.
+
+The pipeline pairs every point with its predecessor via ``$setWindowFields``
+and ``$shift`` (MongoDB 5.2+ for ``$bottom``), evaluates the same haversine
+formula as ``geo.haversine_nm`` per segment, and reduces everything to a
+single summary document. Only that summary crosses the wire; it is turned
+back into a ``TripAccumulator`` so both backends share one finalization path.
+"""
+from typing import Mapping, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from geo import EARTH_RADIUS_KM, KM_PER_NM
+from trip_stats import MOVING_SPEED_KN, SPEED_BIN_KN, TripAccumulator, to_epoch_seconds
+
+
+def _rad(expr):
+    return {"$degreesToRadians": expr}
+
+
+def _sin_half_sq(expr):
+    return {"$pow": [{"$sin": {"$divide": [expr, 2]}}, 2]}
+
+
+def _haversine_nm_expr(lat1, lon1, lat2, lon2) -> dict:
+    """Aggregation expression mirroring geo.haversine_nm term for term."""
+    a = {
+        "$add": [
+            _sin_half_sq(_rad({"$subtract": [lat2, lat1]})),
+            {
+                "$multiply": [
+                    {"$cos": _rad(lat1)},
+                    {"$cos": _rad(lat2)},
+                    _sin_half_sq(_rad({"$subtract": [lon2, lon1]})),
+                ]
+            },
+        ]
+    }
+    c = {
+        "$let": {
+            "vars": {"a": a},
+            "in": {
+                "$multiply": [
+                    2,
+                    {"$atan2": [{"$sqrt": "$$a"}, {"$sqrt": {"$subtract": [1, "$$a"]}}]},
+                ]
+            },
+        }
+    }
+    return {"$divide": [{"$multiply": [EARTH_RADIUS_KM, c]}, KM_PER_NM]}
+
+
+def trip_stats_pipeline(track_id: ObjectId) -> list:
+    segment = {
+        "seg_nm": {
+            "$cond": [
+                {"$eq": ["$prev_lat", None]},
+                0.0,
+                _haversine_nm_expr("$prev_lat", "$prev_lon", "$lat", "$lon"),
+            ]
+        },
+        "dt_s": {
+            "$cond": [
+                {"$eq": ["$prev_t", None]},
+                0.0,
+                {"$divide": [{"$subtract": ["$timestamp", "$prev_t"]}, 1000]},
+            ]
+        },
+    }
+    moving = {
+        "$and": [
+            {"$gt": ["$dt_s", 0]},
+            {"$gte": [{"$divide": [{"$multiply": ["$seg_nm", 3600]}, "$dt_s"]}, MOVING_SPEED_KN]},
+        ]
+    }
+    speed_bin = {
+        "$toLong": {"$round": [{"$divide": [{"$max": ["$speed_kn", 0]}, SPEED_BIN_KN]}, 0]}
+    }
+    return [
+        {"$match": {"track_id": track_id}},
+        {
+            "$setWindowFields": {
+                "sortBy": {"timestamp": 1},
+                "output": {
+                    "prev_lat": {"$shift": {"output": "$lat", "by": -1}},
+                    "prev_lon": {"$shift": {"output": "$lon", "by": -1}},
+                    "prev_t": {"$shift": {"output": "$timestamp", "by": -1}},
+                },
+            }
+        },
+        {"$set": segment},
+        {
+            "$facet": {
+                "totals": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "point_count": {"$sum": 1},
+                            "distance_nm": {"$sum": "$seg_nm"},
+                            "moving_time_s": {"$sum": {"$cond": [moving, "$dt_s", 0]}},
+                            "max_speed_kn": {"$max": "$speed_kn"},
+                            "first_time": {"$min": "$timestamp"},
+                            "last": {
+                                "$bottom": {
+                                    "sortBy": {"timestamp": 1},
+                                    "output": ["$timestamp", "$lat", "$lon"],
+                                }
+                            },
+                            "min_lat": {"$min": "$lat"},
+                            "max_lat": {"$max": "$lat"},
+                            "min_lon": {"$min": "$lon"},
+                            "max_lon": {"$max": "$lon"},
+                        }
+                    }
+                ],
+                "speed_hist": [
+                    {"$match": {"speed_kn": {"$ne": None}}},
+                    {"$group": {"_id": speed_bin, "count": {"$sum": 1}}},
+                ],
+            }
+        },
+    ]
+
+
+def accumulator_from_summary(summary: Optional[Mapping]) -> TripAccumulator:
+    acc = TripAccumulator()
+    if not summary or not summary.get("totals"):
+        return acc
+    totals = summary["totals"][0]
+    last_time, last_lat, last_lon = totals["last"]
+    acc.point_count = int(totals["point_count"])
+    acc.distance_nm = float(totals["distance_nm"])
+    acc.moving_time_s = float(totals["moving_time_s"])
+    acc.max_speed_kn = float(totals.get("max_speed_kn") or 0.0)
+    acc.first_t = to_epoch_seconds(totals["first_time"])
+    acc.last_t = to_epoch_seconds(last_time)
+    acc.last_lat = float(last_lat)
+    acc.last_lon = float(last_lon)
+    for name in ("min_lat", "max_lat", "min_lon", "max_lon"):
+        setattr(acc, name, float(totals[name]))
+
+    bins = summary.get("speed_hist") or []
+    if bins:
+        hist = np.zeros(max(int(b["_id"]) for b in bins) + 1, dtype=np.int64)
+        for b in bins:
+            hist[int(b["_id"])] = b["count"]
+        acc.speed_hist = hist
+    return acc
@@ -0,0 +1,253 @@
+"""Vectorized trip statistics over recorded track points.
+
+Points are loaded into contiguous float64 arrays once, and every statistic
+is then computed as a batched NumPy operation instead of a per-pair Python
+loop.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Mapping, Optional
+
+import numpy as np
+
+from geo import leg_distances_nm
+
+
+# Segments slower than this (derived from distance / elapsed time) count as
+# drifting or at anchor and are excluded from moving time.
+MOVING_SPEED_KN = 0.5
+SPEED_PERCENTILES = (50, 90, 95)
+# Speeds are bucketed to this resolution for percentiles, which lets running
+# totals keep a compact histogram instead of every reported speed.
+SPEED_BIN_KN = 0.1
+
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = _EPOCH.replace(tzinfo=timezone.utc)
+
+
+def to_epoch_seconds(ts: datetime) -> float:
+    """Mongo hands back naive UTC datetimes; treat them as UTC."""
+    return (ts - (_EPOCH if ts.tzinfo is None else _EPOCH_UTC)).total_seconds()
+
+
+def from_epoch_seconds(seconds: float) -> datetime:
+    """Inverse of to_epoch_seconds, as a naive UTC datetime like Mongo returns."""
+    return _EPOCH + timedelta(seconds=seconds)
+
+
+@dataclass
+class TrackArrays:
+    """Column-oriented view of a run of track points, ordered by time."""
+
+    t: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    speed: np.ndarray  # NaN where the fix carried no speed
+    course: np.ndarray  # NaN where the fix carried no course
+
+    def __len__(self) -> int:
+        return int(self.t.size)
+
+    def select(self, index) -> "TrackArrays":
+        """Rows picked by a slice, mask or index array."""
+        return TrackArrays(
+            t=self.t[index],
+            lat=self.lat[index],
+            lon=self.lon[index],
+            speed=self.speed[index],
+            course=self.course[index],
+        )
+
+    @classmethod
+    def concat(cls, parts: Iterable["TrackArrays"]) -> "TrackArrays":
+        parts = list(parts)
+        if not parts:
+            return points_to_arrays([])
+        return cls(
+            t=np.concatenate([p.t for p in parts]),
+            lat=np.concatenate([p.lat for p in parts]),
+            lon=np.concatenate([p.lon for p in parts]),
+            speed=np.concatenate([p.speed for p in parts]),
+            course=np.concatenate([p.course for p in parts]),
+        )
+
+
+def optional_floats(values) -> np.ndarray:
+    # None becomes NaN on float conversion.
+    return np.array(values, dtype=np.float64)
+
+
+def points_to_arrays(points: Iterable[Mapping]) -> TrackArrays:
+    """Pack point documents into float64 arrays."""
+    points = list(points)
+    t = np.array([to_epoch_seconds(p["timestamp"]) for p in points], dtype=np.float64)
+    lat = np.array([p["lat"] for p in points], dtype=np.float64)
+    lon = np.array([p["lon"] for p in points], dtype=np.float64)
+    speed = optional_floats([p.get("speed_kn") for p in points])
+    course = optional_floats([p.get("course_deg") for p in points])
+    return TrackArrays(t=t, lat=lat, lon=lon, speed=speed, course=course)
+
+
+@dataclass
+class TripStats:
+    point_count: int = 0
+    distance_nm: float = 0.0
+    max_speed_kn: float = 0.0
+    moving_time_s: float = 0.0
+    speed_p50_kn: float = 0.0
+    speed_p90_kn: float = 0.0
+    speed_p95_kn: float = 0.0
+
+
+def segment_moving_time_s(dist_nm: np.ndarray, dt_s: np.ndarray) -> float:
+    """Sum of elapsed time over segments travelled at or above MOVING_SPEED_KN."""
+    positive = dt_s > 0
+    seg_speed = np.zeros_like(dist_nm)
+    np.divide(dist_nm * 3600.0, dt_s, out=seg_speed, where=positive)
+    moving = positive & (seg_speed >= MOVING_SPEED_KN)
+    return float(dt_s[moving].sum())
+
+
+class OutOfOrderError(ValueError):
+    """A chunk starts before the last point already folded in."""
+
+
+def _histogram_percentile(hist: np.ndarray, q: float) -> float:
+    """np.percentile (linear method) of the values encoded by a bin histogram."""
+    n = int(hist.sum())
+    cum = np.cumsum(hist)
+    rank = (n - 1) * q / 100.0
+    lo = int(np.floor(rank))
+    hi = min(lo + 1, n - 1)
+    v_lo = float(np.searchsorted(cum, lo, side="right"))
+    v_hi = float(np.searchsorted(cum, hi, side="right"))
+    return (v_lo + (v_hi - v_lo) * (rank - lo)) * SPEED_BIN_KN
+
+
+class TripAccumulator:
+    """Running trip statistics that can be folded chunk by chunk.
+
+    Chunks must arrive in timestamp order. The state is small and
+    fixed-size apart from the speed histogram (one counter per
+    SPEED_BIN_KN), so it can be persisted on the track document and
+    updated as points are appended.
+    """
+
+    def __init__(self):
+        self.point_count = 0
+        self.distance_nm = 0.0
+        self.max_speed_kn = 0.0
+        self.moving_time_s = 0.0
+        self.first_t: Optional[float] = None
+        self.last_t: Optional[float] = None
+        self.last_lat: Optional[float] = None
+        self.last_lon: Optional[float] = None
+        self.min_lat: Optional[float] = None
+        self.max_lat: Optional[float] = None
+        self.min_lon: Optional[float] = None
+        self.max_lon: Optional[float] = None
+        self.speed_hist = np.zeros(0, dtype=np.int64)
+
+    def fold(self, arrays: TrackArrays) -> "TripAccumulator":
+        """Fold a time-ordered chunk of points into the running totals."""
+        n = len(arrays)
+        if n == 0:
+            return self
+        if self.last_t is not None and arrays.t[0] <= self.last_t:
+            if arrays.t[0] < self.last_t:
+                raise OutOfOrderError("chunk starts before the last folded point")
+            # A fix at exactly the last folded timestamp is that fix re-sent.
+            arrays = arrays.select(arrays.t > self.last_t)
+            n = len(arrays)
+            if n == 0:
+                return self
+
+        t, lat, lon = arrays.t, arrays.lat, arrays.lon
+        if self.last_t is not None:
+            # Stitch the previous chunk's last fix onto this one.
+            t = np.concatenate(([self.last_t], t))
+            lat = np.concatenate(([self.last_lat], lat))
+            lon = np.concatenate(([self.last_lon], lon))
+        dist = leg_distances_nm(lat, lon)
+        self.distance_nm += float(dist.sum())
+        self.moving_time_s += segment_moving_time_s(dist, np.diff(t))
+
+        if self.first_t is None:
+            self.first_t = float(arrays.t[0])
+        self.last_t = float(arrays.t[-1])
+        self.last_lat = float(arrays.lat[-1])
+        self.last_lon = float(arrays.lon[-1])
+        self.point_count += n
+        self._extend_bbox(arrays)
+
+        speeds = arrays.speed[~np.isnan(arrays.speed)]
+        if speeds.size:
+            self.max_speed_kn = max(self.max_speed_kn, float(speeds.max()))
+            bins = np.rint(np.clip(speeds, 0.0, None) / SPEED_BIN_KN).astype(np.int64)
+            counts = np.bincount(bins)
+            if counts.size > self.speed_hist.size:
+                counts[: self.speed_hist.size] += self.speed_hist
+                self.speed_hist = counts
+            else:
+                self.speed_hist[: counts.size] += counts
+        return self
+
+    def _extend_bbox(self, arrays: TrackArrays) -> None:
+        lo_lat, hi_lat = float(arrays.lat.min()), float(arrays.lat.max())
+        lo_lon, hi_lon = float(arrays.lon.min()), float(arrays.lon.max())
+        if self.min_lat is None:
+            self.min_lat, self.max_lat = lo_lat, hi_lat
+            self.min_lon, self.max_lon = lo_lon, hi_lon
+        else:
+            self.min_lat = min(self.min_lat, lo_lat)
+            self.max_lat = max(self.max_lat, hi_lat)
+            self.min_lon = min(self.min_lon, lo_lon)
+            self.max_lon = max(self.max_lon, hi_lon)
+
+    def stats(self) -> TripStats:
+        stats = TripStats(
+            point_count=self.point_count,
+            distance_nm=self.distance_nm,
+            max_speed_kn=self.max_speed_kn,
+            moving_time_s=self.moving_time_s,
+        )
+        if self.speed_hist.sum():
+            stats.speed_p50_kn, stats.speed_p90_kn, stats.speed_p95_kn = (
+                _histogram_percentile(self.speed_hist, q) for q in SPEED_PERCENTILES
+            )
+        return stats
+
+    _SCALAR_FIELDS = (
+        "point_count",
+        "distance_nm",
+        "max_speed_kn",
+        "moving_time_s",
+        "first_t",
+        "last_t",
+        "last_lat",
+        "last_lon",
+        "min_lat",
+        "max_lat",
+        "min_lon",
+        "max_lon",
+    )
+
+    def to_doc(self) -> dict:
+        doc = {name: getattr(self, name) for name in self._SCALAR_FIELDS}
+        doc["speed_hist"] = self.speed_hist.tolist()
+        return doc
+
+    @classmethod
+    def from_doc(cls, doc: Mapping) -> "TripAccumulator":
+        acc = cls()
+        for name in cls._SCALAR_FIELDS:
+            if doc.get(name) is not None:
+                setattr(acc, name, doc[name])
+        acc.speed_hist = np.asarray(doc.get("speed_hist", []), dtype=np.int64)
+        return acc
+
+
+def compute_trip_stats(arrays: TrackArrays) -> TripStats:
+    """Distance, max speed, moving time and speed percentiles for a track."""
+    return TripAccumulator().fold(arrays).stats()
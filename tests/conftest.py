@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The backend modules import each other as top-level modules (uvicorn runs
+# ``server:app`` from inside backend/), so mirror that here.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
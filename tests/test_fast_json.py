@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from fast_json import FastJSONResponse
+
+
+class Row(BaseModel):
+    id: str
+    name: Optional[str] = None
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    distance_nm: float
+    waypoint_ids: List[str]
+
+
+ROWS = [
+    {
+        "id": "65f0c0ffee",
+        "name": "Bayou été   run",
+        "start_time": datetime(2025, 6, 1, 12, 30, 15, 123000),
+        "end_time": None,
+        "distance_nm": 1.0,
+        "waypoint_ids": ["a", "b"],
+    },
+    {
+        "id": "65f0c0ffef",
+        "name": None,
+        "start_time": datetime(2025, 6, 1),
+        "end_time": datetime(2025, 6, 2, 8),
+        "distance_nm": 2.5e-05,
+        "waypoint_ids": [],
+    },
+    {
+        "id": "65f0c0fff0",
+        "name": "Buoy 3e4",
+        "start_time": datetime(2025, 6, 1),
+        "end_time": None,
+        "distance_nm": 12345.678901234,
+        "waypoint_ids": [],
+    },
+]
+
+
+def make_client():
+    app = FastAPI()
+
+    @app.get("/models", response_model=List[Row])
+    async def models(i: Optional[int] = None):
+        rows = ROWS if i is None else ROWS[i : i + 1]
+        return [Row(**row) for row in rows]
+
+    @app.get("/fast", response_model=List[Row])
+    async def fast(i: Optional[int] = None):
+        return FastJSONResponse(ROWS if i is None else ROWS[i : i + 1])
+
+    return TestClient(app)
+
+
+def test_fast_path_bodies_match_response_model_encoding():
+    client = make_client()
+    for params in [{}] + [{"i": i} for i in range(len(ROWS))]:
+        expected = client.get("/models", params=params)
+        actual = client.get("/fast", params=params)
+        assert actual.content == expected.content
+        assert actual.headers["content-type"] == expected.headers["content-type"]
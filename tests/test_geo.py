@@ -0,0 +1,47 @@
+import numpy as np
+
+from geo import (
+    distance_matrix_nm,
+    douglas_peucker_significance,
+    haversine_nm_array,
+    meters_per_pixel,
+    simplification_levels,
+)
+
+
+def test_douglas_peucker_keeps_corners_and_drops_collinear_points():
+    # An L shape with extra points along each straight leg.
+    x = np.array([0, 1, 2, 3, 3, 3, 3], dtype=float)
+    y = np.array([0, 0, 0, 0, 1, 2, 3], dtype=float)
+    sig = douglas_peucker_significance(x, y)
+    assert np.isinf(sig[[0, -1]]).all()
+    assert sig[3] > 0
+    assert (sig[[1, 2, 4, 5]] == 0).all()
+
+
+def test_levels_are_nested_and_coarser_when_zoomed_out():
+    rng = np.random.default_rng(3)
+    lats = 29 + np.cumsum(rng.normal(0, 2e-4, 5000))
+    lons = -90 + np.cumsum(rng.normal(1e-4, 2e-4, 5000))
+    levels = simplification_levels(lats, lons, range(4, 17))
+
+    previous = None
+    for zoom in range(4, 17):
+        tolerance_m, kept = levels[zoom]
+        assert tolerance_m == meters_per_pixel(zoom, float(lats.mean()))
+        assert kept[0] == 0 and kept[-1] == 4999
+        if previous is not None:
+            assert set(previous) <= set(kept)
+        previous = kept
+    assert len(levels[4][1]) < len(levels[16][1]) <= 5000
+
+
+def test_distance_matrix_matches_pairwise_haversine():
+    rng = np.random.default_rng(5)
+    lats = np.concatenate([rng.uniform(-80, 80, 200), 29 + rng.normal(0, 1e-4, 50)])
+    lons = np.concatenate([rng.uniform(-180, 180, 200), -90 + rng.normal(0, 1e-4, 50)])
+    matrix = distance_matrix_nm(lats, lons)
+    expected = haversine_nm_array(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+    assert matrix.shape == (250, 250)
+    np.testing.assert_allclose(matrix, expected, rtol=1e-9, atol=1e-9)
+    assert (np.diag(matrix) == 0).all()
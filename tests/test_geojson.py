@@ -0,0 +1,48 @@
+import pytest
+
+from geojson import box_around, box_geometry, boxes_overlap, line_geometry
+
+
+def test_box_edges_follow_parallels_and_ring_is_closed():
+    box = box_geometry(-91.0, 29.0, -89.0, 30.0)
+    ring = box["coordinates"][0]
+    assert box["type"] == "Polygon"
+    assert ring[0] == ring[-1]
+    assert {lat for _, lat in ring} == {29.0, 30.0}
+    assert len(ring) > 5  # densified north and south edges
+
+
+def test_antimeridian_and_wide_boxes_stay_within_range():
+    crossing = box_geometry(170.0, -10.0, -170.0, 10.0)
+    lons = [lon for lon, _ in crossing["coordinates"][0]]
+    assert all(-180.0 <= lon <= 180.0 for lon in lons)
+    assert 175.0 in lons and -175.0 in lons
+
+    world = box_geometry(-180.0, -90.0, 180.0, 90.0)
+    assert world["type"] == "MultiPolygon"
+    assert len(world["coordinates"]) == 4
+    lats = [lat for piece in world["coordinates"] for _, lat in piece[0]]
+    assert max(lats) < 90.0 and min(lats) > -90.0
+
+
+def test_boxes_overlap_across_the_antimeridian():
+    assert boxes_overlap((170.0, -1.0, -170.0, 1.0), (-175.0, 0.0, -174.0, 0.5))
+    assert not boxes_overlap((170.0, -1.0, -170.0, 1.0), (0.0, 0.0, 1.0, 0.5))
+    assert not boxes_overlap((0.0, 0.0, 1.0, 1.0), (0.0, 2.0, 1.0, 3.0))
+
+
+def test_box_around_a_circle():
+    min_lon, min_lat, max_lon, max_lat = box_around(29.0, -90.0, 60.0)
+    assert (min_lat, max_lat) == pytest.approx((28.0, 30.0))
+    assert min_lon < -91.0 and max_lon > -89.0
+    assert box_around(0.0, 179.9, 30.0)[0] > 179.0  # wraps
+    assert box_around(89.5, 0.0, 60.0)[::2] == (-180.0, 180.0)
+
+
+def test_line_geometry_drops_repeated_vertices():
+    assert line_geometry([[1, 2], [1, 2], [3, 4], [3, 4]]) == {
+        "type": "LineString",
+        "coordinates": [[1.0, 2.0], [3.0, 4.0]],
+    }
+    assert line_geometry([[1, 2], [1, 2]]) == {"type": "Point", "coordinates": [1.0, 2.0]}
+    assert line_geometry([]) is None
@@ -0,0 +1,93 @@
+import asyncio
+import math
+
+import numpy as np
+import pytest
+
+from gpx_import import GpxFix, GpxReader, GpxTrackEnd, GpxTrackStart, GpxWaypoint
+from track_export import export_chunks
+from trip_stats import TrackArrays
+
+GPX_10 = b"""<?xml version="1.0"?>
+<gpx version="1.0" xmlns="http://www.topografix.com/GPX/1/0">
+  <metadata><name>ignored</name></metadata>
+  <wpt lat="29.5" lon="-90.25"><name>Rig 7</name><cmt>gas</cmt></wpt>
+  <wpt lat="29.6" lon="-90.3"/>
+  <trk><name>Morning</name>
+    <trkseg>
+      <trkpt lat="29.0" lon="-90.0"><time>2024-06-01T06:00:00Z</time><speed>2.0</speed><course>90</course></trkpt>
+      <trkpt lat="29.001" lon="-90.0"><time>2024-06-01T01:00:05-05:00</time></trkpt>
+      <trkpt lat="29.002" lon="-90.0"></trkpt>
+      <trkpt lat="99" lon="-90.0"><time>2024-06-01T06:00:10Z</time></trkpt>
+    </trkseg>
+    <trkseg>
+      <trkpt lat="29.003" lon="-90.0"><time>2024-06-01T06:00:15.5Z</time></trkpt>
+    </trkseg>
+  </trk>
+</gpx>
+"""
+
+
+def read_all(data: bytes, chunk: int):
+    reader = GpxReader()
+    items = []
+    for start in range(0, len(data), chunk):
+        items.extend(reader.feed(data[start : start + chunk]))
+    items.extend(reader.close())
+    return reader, items
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 1 << 16])
+def test_items_do_not_depend_on_chunk_boundaries(chunk):
+    reader, items = read_all(GPX_10, chunk)
+    assert [type(i) for i in items] == [
+        GpxWaypoint, GpxWaypoint, GpxTrackStart, GpxFix, GpxFix, GpxFix, GpxTrackEnd
+    ]
+    assert items[0] == GpxWaypoint("Rig 7", "gas", 29.5, -90.25)
+    assert items[1].name == "29.60000, -90.30000"
+    assert items[2] == GpxTrackStart("Morning")
+    first, second, third = items[3:6]
+    assert first.speed_kn == pytest.approx(2.0 * 3600 / 1852) and first.course_deg == 90.0
+    assert second.t - first.t == 5.0  # offset applied
+    assert math.isnan(second.speed_kn)
+    assert third.t - first.t == 15.5
+    assert reader.skipped == 2  # no time, latitude out of range
+
+
+def test_read_elements_are_detached():
+    n = 5000
+    body = b"".join(
+        b'<trkpt lat="29" lon="-90"><time>2024-06-01T06:%02d:%02dZ</time></trkpt>' % (i // 60 % 60, i % 60)
+        for i in range(n)
+    )
+    reader = GpxReader()
+    reader.feed(b'<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>')
+    fixes = reader.feed(body)
+    assert len(fixes) == n
+    trkseg = reader._stack[-1]
+    assert len(trkseg) == 0
+
+
+def test_round_trips_an_export():
+    n = 300
+    arrays = TrackArrays(
+        t=1717200000.0 + np.arange(n) * 1.5,
+        lat=29.0 + np.arange(n) * 1e-5,
+        lon=np.full(n, -90.0),
+        speed=np.linspace(0, 8, n),
+        course=np.full(n, np.nan),
+    )
+
+    async def export():
+        async def chunks():
+            yield arrays
+
+        return b"".join([c async for c in export_chunks(chunks(), "gpx", "abc", "Sortie")])
+
+    _, items = read_all(asyncio.run(export()), 4096)
+    fixes = [i for i in items if isinstance(i, GpxFix)]
+    assert items[0] == GpxTrackStart("Sortie")
+    np.testing.assert_allclose([f.t for f in fixes], arrays.t)
+    np.testing.assert_allclose([f.lat for f in fixes], arrays.lat)
+    np.testing.assert_allclose([f.speed_kn for f in fixes], arrays.speed, atol=1e-9)
+    assert all(math.isnan(f.course_deg) for f in fixes)
@@ -0,0 +1,185 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from indexes import (
+    INDEXES,
+    backfill_updated_at,
+    ensure_fix_index,
+    ensure_trip_index,
+    remove_duplicate_fixes,
+    hot_queries,
+    plan_stages,
+    winning_plan,
+)
+
+
+class FakeAggregateCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakePoints:
+    """track_points with a configurable index build outcome."""
+
+    name = "track_points"
+
+    def __init__(self, docs, indexes, fail_build=False):
+        self.docs = docs
+        self.indexes = dict.fromkeys(indexes, {})
+        self.fail_build = fail_build
+
+    async def index_information(self):
+        return dict(self.indexes)
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        groups = {}
+        for doc in sorted(self.docs, key=lambda d: d["_id"]):
+            groups.setdefault((doc["track_id"], doc["timestamp"]), []).append(doc["_id"])
+        return FakeAggregateCursor(
+            [
+                {"_id": {"track_id": key[0], "timestamp": key[1]}, "ids": ids, "count": len(ids)}
+                for key, ids in groups.items()
+                if len(ids) > 1
+            ]
+        )
+
+    async def delete_many(self, query):
+        doomed = set(query["_id"]["$in"])
+        before = len(self.docs)
+        self.docs = [d for d in self.docs if d["_id"] not in doomed]
+        return SimpleNamespace(deleted_count=before - len(self.docs))
+
+    async def drop_index(self, name):
+        del self.indexes[name]
+
+    async def create_indexes(self, models):
+        model = models[0].document
+        if model.get("unique") and self.fail_build:
+            raise OperationFailure("E11000 duplicate key error", code=11000)
+        self.indexes[model["name"]] = {}
+        return [model["name"]]
+
+
+class FakeTrips(FakePoints):
+    name = "trips"
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        groups = {}
+        for doc in sorted(self.docs, key=lambda d: (d["updated_at"], d["_id"]), reverse=True):
+            groups.setdefault(doc["track_id"], []).append(doc["_id"])
+        return FakeAggregateCursor(
+            [{"_id": key, "ids": ids, "count": len(ids)} for key, ids in groups.items() if len(ids) > 1]
+        )
+
+
+class FakeTracks:
+    def __init__(self):
+        self.stale = []
+
+    async def update_many(self, query, update):
+        self.stale.extend(query["_id"]["$in"])
+
+
+def fix_docs(track_id, seconds):
+    return [{"_id": ObjectId(), "track_id": track_id, "timestamp": s} for s in seconds]
+
+
+def test_every_hot_query_has_a_matching_index():
+    for query in hot_queries():
+        keys = [tuple(model.document["key"].keys()) for model in INDEXES[query.collection]]
+        fields = tuple(dict.fromkeys([*query.filter, *(field for field, _ in query.sort or [])]))
+        assert any(key[: len(fields)] == fields for key in keys), query
+
+
+def test_plan_stages_walks_nested_plans():
+    explain = {
+        "queryPlanner": {
+            "winningPlan": {
+                "queryPlan": {
+                    "stage": "FETCH",
+                    "inputStage": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}},
+                }
+            }
+        }
+    }
+    assert list(plan_stages(winning_plan(explain))) == ["FETCH", "SORT", "COLLSCAN"]
+
+
+def test_unique_fix_index_replaces_legacy_after_dedupe():
+    track_id = ObjectId()
+    points = FakePoints(fix_docs(track_id, [0, 1, 1, 2, 2, 2]), ["_id_", "track_id_timestamp"])
+    db = SimpleNamespace(track_points=points, tracks=FakeTracks())
+
+    assert asyncio.run(ensure_fix_index(db)) is True
+    assert sorted(d["timestamp"] for d in points.docs) == [0, 1, 2]
+    assert set(points.indexes) == {"_id_", "track_id_timestamp_unique"}
+    assert db.tracks.stale == [track_id]
+
+
+def test_failed_unique_build_keeps_a_non_unique_index():
+    points = FakePoints(fix_docs(ObjectId(), [0, 1]), ["_id_", "track_id_timestamp"], fail_build=True)
+    db = SimpleNamespace(track_points=points, tracks=FakeTracks())
+
+    assert asyncio.run(ensure_fix_index(db)) is False
+    assert set(points.indexes) == {"_id_", "track_id_timestamp"}
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.updates = []
+
+    async def update_many(self, query, update):
+        self.updates.append((query, update))
+        return SimpleNamespace(modified_count=0)
+
+
+def test_updated_at_is_backfilled_from_each_listing_field():
+    collections = {name: RecordingCollection() for name in ("tracks", "trips", "waypoints", "routes")}
+
+    asyncio.run(backfill_updated_at(collections))
+
+    for name, field in [("tracks", "start_time"), ("waypoints", "created_at")]:
+        [(query, update)] = collections[name].updates
+        assert query == {"updated_at": {"$exists": False}}
+        assert update == [{"$set": {"updated_at": {"$ifNull": [f"${field}", "$$NOW"]}}}]
+
+
+def test_unique_trip_index_keeps_the_newest_trip_per_track():
+    track_id = ObjectId()
+    trips = [
+        {"_id": ObjectId(), "track_id": track_id, "updated_at": datetime(2024, 6, 2)},
+        {"_id": ObjectId(), "track_id": track_id, "updated_at": datetime(2024, 6, 1)},
+        {"_id": ObjectId(), "track_id": ObjectId(), "updated_at": datetime(2024, 6, 1)},
+    ]
+    db = SimpleNamespace(trips=FakeTrips(list(trips), ["_id_", "track_id"]))
+
+    assert asyncio.run(ensure_trip_index(db)) is True
+    assert db.trips.docs == [trips[0], trips[2]]
+    assert set(db.trips.indexes) == {"_id_", "track_id_unique"}
+
+
+def test_failed_unique_trip_build_keeps_a_track_id_index():
+    db = SimpleNamespace(trips=FakeTrips([], ["_id_"], fail_build=True))
+
+    assert asyncio.run(ensure_trip_index(db)) is False
+    assert set(db.trips.indexes) == {"_id_", "track_id"}
+
+
+def test_dry_run_counts_duplicate_fixes_without_removing_them():
+    points = FakePoints(fix_docs(ObjectId(), [0, 1, 1, 1]), ["_id_"])
+    db = SimpleNamespace(track_points=points, tracks=FakeTracks())
+
+    assert asyncio.run(remove_duplicate_fixes(db, dry_run=True)) == (2, 1)
+    assert len(points.docs) == 4
+    assert db.tracks.stale == []
@@ -0,0 +1,208 @@
+import asyncio
+
+import numpy as np
+from bson import ObjectId
+
+from ingest_buffer import IngestBuffer, IngestResult, KnownIdCache
+from point_store import InsertOutcome
+from trip_stats import TrackArrays
+
+
+def arrays(times):
+    n = len(times)
+    return TrackArrays(
+        t=np.asarray(times, dtype=float),
+        lat=np.full(n, 29.0),
+        lon=np.full(n, -90.0),
+        speed=np.full(n, np.nan),
+        course=np.full(n, np.nan),
+    )
+
+
+class RecordingStore:
+    def __init__(self, stored=()):
+        self.inserts = []
+        self.stored = set(stored)
+
+    async def insert(self, docs):
+        self.inserts.append(docs)
+        duplicates = [i for i, d in enumerate(docs) if (d["track_id"], d["timestamp"]) in self.stored]
+        self.stored.update((d["track_id"], d["timestamp"]) for d in docs)
+        return InsertOutcome(len(docs) - len(duplicates), duplicates)
+
+
+async def no_stale(track_ids):
+    raise AssertionError(f"unexpected stale marking for {track_ids}")
+
+
+class FlakyStore(RecordingStore):
+    """Writes the first fix of each failing insert, then raises."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    async def insert(self, docs):
+        if self.failures:
+            self.failures -= 1
+            await super().insert(docs[:1])
+            raise RuntimeError("connection reset")
+        return await super().insert(docs)
+
+
+def test_batches_from_many_requests_are_coalesced_into_one_insert():
+    store = RecordingStore()
+    flushed = []
+
+    async def after_flush(track_id, arr):
+        flushed.append((track_id, arr.t.tolist()))
+
+    async def scenario():
+        buffer = IngestBuffer(store, after_flush, no_stale, max_points=1000, max_delay_s=60)
+        buffer.start()
+        a, b = ObjectId(), ObjectId()
+        acks = [
+            await buffer.submit(a, arrays([1.7e9 + 2])),
+            await buffer.submit(b, arrays([1.7e9])),
+            await buffer.submit(a, arrays([1.7e9, 1.7e9 + 1])),
+        ]
+        assert store.inserts == []
+        await buffer.stop()
+        return a, b, acks
+
+    a, b, acks = asyncio.run(scenario())
+    assert [ack.accepted for ack in acks] == [1, 1, 2]
+    assert all(ack.inserted is None for ack in acks)
+    assert len(store.inserts) == 1 and len(store.inserts[0]) == 4
+    assert dict(flushed) == {a: [1.7e9, 1.7e9 + 1, 1.7e9 + 2], b: [1.7e9]}
+
+
+def test_wait_returns_after_the_size_threshold_flush():
+    store = RecordingStore()
+
+    async def after_flush(track_id, arr):
+        pass
+
+    async def scenario():
+        buffer = IngestBuffer(store, after_flush, no_stale, max_points=3, max_delay_s=60)
+        buffer.start()
+        written = await buffer.submit(ObjectId(), arrays([1.0, 2.0, 3.0]), wait=True)
+        await buffer.stop()
+        return written
+
+    assert asyncio.run(scenario()) == IngestResult(3, 3, 0)
+    assert len(store.inserts) == 1
+
+
+def test_known_id_cache_expires():
+    cache = KnownIdCache(ttl_s=-1)
+    key = ObjectId()
+    cache.add(key)
+    assert key not in cache
+
+
+def test_resent_fixes_are_reported_as_skipped_and_not_folded():
+    store = RecordingStore()
+    folded = []
+
+    async def after_flush(track_id, arr):
+        folded.append(arr.t.tolist())
+
+    async def scenario():
+        buffer = IngestBuffer(store, after_flush, no_stale)
+        track = ObjectId()
+        first = await buffer.submit(track, arrays([1.7e9, 1.7e9 + 1]), wait=True)
+        # A retry of the first batch plus one new fix, and a same-flush repeat.
+        retry = await buffer.submit(track, arrays([1.7e9 + 1, 1.7e9 + 2, 1.7e9 + 2]), wait=True)
+        return first, retry
+
+    first, retry = asyncio.run(scenario())
+    assert first == IngestResult(2, 2, 0)
+    assert retry == IngestResult(3, 1, 2)
+    assert folded == [[1.7e9, 1.7e9 + 1], [1.7e9 + 2]]
+
+
+def test_failed_insert_marks_tracks_stale_and_requeues_acked_batches():
+    store = FlakyStore(failures=1)
+    folded = []
+    stale = []
+
+    async def after_flush(track_id, arr):
+        folded.append(arr.t.tolist())
+
+    async def mark_stale(track_ids):
+        stale.extend(track_ids)
+
+    async def scenario():
+        buffer = IngestBuffer(store, after_flush, mark_stale, max_points=1000, max_delay_s=60)
+        buffer.start()
+        track = ObjectId()
+        await buffer.submit(track, arrays([1.0, 2.0, 3.0]))
+        try:
+            await buffer.flush()
+        except RuntimeError:
+            pass
+        await buffer.stop()
+        return track
+
+    track = asyncio.run(scenario())
+    assert stale == [track]
+    # The fix written before the failure is skipped on retry; the rest is folded.
+    assert len(store.stored) == 3
+    assert folded == [[2.0, 3.0]]
+
+
+def test_waited_batches_fail_and_acked_ones_are_dropped_after_max_attempts():
+    store = FlakyStore(failures=10)
+
+    async def after_flush(track_id, arr):
+        pass
+
+    async def mark_stale(track_ids):
+        pass
+
+    async def scenario():
+        buffer = IngestBuffer(store, after_flush, mark_stale, max_points=1000, max_delay_s=60, max_attempts=2)
+        buffer.start()
+        await buffer.submit(ObjectId(), arrays([1.0]))
+        for _ in range(2):
+            try:
+                await buffer.flush()
+            except RuntimeError:
+                pass
+        pending = len(buffer._pending)
+        waited = asyncio.ensure_future(buffer.submit(ObjectId(), arrays([2.0]), wait=True))
+        await asyncio.sleep(0)
+        try:
+            await buffer.flush()
+        except RuntimeError:
+            pass
+        await buffer.stop()
+        try:
+            await waited
+        except RuntimeError:
+            return pending, len(buffer._pending), True
+        return pending, len(buffer._pending), False
+
+    assert asyncio.run(scenario()) == (0, 0, True)
+
+
+def test_failed_post_flush_update_marks_the_track_stale():
+    store = RecordingStore()
+    stale = []
+
+    async def after_flush(track_id, arr):
+        raise RuntimeError("stats write failed")
+
+    async def mark_stale(track_ids):
+        stale.extend(track_ids)
+
+    async def scenario():
+        buffer = IngestBuffer(store, after_flush, mark_stale)
+        track = ObjectId()
+        result = await buffer.submit(track, arrays([1.0, 2.0]), wait=True)
+        return track, result
+
+    track, result = asyncio.run(scenario())
+    assert result == IngestResult(2, 2, 0)
+    assert stale == [track]
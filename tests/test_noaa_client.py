@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+import pytest
+
+from noaa_client import NoaaClient, NoaaError
+
+
+def run_with(handler, call):
+    async def scenario():
+        noaa = NoaaClient(backoff_s=0.0)
+        noaa._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return noaa, await call(noaa)
+        finally:
+            await noaa.aclose()
+
+    return asyncio.run(scenario())
+
+
+def test_transient_failures_are_retried_and_timed():
+    responses = iter([httpx.ConnectError("reset"), httpx.Response(503), httpx.Response(200, json={"ok": 1})])
+
+    def handler(request):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    noaa, data = run_with(handler, lambda n: n.get_json("stations", "https://noaa.test/x", {}))
+    assert data == {"ok": 1}
+    stats = noaa.latency_summary()["operations"]["stations"]
+    assert stats["calls"] == 3 and stats["retries"] == 2 and stats["failures"] == 0
+    assert stats["p50_ms"] is not None
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400)
+
+    with pytest.raises(NoaaError):
+        run_with(handler, lambda n: n.get_json("predictions", "https://noaa.test/x", {}))
+    assert len(calls) == 1
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from pagination import InvalidCursor, Ordering, after_cursor, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    ordering = Ordering("start_time", -1)
+    doc = {"_id": ObjectId(), "start_time": datetime(2025, 6, 1, 12, 30, 15, 123000)}
+    assert decode_cursor(ordering, encode_cursor(ordering, doc)) == (doc["start_time"], doc["_id"])
+
+
+def test_cursor_is_bound_to_its_ordering():
+    doc = {"_id": ObjectId(), "start_time": datetime(2025, 6, 1), "created_at": datetime(2025, 6, 1)}
+    cursor = encode_cursor(Ordering("start_time", -1), doc)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(Ordering("created_at", -1), cursor)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(Ordering("start_time", -1), "not-a-cursor")
+
+
+def test_descending_seek_filter_breaks_ties_on_id():
+    ts, oid = datetime(2025, 6, 1), ObjectId()
+    assert after_cursor(Ordering("start_time", -1), ts, oid) == {
+        "$or": [{"start_time": {"$lt": ts}}, {"start_time": ts, "_id": {"$lt": oid}}]
+    }
@@ -0,0 +1,48 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from point_codecs import PointDecodeError, decode_packed, encode_packed, iter_ndjson_chunks
+from trip_stats import TrackArrays
+
+
+def test_packed_round_trip():
+    arrays = TrackArrays(
+        t=np.array([1.7e9, 1.7e9 + 2]),
+        lat=np.array([29.1, 29.2]),
+        lon=np.array([-90.1, -90.2]),
+        speed=np.array([5.5, np.nan]),
+        course=np.array([np.nan, 180.0]),
+    )
+    decoded = decode_packed(encode_packed(arrays))
+    for field in ("t", "lat", "lon", "speed", "course"):
+        np.testing.assert_array_equal(getattr(decoded, field), getattr(arrays, field))
+
+
+def test_packed_rejects_truncated_and_out_of_range():
+    with pytest.raises(PointDecodeError):
+        decode_packed(b"\x00" * 39)
+    bad = np.array([[1.7e9, 91.0, 0.0, 0.0, 0.0]], dtype="<f8").tobytes()
+    with pytest.raises(PointDecodeError):
+        decode_packed(bad)
+
+
+def test_ndjson_stream_is_chunked_across_split_lines():
+    lines = b"".join(
+        b'{"timestamp": "2025-06-01T00:00:%02dZ", "lat": 29.0, "lon": -90.0, "speed_kn": 4}\n' % i
+        for i in range(5)
+    )
+
+    async def stream():
+        for i in range(0, len(lines), 7):
+            yield lines[i : i + 7]
+
+    async def collect():
+        return [chunk async for chunk in iter_ndjson_chunks(stream(), 2)]
+
+    chunks = asyncio.run(collect())
+    t = np.concatenate([c.t for c in chunks])
+    assert len(t) == 5
+    assert list(np.diff(t)) == [1, 1, 1, 1]
+    assert all(len(c) <= 3 for c in chunks)
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+
+from migrate_track_points import bucket_document
+from point_store import BucketPointStore
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.docs if d["track_id"] == query["track_id"]])
+
+
+def make_docs(track_id, seconds):
+    t0 = datetime(2025, 6, 1)
+    return [
+        {"track_id": track_id, "timestamp": t0 + timedelta(seconds=s), "lat": 29.0 + s * 1e-4, "lon": -90.0}
+        for s in seconds
+    ]
+
+
+def read_all(store, track_id):
+    async def collect():
+        return [chunk async for chunk in store.iter_chunks(track_id, 5000)]
+
+    return asyncio.run(collect())
+
+
+def test_overlapping_buckets_are_read_in_time_order():
+    track_id = ObjectId()
+    # The second bucket overlaps the first, as a late batch would.
+    buckets = [
+        bucket_document(track_id, make_docs(track_id, [0, 10, 20, 30])),
+        bucket_document(track_id, make_docs(track_id, [15, 25, 40])),
+        bucket_document(track_id, make_docs(track_id, [35, 50])),
+        bucket_document(ObjectId(), make_docs(track_id, [5])),
+    ]
+    store = BucketPointStore.__new__(BucketPointStore)
+    store.collection = FakeCollection(buckets)
+
+    chunks = read_all(store, track_id)
+    t = np.concatenate([c.t for c in chunks])
+    assert list(t - t[0]) == [0, 10, 15, 20, 25, 30, 35, 40, 50]
+    assert np.isnan(chunks[0].speed).all()
+
+
+class FakeBuckets:
+    """Enough of track_point_buckets for BucketPointStore.insert."""
+
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query, projection=None):
+        docs = [
+            d
+            for d in self.docs
+            if d["track_id"] == query["track_id"]
+            and d["start_time"] <= query["start_time"]["$lte"]
+            and d["end_time"] >= query["end_time"]["$gte"]
+        ]
+        return FakeCursor(docs)
+
+    async def update_one(self, query, update, upsert=False):
+        bucket = next(
+            (d for d in self.docs if d["track_id"] == query["track_id"] and d["count"] <= query["count"]["$lte"]),
+            None,
+        )
+        if bucket is None:
+            bucket = {"track_id": query["track_id"], "count": 0}
+            bucket.update({field: [] for field in update["$push"]})
+            self.docs.append(bucket)
+        for field, spec in update["$push"].items():
+            bucket[field].extend(spec["$each"])
+        bucket["count"] += update["$inc"]["count"]
+        bucket["start_time"] = min(bucket.get("start_time", update["$min"]["start_time"]), update["$min"]["start_time"])
+        bucket["end_time"] = max(bucket.get("end_time", update["$max"]["end_time"]), update["$max"]["end_time"])
+
+
+def test_bucket_insert_skips_fixes_already_stored():
+    track_id = ObjectId()
+    store = BucketPointStore.__new__(BucketPointStore)
+    store.collection = FakeBuckets()
+
+    async def scenario():
+        first = await store.insert(make_docs(track_id, [0, 10, 20]))
+        # A retry of the last fixes plus one new one.
+        retry = await store.insert(make_docs(track_id, [10, 20, 30]))
+        return first, retry
+
+    first, retry = asyncio.run(scenario())
+    assert first.inserted == 3 and first.duplicates == []
+    assert retry.inserted == 1 and retry.duplicates == [0, 1]
+    assert store.collection.docs[0]["count"] == 4
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from route_geometry import leg_breakdown, remove_waypoint, replace_waypoint, route_geometry
+
+
+def waypoint(lat, lon, name="wp"):
+    return {"_id": ObjectId(), "name": name, "description": None, "lat": lat, "lon": lon,
+            "created_at": datetime(2024, 5, 1)}
+
+
+@pytest.fixture
+def square():
+    # One degree of latitude is 60 nm; legs run N, E, S.
+    return [waypoint(0, 0), waypoint(1, 0), waypoint(1, 1), waypoint(0, 1)]
+
+
+def test_route_geometry_legs_and_bearings(square):
+    fields = route_geometry(square)
+    assert fields["waypoint_ids"] == [w["_id"] for w in square]
+    assert [round(segment["bearing_deg"]) for segment in fields["legs"]] == [0, 90, 180]
+    assert fields["legs"][0]["distance_nm"] == pytest.approx(60.04, abs=0.05)
+    assert fields["total_distance_nm"] == pytest.approx(sum(segment["distance_nm"] for segment in fields["legs"]))
+
+
+def test_moving_a_waypoint_matches_a_full_rebuild(square):
+    route = route_geometry(square)
+    moved = {**square[1], "lat": 2.0, "lon": 0.5}
+    fields = replace_waypoint(route, moved)
+    expected = route_geometry([square[0], moved, square[2], square[3]])
+    assert fields["legs"] == pytest.approx(expected["legs"])
+    assert fields["total_distance_nm"] == pytest.approx(expected["total_distance_nm"])
+    assert fields["waypoints"][1]["lat"] == 2.0
+
+
+def test_renaming_keeps_legs_and_unchanged_waypoint_is_a_no_op(square):
+    route = route_geometry(square)
+    fields = replace_waypoint(route, {**square[2], "name": "Buoy"})
+    assert fields["legs"] == route["legs"]
+    assert fields["waypoints"][2]["name"] == "Buoy"
+    assert replace_waypoint(route, square[2]) is None
+
+
+@pytest.mark.parametrize("index", [0, 1, 3])
+def test_removing_a_waypoint_matches_a_full_rebuild(square, index):
+    route = route_geometry(square)
+    fields = remove_waypoint(route, square[index]["_id"])
+    expected = route_geometry(square[:index] + square[index + 1:])
+    assert fields["waypoint_ids"] == expected["waypoint_ids"]
+    assert fields["legs"] == pytest.approx(expected["legs"])
+    assert fields["total_distance_nm"] == pytest.approx(expected["total_distance_nm"])
+
+
+def test_removing_a_repeated_waypoint_drops_every_visit(square):
+    loop = square + [square[0]]
+    fields = remove_waypoint(route_geometry(loop), square[0]["_id"])
+    expected = route_geometry(square[1:])
+    assert fields["waypoint_ids"] == expected["waypoint_ids"]
+    assert fields["legs"] == pytest.approx(expected["legs"])
+
+
+def test_leg_breakdown_accumulates_distance_and_eta(square):
+    route = route_geometry(square)
+    departure = datetime(2024, 6, 1, 6, 0)
+    legs = leg_breakdown(route, speed_kn=6.0, departure=departure)
+    assert [segment["to_waypoint_id"] for segment in legs] == [str(w["_id"]) for w in square[1:]]
+    assert legs[-1]["cumulative_distance_nm"] == pytest.approx(route["total_distance_nm"])
+    assert legs[0]["eta_hours"] == pytest.approx(legs[0]["distance_nm"] / 6.0)
+    assert legs[-1]["eta"] == departure + timedelta(hours=legs[-1]["eta_hours"])
+    assert leg_breakdown(route)[0]["eta_hours"] is None
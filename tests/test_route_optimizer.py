@@ -0,0 +1,46 @@
+import itertools
+import time
+
+import numpy as np
+import pytest
+
+from geo import distance_matrix_nm
+from route_optimizer import optimize_order, path_length
+
+
+def scattered(n, seed):
+    rng = np.random.default_rng(seed)
+    return distance_matrix_nm(rng.uniform(29, 30, n), rng.uniform(-90, -89, n))
+
+
+def test_small_routes_reach_the_brute_force_optimum():
+    dist = scattered(7, 1)
+    best = min(
+        path_length([0, *perm], dist) for perm in itertools.permutations(range(1, 7))
+    )
+    order = optimize_order(dist, fix_start=True)
+    assert order[0] == 0
+    assert path_length(order, dist) == pytest.approx(best, rel=0.02)
+
+
+@pytest.mark.parametrize("fix_start,fix_end", [(True, False), (False, False), (True, True), (False, True)])
+def test_fixed_ends_stay_in_place(fix_start, fix_end):
+    dist = scattered(40, 2)
+    order = optimize_order(dist, fix_start, fix_end)
+    assert sorted(order) == list(range(40))
+    assert not fix_start or order[0] == 0
+    assert not fix_end or order[-1] == 39
+    assert path_length(order, dist) < path_length(list(range(40)), dist)
+
+
+def test_already_optimal_order_is_kept():
+    dist = distance_matrix_nm(np.linspace(29, 30, 10), np.full(10, -90.0))
+    assert optimize_order(dist) == list(range(10))
+
+
+def test_two_hundred_stops_in_well_under_a_second():
+    dist = scattered(250, 3)
+    started = time.perf_counter()
+    order = optimize_order(dist, fix_start=True, fix_end=True)
+    assert time.perf_counter() - started < 1.0
+    assert path_length(order, dist) < 0.2 * path_length(list(range(250)), dist)
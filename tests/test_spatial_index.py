@@ -0,0 +1,24 @@
+import numpy as np
+
+from geo import haversine_nm_array
+from spatial_index import SphereKDTree
+
+
+def test_nearest_matches_brute_force_great_circle_ranking():
+    rng = np.random.default_rng(7)
+    lats = rng.uniform(-85, 85, 2000)
+    lons = rng.uniform(-180, 180, 2000)
+    tree = SphereKDTree(lats, lons)
+    # Include queries at the antimeridian and near a pole.
+    queries = [(0.0, 179.9), (0.0, -179.9), (89.5, 10.0)] + list(
+        zip(rng.uniform(-90, 90, 50), rng.uniform(-180, 180, 50))
+    )
+    for lat, lon in queries:
+        expected = np.argsort(haversine_nm_array(lat, lon, lats, lons), kind="stable")[:6]
+        assert tree.nearest(lat, lon, 6) == expected.tolist()
+
+
+def test_small_and_empty_trees():
+    assert SphereKDTree([], []).nearest(29.0, -90.0, 3) == []
+    tree = SphereKDTree([29.0, 30.0], [-90.0, -88.0])
+    assert tree.nearest(29.9, -88.1, 5) == [1, 0]
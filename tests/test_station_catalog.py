@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from station_catalog import (
+    CATALOG_DOC_ID,
+    CatalogUnavailable,
+    StationCatalog,
+    StationIndex,
+    station_row,
+)
+
+RAW = [
+    {"id": 8761724, "name": "Grand Isle", "state": "LA", "lat": 29.26, "lng": -89.95},
+    {"id": 8760922, "name": "Pilots Station East, S.W. Pass", "state": "LA", "lat": 28.93, "lng": -89.41},
+    {"id": 8735180, "name": "Dauphin Island", "state": "AL", "lat": 30.25, "lng": -88.07},
+    {"id": 9414290, "name": "San Francisco", "state": "CA", "lat": 37.81, "lng": -122.47},
+]
+
+
+def make_index():
+    return StationIndex([station_row(raw) for raw in RAW], datetime(2025, 1, 1))
+
+
+def ids(stations):
+    return [s["id"] for s in stations]
+
+
+def test_search_by_state_and_name_prefixes():
+    index = make_index()
+    assert ids(index.search(state="la")) == ["8761724", "8760922"]
+    assert ids(index.search("isl")) == ["8761724", "8735180"]
+    assert ids(index.search("isl", state="AL")) == ["8735180"]
+    assert ids(index.search("s.w. pass")) == ["8760922"]
+    assert index.search("nowhere") == []
+    assert len(index.search()) == len(RAW)
+
+
+def test_search_falls_back_to_substrings():
+    index = make_index()
+    assert ids(index.search("cisco")) == ["9414290"]
+    assert ids(index.search("sle", state="LA")) == ["8761724"]
+    assert ids(index.search(", ")) == ["8760922"]
+    assert index.search("-") == []
+
+
+class FakeCollection:
+    def __init__(self, doc=None):
+        self.doc = doc
+
+    async def find_one(self, query):
+        return self.doc
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.doc = {"_id": query["_id"], **doc}
+
+
+def test_catalog_is_fetched_once_and_persisted():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return RAW
+
+    async def scenario():
+        collection = FakeCollection()
+        catalog = StationCatalog(collection, fetch)
+        first = await catalog.index()
+        second = await catalog.index()
+        return collection, first, second
+
+    collection, first, second = asyncio.run(scenario())
+    assert calls == [1] and first is second
+    assert collection.doc["_id"] == CATALOG_DOC_ID
+    assert ids(collection.doc["stations"]) == ids(first.stations)
+
+
+def test_stale_catalog_is_served_while_refreshing():
+    stored = {
+        "_id": CATALOG_DOC_ID,
+        "stations": [station_row(RAW[0])],
+        "fetched_at": datetime.utcnow() - timedelta(days=2),
+    }
+
+    async def fetch():
+        return RAW
+
+    async def scenario():
+        catalog = StationCatalog(FakeCollection(stored), fetch, ttl_s=86400)
+        stale = await catalog.index()
+        await catalog._refresh_task
+        return stale, await catalog.index()
+
+    stale, fresh = asyncio.run(scenario())
+    assert len(stale.stations) == 1
+    assert len(fresh.stations) == len(RAW)
+
+
+def test_catalog_unavailable_without_any_copy():
+    async def fetch():
+        raise OSError("NOAA is down")
+
+    with pytest.raises(CatalogUnavailable):
+        asyncio.run(StationCatalog(FakeCollection(), fetch).index())
+
+
+def test_nearest_stations_are_ranked_by_distance():
+    index = make_index()
+    nearest = index.nearest(29.3, -89.9, 2)
+    assert ids(s for s, _ in nearest) == ["8761724", "8760922"]
+    assert nearest[0][1] < nearest[1][1]
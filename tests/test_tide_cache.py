@@ -0,0 +1,124 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+from pymongo import ReplaceOne
+
+from tide_cache import TidePredictionCache, cache_id, parse_predictions
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    """Serves the documents it was seeded with and keeps the writes sent to it."""
+
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.writes = []
+
+    def find(self, query):
+        return FakeCursor([self.docs[i] for i in query["_id"]["$in"] if i in self.docs])
+
+    async def bulk_write(self, requests, ordered=True):
+        self.writes.extend(requests)
+
+
+def noaa_week(first_day):
+    items = []
+    for i in range(7):
+        day = first_day + timedelta(days=i)
+        items.append({"t": f"{day.isoformat()} 04:12", "v": "1.234", "type": "H"})
+        items.append({"t": f"{day.isoformat()} 16:40", "v": "-0.2", "type": "L"})
+    return items
+
+
+def stored_day(station_id, day, predictions, **extra):
+    return {
+        "_id": cache_id(station_id, day),
+        "station_id": station_id,
+        "date": datetime.combine(day, datetime.min.time()),
+        "predictions": predictions,
+        **extra,
+    }
+
+
+def test_concurrent_misses_share_one_ranged_fetch():
+    calls = []
+
+    async def fetch_range(station_id, first, last):
+        calls.append((station_id, first, last))
+        await asyncio.sleep(0.01)
+        return noaa_week(first)
+
+    async def scenario():
+        collection = FakeCollection()
+        cache = TidePredictionCache(collection, fetch_range)
+        days = [date(2025, 6, 2) + timedelta(days=i) for i in range(7)]
+        results = await asyncio.gather(*(cache.get("8761724", d) for d in days * 3))
+        return collection, results
+
+    collection, results = asyncio.run(scenario())
+    assert calls == [("8761724", date(2025, 6, 2), date(2025, 6, 8))]
+    assert all(len(points) == 2 for points in results)
+    assert results[3][0]["time"].date() == date(2025, 6, 5)
+    assert len(collection.writes) == 7
+    doc = stored_day("8761724", date(2025, 6, 5), results[3])
+    assert ReplaceOne({"_id": doc.pop("_id")}, doc, upsert=True) in collection.writes
+
+
+def test_stored_week_is_served_without_noaa():
+    async def fetch_range(station_id, first, last):
+        raise AssertionError("NOAA should not be called")
+
+    week = noaa_week(date(2025, 6, 2))
+    points = parse_predictions(week)
+    days = [date(2025, 6, 2) + timedelta(days=i) for i in range(7)]
+    collection = FakeCollection([stored_day("8761724", d, points[2 * i : 2 * i + 2]) for i, d in enumerate(days)])
+
+    cached = asyncio.run(TidePredictionCache(collection, fetch_range).get("8761724", date(2025, 6, 5)))
+    assert cached == points[6:8]
+    assert collection.writes == []
+
+
+def test_unparseable_items_are_skipped():
+    raw = [{"t": "2025-06-02 04:12", "v": "1.5", "type": "H"}, {"t": "bad", "v": "1"}, {"t": "2025-06-02 05:00"}]
+    assert [p["height_ft"] for p in parse_predictions(raw)] == [1.5]
+
+
+def test_empty_days_expire():
+    calls = []
+
+    async def fetch_range(station_id, first, last):
+        calls.append(first)
+        # NOAA has not published the last day of the week yet.
+        return noaa_week(first)[:-2]
+
+    async def twice(cache):
+        return [await cache.get("8761724", date(2025, 6, 8)) for _ in range(2)]
+
+    assert asyncio.run(twice(TidePredictionCache(FakeCollection(), fetch_range))) == [[], []]
+    assert len(calls) == 1
+
+    calls.clear()
+    asyncio.run(twice(TidePredictionCache(FakeCollection(), fetch_range, empty_ttl_s=0)))
+    assert len(calls) == 2
+
+    # An expired empty day in Mongo is fetched again even before the TTL
+    # monitor has removed it.
+    calls.clear()
+    days = [date(2025, 6, 2) + timedelta(days=i) for i in range(7)]
+    expired = datetime.utcnow() - timedelta(minutes=1)
+    stored = [stored_day("8761724", d, []) for d in days[:-1]]
+    stored.append(stored_day("8761724", days[-1], [], expires_at=expired))
+    collection = FakeCollection(stored)
+    asyncio.run(TidePredictionCache(collection, fetch_range).get("8761724", date(2025, 6, 8)))
+    assert len(calls) == 1
@@ -0,0 +1,31 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from harmonic_tides import HarmonicModel, station_doc_from_noaa
+from tide_curve import cosine_curve
+from trip_stats import to_epoch_seconds
+
+FIXTURE = json.loads((Path(__file__).parent / "fixtures" / "noaa_9447130.json").read_text())
+
+
+def test_curve_passes_through_events_and_holds_outside():
+    t = np.array([0.0, 100.0, 300.0])
+    h = np.array([1.0, 3.0, -1.0])
+    curve = cosine_curve(t, h, np.array([-50.0, 0.0, 50.0, 100.0, 200.0, 300.0, 400.0]))
+    np.testing.assert_allclose(curve, [1.0, 1.0, 2.0, 3.0, 1.0, -1.0, -1.0])
+
+
+def test_curve_tracks_the_full_harmonic_series():
+    doc = station_doc_from_noaa(FIXTURE["name"], FIXTURE["harcon"], FIXTURE["datums"])
+    model = HarmonicModel.from_doc(FIXTURE["station_id"], doc)
+    start, end = datetime(2015, 1, 1), datetime(2015, 1, 3)
+    events = model.high_low(start, end)
+    times, heights = model.water_levels(datetime(2015, 1, 1, 6), datetime(2015, 1, 2, 18))
+    curve = cosine_curve(
+        [to_epoch_seconds(when) for when, _, _ in events], [h for _, h, _ in events], times
+    )
+    # Half-cosines between extremes stay close to the real mixed tide.
+    assert np.max(np.abs(curve - heights)) < 0.25
@@ -0,0 +1,133 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from track_export import (
+    RangeNotSatisfiable,
+    byte_count,
+    byte_slice,
+    counting_chunks,
+    export_chunks,
+    gzip_chunks,
+    parse_range,
+)
+from trip_stats import TrackArrays
+
+T0 = 1717200000.0  # 2024-06-01T00:00:00Z
+
+
+def fixes(n=25):
+    speed = np.linspace(0.0, 6.0, n)
+    speed[3] = np.nan
+    return TrackArrays(
+        t=T0 + np.arange(n) * 2.5,
+        lat=29.0 + np.arange(n) * 1e-4,
+        lon=-90.0 - np.arange(n) * 1e-4,
+        speed=speed,
+        course=np.full(n, 45.0),
+    )
+
+
+async def chunked(arrays, size):
+    for start in range(0, len(arrays), size):
+        yield arrays.select(slice(start, start + size))
+
+
+def export(fmt, size=10, name='Sortie "A" & B', compress=False):
+    async def collect():
+        chunks = export_chunks(chunked(fixes(), size), fmt, "abc123", name)
+        if compress:
+            chunks = gzip_chunks(chunks)
+        return b"".join([c async for c in chunks])
+
+    return asyncio.run(collect())
+
+
+def test_gpx_is_valid_and_complete():
+    ns = {"g": "http://www.topografix.com/GPX/1/1"}
+    root = ET.fromstring(export("gpx"))
+    assert root.find("g:trk/g:name", ns).text == 'Sortie "A" & B'
+    points = root.findall("g:trk/g:trkseg/g:trkpt", ns)
+    assert len(points) == 25
+    assert points[0].get("lat") == "29.0"
+    assert points[1].find("g:time", ns).text == "2024-06-01T00:00:02.500Z"
+    assert points[3].find("g:extensions/g:speed", ns) is None
+    assert float(points[-1].find("g:extensions/g:speed", ns).text) == pytest.approx(6.0 * 1852 / 3600)
+
+
+def test_geojson_and_csv_round_trip():
+    features = json.loads(export("geojson"))["features"]
+    assert len(features) == 25
+    assert features[3]["properties"]["speed_kn"] is None
+    assert features[-1]["geometry"]["coordinates"] == pytest.approx([-90.0024, 29.0024])
+
+    rows = list(csv.DictReader(io.StringIO(export("csv").decode())))
+    assert len(rows) == 25
+    assert rows[3]["speed_kn"] == ""
+    assert rows[0]["timestamp"] == "2024-06-01T00:00:00.000Z"
+
+
+def test_empty_track_exports_are_still_valid():
+    async def collect(fmt):
+        async def nothing():
+            return
+            yield
+
+        return b"".join([c async for c in export_chunks(nothing(), fmt, "abc123", None)])
+
+    assert json.loads(asyncio.run(collect("geojson")))["features"] == []
+    assert ET.fromstring(asyncio.run(collect("gpx"))) is not None
+
+
+@pytest.mark.parametrize("fmt", ["gpx", "geojson", "csv"])
+def test_output_does_not_depend_on_chunking_and_gzip_is_reproducible(fmt):
+    assert export(fmt, size=3) == export(fmt, size=25)
+    compressed = export(fmt, compress=True)
+    assert compressed == export(fmt, compress=True)
+    assert gzip.decompress(compressed) == export(fmt)
+
+
+def test_byte_ranges_resume_the_stream():
+    data = export("csv")
+
+    async def body():
+        for start in range(0, len(data), 100):
+            yield data[start : start + 100]
+
+    async def collect(first, last):
+        return b"".join([c async for c in byte_slice(body(), first, last)])
+
+    total = asyncio.run(byte_count(body()))
+    assert total == len(data)
+    first, last = parse_range("bytes=250-", total)
+    assert asyncio.run(collect(first, last)) == data[250:]
+    first, last = parse_range("bytes=99-100", total)
+    assert asyncio.run(collect(first, last)) == data[99:101]
+    assert parse_range("bytes=-10", total) == (total - 10, total - 1)
+    assert parse_range("bytes=0-5,10-20", total) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(f"bytes={total}-", total)
+
+
+def test_full_export_length_is_reported_once_sent():
+    data = export("gpx", compress=True)
+    lengths = []
+
+    async def body():
+        for start in range(0, len(data), 64):
+            yield data[start : start + 64]
+
+    async def record(total):
+        lengths.append(total)
+
+    async def collect():
+        return b"".join([c async for c in counting_chunks(body(), record)])
+
+    assert asyncio.run(collect()) == data
+    assert lengths == [len(data)]
@@ -0,0 +1,107 @@
+"""Parity between the MongoDB aggregation backend and the Python path.
+
+Without a database only the pipeline's shape is checked. The parity tests
+against a real MongoDB 5.2+ server are opt-in: set TEST_MONGO_URL to run
+them.
+"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from geo import haversine_nm
+from trip_pipeline import accumulator_from_summary, trip_stats_pipeline
+from trip_stats import compute_trip_stats, points_to_arrays
+
+MONGO_URL = os.environ.get("TEST_MONGO_URL")
+requires_mongo = pytest.mark.skipif(not MONGO_URL, reason="TEST_MONGO_URL not set")
+
+
+def sample_docs(track_id, n=2000):
+    rng = np.random.default_rng(7)
+    t0 = datetime(2025, 6, 1, 6, 0, 0)
+    lats = 29 + np.cumsum(rng.uniform(-2e-3, 2e-3, n))
+    lons = -90 + np.cumsum(rng.uniform(-2e-3, 2e-3, n))
+    return [
+        {
+            "track_id": track_id,
+            "timestamp": t0 + timedelta(seconds=3 * i),
+            "lat": float(lats[i]),
+            "lon": float(lons[i]),
+            "speed_kn": None if i % 11 == 0 else float(rng.uniform(0, 28)),
+        }
+        for i in range(n)
+    ]
+
+
+def test_pipeline_pairs_each_fix_with_its_predecessor_in_time_order():
+    track_id = ObjectId()
+    stages = trip_stats_pipeline(track_id)
+
+    assert [next(iter(stage)) for stage in stages] == ["$match", "$setWindowFields", "$set", "$facet"]
+    assert stages[0]["$match"] == {"track_id": track_id}
+    window = stages[1]["$setWindowFields"]
+    # One track is matched, so the window needs no partition.
+    assert "partitionBy" not in window
+    assert window["sortBy"] == {"timestamp": 1}
+    assert window["output"] == {
+        f"prev_{name}": {"$shift": {"output": f"${field}", "by": -1}}
+        for name, field in (("lat", "lat"), ("lon", "lon"), ("t", "timestamp"))
+    }
+    assert set(stages[2]["$set"]) == {"seg_nm", "dt_s"}
+    facet = stages[3]["$facet"]
+    assert set(facet) == {"totals", "speed_hist"}
+    assert set(facet["totals"][0]["$group"]) >= {"point_count", "distance_nm", "moving_time_s", "last"}
+
+
+def test_empty_summary_is_an_empty_accumulator():
+    assert accumulator_from_summary({"totals": [], "speed_hist": []}).point_count == 0
+
+
+@pytest.fixture
+def points_collection():
+    from pymongo import MongoClient
+
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=2000)
+    coll = client["trip_pipeline_test"]["track_points"]
+    yield coll
+    coll.drop()
+    client.close()
+
+
+@requires_mongo
+def test_pipeline_matches_python_haversine(points_collection):
+    rng = np.random.default_rng(7)
+    track_id = ObjectId()
+    docs = sample_docs(track_id)
+    # Insert shuffled so the window sort is what orders the segments.
+    points_collection.insert_many([docs[i] for i in rng.permutation(len(docs))])
+    points_collection.insert_one({**docs[0], "track_id": ObjectId()})
+
+    summary = list(points_collection.aggregate(trip_stats_pipeline(track_id)))
+    mongo = accumulator_from_summary(summary[0]).stats()
+    python = compute_trip_stats(points_to_arrays(docs))
+    scalar = sum(
+        haversine_nm(docs[i]["lat"], docs[i]["lon"], docs[i + 1]["lat"], docs[i + 1]["lon"])
+        for i in range(len(docs) - 1)
+    )
+
+    assert mongo.point_count == python.point_count == 2000
+    # The server's libm and summation order may differ in the last bits.
+    assert mongo.distance_nm == pytest.approx(scalar, rel=1e-12)
+    assert mongo.distance_nm == pytest.approx(python.distance_nm, rel=1e-12)
+    assert mongo.moving_time_s == python.moving_time_s
+    assert mongo.max_speed_kn == python.max_speed_kn
+    assert (mongo.speed_p50_kn, mongo.speed_p90_kn, mongo.speed_p95_kn) == (
+        python.speed_p50_kn,
+        python.speed_p90_kn,
+        python.speed_p95_kn,
+    )
+
+
+@requires_mongo
+def test_pipeline_empty_track(points_collection):
+    summary = list(points_collection.aggregate(trip_stats_pipeline(ObjectId())))
+    assert accumulator_from_summary(summary[0]).point_count == 0
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from geo import haversine_nm, haversine_nm_array, path_distance_nm
+from trip_stats import (
+    MOVING_SPEED_KN,
+    SPEED_BIN_KN,
+    OutOfOrderError,
+    TripAccumulator,
+    compute_trip_stats,
+    points_to_arrays,
+)
+
+
+def make_points(coords, step_s=60, speeds=None):
+    t0 = datetime(2025, 6, 1, 12, 0, 0)
+    return [
+        {
+            "timestamp": t0 + timedelta(seconds=step_s * i),
+            "lat": lat,
+            "lon": lon,
+            "speed_kn": None if speeds is None else speeds[i],
+        }
+        for i, (lat, lon) in enumerate(coords)
+    ]
+
+
+def test_vectorized_haversine_matches_scalar():
+    rng = np.random.default_rng(0)
+    lat1, lat2 = rng.uniform(-80, 80, (2, 500))
+    lon1, lon2 = rng.uniform(-180, 180, (2, 500))
+    expected = [haversine_nm(*args) for args in zip(lat1, lon1, lat2, lon2)]
+    np.testing.assert_allclose(haversine_nm_array(lat1, lon1, lat2, lon2), expected, rtol=1e-12)
+
+
+def test_trip_stats_match_pairwise_loop():
+    coords = [(29.0 + 0.01 * i, -90.0 + 0.005 * i) for i in range(50)]
+    speeds = [None if i % 7 == 0 else float(i % 20) for i in range(50)]
+    stats = compute_trip_stats(points_to_arrays(make_points(coords, speeds=speeds)))
+
+    expected = sum(haversine_nm(*coords[i], *coords[i + 1]) for i in range(len(coords) - 1))
+    assert stats.point_count == 50
+    assert abs(stats.distance_nm - expected) < 1e-9
+    assert stats.max_speed_kn == 19.0
+    assert stats.distance_nm == path_distance_nm(*zip(*coords))
+
+
+def test_moving_time_excludes_stationary_segments():
+    # Two moving minutes at 36 kn, then three minutes at anchor: one still,
+    # two drifting just under the moving threshold.
+    drift_deg = MOVING_SPEED_KN * 0.9 / 60 / 60  # nm in one minute, as degrees of latitude
+    coords = [(29.0, -90.0), (29.01, -90.0), (29.02, -90.0), (29.02, -90.0)]
+    coords += [(29.02 + drift_deg, -90.0), (29.02 + 2 * drift_deg, -90.0)]
+    stats = compute_trip_stats(points_to_arrays(make_points(coords)))
+
+    moving_nm = haversine_nm(*coords[0], *coords[2])
+    stationary_nm = stats.distance_nm - moving_nm
+    assert stats.moving_time_s == 120.0
+    assert moving_nm / (stats.moving_time_s / 3600) > MOVING_SPEED_KN
+    # The remaining 180 s covered distance, but too slowly to count.
+    assert 0 < stationary_nm / (180 / 3600) < MOVING_SPEED_KN
+
+
+def test_empty_track():
+    stats = compute_trip_stats(points_to_arrays([]))
+    assert stats.point_count == 0
+    assert stats.distance_nm == 0.0
+    assert stats.speed_p95_kn == 0.0
+
+
+def test_accumulator_chunks_match_single_pass():
+    rng = np.random.default_rng(1)
+    lats = 29 + np.cumsum(rng.uniform(-1e-3, 1e-3, 300))
+    lons = -90 + np.cumsum(rng.uniform(-1e-3, 1e-3, 300))
+    coords = list(zip(lats, lons))
+    speeds = [float(s) for s in rng.uniform(0, 30, 300)]
+    points = make_points(coords, step_s=5, speeds=speeds)
+
+    whole = compute_trip_stats(points_to_arrays(points))
+    acc = TripAccumulator()
+    for start in range(0, 300, 37):
+        # Round-trip through the persisted form between chunks.
+        acc = TripAccumulator.from_doc(acc.to_doc()).fold(points_to_arrays(points[start : start + 37]))
+    chunked = acc.stats()
+
+    assert chunked.point_count == whole.point_count
+    assert abs(chunked.distance_nm - whole.distance_nm) < 1e-9
+    assert chunked.moving_time_s == whole.moving_time_s
+    assert chunked.max_speed_kn == whole.max_speed_kn
+    assert chunked.speed_p90_kn == whole.speed_p90_kn
+    quantized = np.rint(np.array(speeds) / SPEED_BIN_KN) * SPEED_BIN_KN
+    assert abs(whole.speed_p50_kn - np.percentile(quantized, 50)) < 1e-9
+
+
+def test_accumulator_rejects_out_of_order_chunk():
+    points = make_points([(29.0, -90.0), (29.01, -90.0), (29.02, -90.0)])
+    acc = TripAccumulator().fold(points_to_arrays(points[1:]))
+    with pytest.raises(OutOfOrderError):
+        acc.fold(points_to_arrays(points[:1]))